@@ -3,4 +3,9 @@ from .models import *
 
 admin.site.register(Book)
 admin.site.register(Borrowing)
+admin.site.register(FeeBalance)
 admin.site.register(Notification)
+admin.site.register(IsbnMetadata)
+admin.site.register(LibraryStats)
+admin.site.register(BookNeighbor)
+admin.site.register(JobCheckpoint)
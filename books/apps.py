@@ -4,3 +4,13 @@ from django.apps import AppConfig
 class BooksConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'books'
+
+    def ready(self):
+        from django.db.models.signals import post_migrate
+        from .response_cache import connect_signals
+        from .search import install_postgres_search
+        from .stats import create_shards
+
+        post_migrate.connect(install_postgres_search, sender=self)
+        post_migrate.connect(create_shards, sender=self)
+        connect_signals()
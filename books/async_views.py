@@ -0,0 +1,99 @@
+# Async twins of the views that spend their time on outbound HTTP. They are
+# mounted instead of the sync views when ASYNC_VIEWS is on (project/asgi.py),
+# so one worker can keep many slow upstream calls in flight. DRF views are
+# sync-only, hence plain Django views with the same auth and payloads.
+
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from django.http import HttpResponse
+from django.views.decorators.csrf import csrf_exempt
+import orjson
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.request import Request
+
+from project.renderers import orjson_dumps
+from users.authentication import RoleClaimsJWTAuthentication
+from .google_books import alookup_isbns
+from .isbn import normalize_isbn_list
+from .models import Book
+from .serializers import InvalidFields, requested_fields
+from .views import added_books_payload, partition_new_isbns, save_new_books
+
+
+def json_response(data, status_code=status.HTTP_200_OK):
+    return HttpResponse(
+        orjson_dumps(data), status=status_code, content_type="application/json"
+    )
+
+
+async def authenticate(request):
+    """
+    ``(user, None)`` for a valid Bearer token, else ``(None, error response)``.
+    Claims-based tokens are checked without touching the database.
+    """
+    try:
+        result = await sync_to_async(RoleClaimsJWTAuthentication().authenticate)(
+            request
+        )
+    except APIException as e:
+        return None, json_response({"detail": e.detail}, e.status_code)
+    if result is None:
+        return None, json_response(
+            {"detail": "Authentication credentials were not provided."},
+            status.HTTP_401_UNAUTHORIZED,
+        )
+    return result[0], None
+
+
+# ATOMIC_REQUESTS cannot wrap async views; the insert has its own atomic.
+@csrf_exempt
+@transaction.non_atomic_requests
+async def add_books(request):
+    if request.method != "POST":
+        return json_response(
+            {"detail": f'Method "{request.method}" not allowed.'},
+            status.HTTP_405_METHOD_NOT_ALLOWED,
+        )
+    user, denied = await authenticate(request)
+    if denied:
+        return denied
+    if user.userprofile.role != "Librarian":
+        return json_response(
+            {"detail": "You do not have permission to perform this action."},
+            status.HTTP_403_FORBIDDEN,
+        )
+    try:
+        isbn_list = orjson.loads(request.body or b"{}").get("isbn_list", [])
+    except (orjson.JSONDecodeError, AttributeError):
+        isbn_list = None
+    if not isinstance(isbn_list, list) or not isbn_list:
+        return json_response(
+            {"error": "ISBN list is required."}, status.HTTP_400_BAD_REQUEST
+        )
+    try:
+        output_fields = requested_fields(Request(request))
+    except InvalidFields as e:
+        return json_response({"error": str(e)}, status.HTTP_400_BAD_REQUEST)
+
+    isbns, invalid = normalize_isbn_list(isbn_list)
+    existing = {
+        isbn
+        async for isbn in Book.objects.filter(isbn_13__in=isbns).values_list(
+            "isbn_13", flat=True
+        )
+    }
+    to_fetch, errors = partition_new_isbns(isbns, existing)
+
+    new_books = []
+    for isbn, fields, error in await alookup_isbns(to_fetch + invalid):
+        if error:
+            errors.append(error)
+        else:
+            new_books.append(Book(**fields, quantity=1, available=1))
+
+    added, conflicts = await sync_to_async(save_new_books)(new_books)
+    return json_response(
+        added_books_payload(added, errors + conflicts, output_fields),
+        status.HTTP_201_CREATED,
+    )
@@ -0,0 +1,571 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import statistics
+import threading
+import time
+from urllib.parse import parse_qs, urlparse
+
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from project import profiling
+from users.benchmarks import FakeGoogleCerts
+from users.models import UserProfile
+from users.views import get_tokens_for_user
+from . import response_cache
+from .fees import accrue_late_fees
+from .models import Book, Borrowing
+from .seeding import SEED_PASSWORD, SEED_USER_PREFIX, _isbn13, seed_library
+
+
+def _post(client, url):
+    return client.post(url)
+
+
+def _in_thread(fn):
+    def run(*args):
+        try:
+            return fn(*args)
+        finally:
+            connection.close()
+
+    return run
+
+
+def hammer_popular_book(book, profiles, churn_rounds=20):
+    """
+    Drive borrow_book/return_book for one book from one thread per profile
+    and check the availability invariants after each phase:
+
+    1. rush: every profile tries to borrow at once -> exactly ``available``
+       succeed and the counter lands on zero;
+    2. return: all borrowers return at once -> counter back to its start;
+    3. churn: each profile borrows and returns ``churn_rounds`` times.
+
+    Returns a dict of counts and throughput (requests/second) per phase.
+    Raises AssertionError if an invariant is broken. Needs a database that
+    takes concurrent writers (PostgreSQL); SQLite fails lock upgrades with
+    "database is locked" rather than waiting.
+    """
+    start_available = Book.objects.get(pk=book.pk).available
+    borrow_url = f"/api/lib/books/{book.pk}/borrow/"
+    clients = []
+    for profile in profiles:
+        client = APIClient()
+        client.force_authenticate(profile.auth_user)
+        clients.append(client)
+
+    def borrow(client):
+        return _post(client, borrow_url).status_code == 200
+
+    def return_all(client, profile):
+        ids = list(
+            Borrowing.objects.filter(
+                user=profile, book=book, return_date__isnull=True
+            ).values_list("id", flat=True)
+        )
+        return sum(
+            _post(client, f"/api/lib/borrowings/{pk}/return/").status_code == 200
+            for pk in ids
+        )
+
+    def churn(client, profile):
+        done = 0
+        for _ in range(churn_rounds):
+            if borrow(client):
+                done += 1 + return_all(client, profile)
+        return done
+
+    results = {}
+    barrier = threading.Barrier(len(clients))
+
+    def timed(name, fn, *iterables):
+        def worker(*args):
+            barrier.wait()
+            return fn(*args)
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=len(clients)) as pool:
+            outcome = list(pool.map(_in_thread(worker), *iterables))
+        elapsed = time.perf_counter() - started
+        results[name] = {"ok": sum(outcome), "seconds": round(elapsed, 4)}
+        return outcome, elapsed
+
+    outcome, elapsed = timed("rush", borrow, clients)
+    borrowed = sum(outcome)
+    assert borrowed == min(start_available, len(clients)), borrowed
+    book.refresh_from_db(fields=["available"])
+    assert book.available == start_available - borrowed, book.available
+    assert (
+        Borrowing.objects.filter(book=book, return_date__isnull=True).count()
+        == borrowed
+    )
+
+    outcome, _ = timed("return", return_all, clients, profiles)
+    assert sum(outcome) == borrowed
+    book.refresh_from_db(fields=["available"])
+    assert book.available == start_available, book.available
+
+    outcome, elapsed = timed("churn", churn, clients, profiles)
+    book.refresh_from_db(fields=["available"])
+    assert book.available == start_available, book.available
+    assert not Borrowing.objects.filter(book=book, return_date__isnull=True).exists()
+    results["churn"]["requests_per_second"] = round(sum(outcome) / elapsed, 1)
+    return results
+
+
+class _StubServer(ThreadingHTTPServer):
+    # Room for a burst of concurrent clients before connections are refused.
+    request_queue_size = 256
+
+
+class FakeBooksAPI:
+    """Local stand-in for the Google Books volumes endpoint with injected latency."""
+
+    def __init__(self, latency=0.0, missing=()):
+        self.latency = latency
+        self.missing = set(missing)
+        self.requests = 0
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                api.requests += 1
+                time.sleep(api.latency)
+                isbn = parse_qs(urlparse(self.path).query)["q"][0].split(":", 1)[1]
+                items = (
+                    []
+                    if isbn in api.missing
+                    else [
+                        {
+                            "volumeInfo": {
+                                "title": f"Title {isbn}",
+                                "authors": ["A. Writer"],
+                                "publisher": "Fake Press",
+                                "categories": ["Fiction"],
+                                "industryIdentifiers": [
+                                    {"type": "ISBN_10", "identifier": isbn[-10:]}
+                                ],
+                            }
+                        }
+                    ]
+                )
+                body = json.dumps({"items": items}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = _StubServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/books/v1/volumes"
+
+    def __enter__(self):
+        threading.Thread(
+            target=self.server.serve_forever, args=(0.05,), daemon=True
+        ).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def _latency_summary(latencies, seconds):
+    latencies = sorted(latencies)
+    return {
+        "requests": len(latencies),
+        "seconds": round(seconds, 3),
+        "requests_per_second": round(len(latencies) / seconds, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 1),
+        "p95_ms": round(latencies[int(0.95 * (len(latencies) - 1))] * 1000, 1),
+    }
+
+
+def compare_add_books_modes(token, isbn_batches, workers):
+    """
+    Send one add_books request per ISBN batch, all at once, through
+
+    - ``sync``: the DRF view on ``workers`` threads, i.e. that many sync
+      gunicorn workers, each blocking on its upstream lookups;
+    - ``async``: the async view, every request awaited on one event loop.
+
+    Each mode should get its own uncached ISBNs. Returns the latency and
+    throughput summary per mode.
+    """
+    from django.test import AsyncRequestFactory, RequestFactory
+
+    from . import async_views, views
+
+    headers = {"Authorization": f"Bearer {token}"}
+    half = len(isbn_batches) // 2
+    sync_batches, async_batches = isbn_batches[:half], isbn_batches[half:]
+
+    def call_sync(isbns):
+        request = RequestFactory().post(
+            "/api/lib/books/add/",
+            {"isbn_list": isbns},
+            content_type="application/json",
+            headers=headers,
+        )
+        started = time.perf_counter()
+        response = views.add_books(request)
+        assert response.status_code == 201, response.status_code
+        return time.perf_counter() - started
+
+    async def call_async(isbns):
+        request = AsyncRequestFactory().post(
+            "/api/lib/books/add/",
+            {"isbn_list": isbns},
+            content_type="application/json",
+            headers=headers,
+        )
+        started = time.perf_counter()
+        response = await async_views.add_books(request)
+        assert response.status_code == 201, response.status_code
+        return time.perf_counter() - started
+
+    async def run_async():
+        return await asyncio.gather(*map(call_async, async_batches))
+
+    results = {}
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        latencies = list(pool.map(_in_thread(call_sync), sync_batches))
+    results["sync"] = _latency_summary(latencies, time.perf_counter() - started)
+    results["sync"]["workers"] = workers
+
+    started = time.perf_counter()
+    latencies = asyncio.run(run_async())
+    results["async"] = _latency_summary(latencies, time.perf_counter() - started)
+    return results
+
+
+# (url name, method, caller role) for every route in books/ and users/urls.py.
+ENDPOINTS = (
+    ("book-list", "GET", None),
+    ("add-books", "POST", "librarian"),
+    ("import-books", "POST", "librarian"),
+    ("book-detail", "GET", "patron"),
+    ("book-detail", "PUT", "librarian"),
+    ("book-detail", "DELETE", "librarian"),
+    ("borrow-book", "POST", "patron"),
+    ("return-book", "POST", "patron"),
+    ("bulk-borrow-books", "POST", "librarian"),
+    ("bulk-return-books", "POST", "librarian"),
+    ("borrowing-history", "GET", "patron"),
+    ("fee-balance", "GET", "patron"),
+    ("search-books", "GET", "patron"),
+    ("book-recommendations", "GET", "patron"),
+    ("user-notifications", "GET", "patron"),
+    ("unread-notification-count", "GET", "patron"),
+    ("mark-notifications-read", "POST", "patron"),
+    ("generate-report", "GET", "librarian"),
+    ("response-cache-stats", "GET", "librarian"),
+    ("profile-list", "GET", "librarian"),
+    ("profile-download", "GET", "librarian"),
+    ("export-books", "GET", "librarian"),
+    ("export-borrowings", "GET", "librarian"),
+    ("token_obtain_pair", "POST", None),
+    ("token_refresh", "POST", None),
+    ("signup", "POST", None),
+    ("update_profile", "GET", "patron"),
+    ("update_profile", "POST", "patron"),
+    ("protected_view", "GET", "patron"),
+    ("google_auth", "POST", None),
+)
+
+BENCHMARK_SIZES = (1_000, 10_000)
+BULK_SCAN_ITEMS = 20  # books per bulk checkout/return, a busy desk visit
+
+
+def _library_for(size):
+    # ``size`` books; users, loans and notifications scale with it.
+    return {
+        "users": max(size // 10, 1),
+        "books": size,
+        "borrowings": size * 5,
+        "notifications": size * 2,
+    }
+
+
+class _Calls:
+    """Builds each benchmarked request; one-shot calls get fresh objects."""
+
+    def __init__(self, google):
+        self.google = google
+        self.calls = 0
+        user = User.objects.create_user(username="bench-librarian")
+        self.librarian = UserProfile.objects.create(
+            auth_user=user, name="Bench Librarian", role="Librarian"
+        )
+        # The busiest reader makes history and notification pages realistic.
+        self.patron = (
+            UserProfile.objects.filter(auth_user__username__startswith=SEED_USER_PREFIX)
+            .annotate(loans=Count("borrowing"))
+            .select_related("auth_user")
+            .order_by("-loans")
+            .first()
+        )
+        self.book_ids = list(
+            Book.objects.order_by("-borrow_count").values_list("id", flat=True)[:100]
+        )
+        self.tokens = {
+            role: get_tokens_for_user(profile.auth_user)
+            for role, profile in (
+                ("librarian", self.librarian),
+                ("patron", self.patron),
+            )
+        }
+        # One profiled request, so there is a profile to download. Tokens
+        # only profile their own librarian's requests.
+        self.client("librarian").get(
+            reverse("protected_view"),
+            headers={profiling.HEADER: profiling.issue_token(user)},
+        )
+        self.profile = profiling.list_profiles()[0]["files"][1]
+
+    def client(self, role):
+        client = APIClient()
+        if role:
+            access = self.tokens[role]["access"]
+            client.credentials(HTTP_AUTHORIZATION=f"Bearer {access}")
+        return client
+
+    def fresh_book(self):
+        return Book.objects.create(
+            isbn_13=_isbn13(9_000_000 + self.calls), title="Bench", publisher="P"
+        )
+
+    def fresh_books(self, count):
+        return Book.objects.bulk_create(
+            Book(
+                isbn_13=_isbn13(9_200_000 + self.calls * 100 + i),
+                title="Bench",
+                publisher="P",
+            )
+            for i in range(count)
+        )
+
+    def request(self, name, method):
+        """Returns (url kwargs, body, format)."""
+        self.calls += 1
+        n = self.calls
+        if name == "book-detail":
+            pk = (
+                self.fresh_book().pk
+                if method == "DELETE"
+                else self.book_ids[n % len(self.book_ids)]
+            )
+            return {"pk": pk}, {"title": "Renamed"}, "json"
+        if name == "profile-download":
+            return {"filename": self.profile}, None, "json"
+        if name == "borrow-book":
+            return {"book_id": self.fresh_book().pk}, None, "json"
+        if name == "return-book":
+            borrowing = Borrowing.objects.create(
+                user=self.patron, book=self.fresh_book(), due_date=date.today()
+            )
+            return {"borrowing_id": borrowing.pk}, None, "json"
+        if name == "bulk-borrow-books":
+            book_ids = [book.pk for book in self.fresh_books(BULK_SCAN_ITEMS)]
+            return {}, {"book_ids": book_ids, "patron": self.patron.pk}, "json"
+        if name == "bulk-return-books":
+            borrowings = Borrowing.objects.bulk_create(
+                Borrowing(user=self.patron, book=book, due_date=date.today())
+                for book in self.fresh_books(BULK_SCAN_ITEMS)
+            )
+            return {}, {"borrowing_ids": [b.pk for b in borrowings]}, "json"
+        if name == "add-books":
+            isbns = [_isbn13(9_500_000 + n * 10 + i) for i in range(3)]
+            return {}, {"isbn_list": isbns}, "json"
+        if name == "import-books":
+            rows = "".join(
+                f'{{"isbn_13": "{_isbn13(9_800_000 + n * 10 + i)}", "title": "Imported"}}\n'
+                for i in range(3)
+            )
+            upload = SimpleUploadedFile("books.jsonl", rows.encode())
+            return {}, {"file": upload}, "multipart"
+        if name == "search-books":
+            return {}, {"q": "river"}, "json"
+        if name == "mark-notifications-read":
+            return {}, {"all": True}, "json"
+        if name == "token_obtain_pair":
+            username = self.patron.auth_user.username
+            return {}, {"username": username, "password": SEED_PASSWORD}, "json"
+        if name == "token_refresh":
+            return {}, {"refresh": self.tokens["patron"]["refresh"]}, "json"
+        if name == "signup":
+            body = {
+                "username": f"bench-{n}",
+                "password": SEED_PASSWORD,
+                "email": f"bench-{n}@example.com",
+                "name": "Bench",
+                "role": "Customer",
+            }
+            return {}, body, "json"
+        if name == "update_profile":
+            return {}, {"name": self.patron.name}, "json"
+        if name == "google_auth":
+            return {}, {"id_token": self.google.id_token(), "role": "Customer"}, "json"
+        return {}, None, "json"
+
+
+def _call(calls, name, method, role):
+    kwargs, body, fmt = calls.request(name, method)
+    client = calls.client(role)
+    url = reverse(name, kwargs=kwargs)
+    # Own savepoint, so an error response rolls back only this call.
+    with transaction.atomic(), CaptureQueriesContext(connection) as ctx:
+        started = time.perf_counter()
+        if method == "GET":
+            response = client.get(url, body)
+        else:
+            response = getattr(client, method.lower())(url, body, format=fmt)
+        size = len(
+            b"".join(response.streaming_content)
+            if response.streaming
+            else response.content
+        )
+        elapsed = time.perf_counter() - started
+    queries = sum(
+        1
+        for query in ctx.captured_queries
+        if not query["sql"].startswith(("SAVEPOINT", "RELEASE SAVEPOINT"))
+    )
+    return response.status_code, elapsed, queries, size
+
+
+def _endpoint_summary(samples):
+    statuses, latencies, queries, sizes = zip(*samples)
+    latencies = sorted(latencies)
+    return {
+        "requests": len(samples),
+        "statuses": sorted(set(statuses)),
+        "p50_ms": round(latencies[int(0.50 * (len(latencies) - 1))] * 1000, 2),
+        "p90_ms": round(latencies[int(0.90 * (len(latencies) - 1))] * 1000, 2),
+        "p99_ms": round(latencies[int(0.99 * (len(latencies) - 1))] * 1000, 2),
+        "mean_ms": round(statistics.mean(latencies) * 1000, 2),
+        "queries": max(queries),
+        "bytes": max(sizes),
+    }
+
+
+def benchmark_endpoints(
+    sizes=BENCHMARK_SIZES, repeat=20, warm_cache=False, seed=0, progress=None
+):
+    """
+    Seed a synthetic library of each size (in books; see ``_library_for``)
+    and call every route in ``ENDPOINTS`` ``repeat`` times through the test
+    client with real JWT auth. Upstream Google calls go to local fakes.
+
+    Each size runs in a transaction that is rolled back afterwards, so the
+    database is left as it was. Unless ``warm_cache``, cached responses are
+    invalidated before every call, so the numbers are for the view itself.
+    Returns latency percentiles, SQL counts (savepoints excluded), response
+    bytes and status codes per ``"METHOD url-name"`` for each size.
+    """
+    progress = progress or (lambda message: None)
+    results = {
+        "database": connection.vendor,
+        "repeat": repeat,
+        "warm_cache": warm_cache,
+        "sizes": {},
+    }
+    with FakeBooksAPI() as books_api, FakeGoogleCerts() as google:
+        with override_settings(GOOGLE_BOOKS_API_URL=books_api.url):
+            for size in sizes:
+                library = _library_for(size)
+                with transaction.atomic():
+                    response_cache.invalidate("catalog", "borrowings")
+                    seeded = seed_library(seed=seed, **library)
+                    progress(f"seeded {size}: {seeded}")
+                    accrued = accrue_late_fees()
+                    progress(f"accrued late fees {size}: {accrued}")
+                    calls = _Calls(google)
+                    endpoints = {}
+                    for name, method, role in ENDPOINTS:
+                        samples = []
+                        for _ in range(repeat):
+                            if not warm_cache:
+                                response_cache.invalidate("catalog", "borrowings")
+                            samples.append(_call(calls, name, method, role))
+                        summary = _endpoint_summary(samples)
+                        endpoints[f"{method} {name}"] = summary
+                        progress(f"{size} {method} {name}: {summary}")
+                    results["sizes"][str(size)] = {
+                        "library": library,
+                        "seed_seconds": seeded["seconds"],
+                        "accrue_seconds": accrued["seconds"],
+                        "endpoints": endpoints,
+                    }
+                    transaction.set_rollback(True)
+    # Pages cached during the run describe rows that were rolled back.
+    response_cache.invalidate("catalog", "borrowings")
+    return results
+
+
+LOAD_TEST_PATHS = (
+    "/api/lib/books/",
+    "/api/lib/books/search/?q=river",
+    "/api/lib/books/recommendations/",
+    "/api/lib/borrowings/history/",
+    "/api/lib/notifications/unread-count/",
+    "/api/users/protected/",
+)
+
+
+def load_test(base_url, paths=LOAD_TEST_PATHS, concurrency=16, seconds=20, token=None):
+    """
+    Hit a running server from ``concurrency`` keep-alive clients, cycling
+    through ``paths``, for ``seconds``. Returns throughput and latency
+    percentiles overall and per path, plus non-2xx and failed requests.
+    """
+    import requests
+
+    headers = {"Authorization": f"Bearer {token}"} if token else {}
+    deadline = time.monotonic() + seconds
+
+    def client(offset):
+        session = requests.Session()
+        samples = []
+        i = offset
+        while time.monotonic() < deadline:
+            path = paths[i % len(paths)]
+            i += 1
+            started = time.perf_counter()
+            try:
+                ok = session.get(base_url + path, headers=headers).ok
+            except requests.RequestException:
+                ok = False
+            samples.append((path, time.perf_counter() - started, ok))
+        return samples
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        samples = [s for batch in pool.map(client, range(concurrency)) for s in batch]
+    elapsed = time.perf_counter() - started
+
+    result = _latency_summary([latency for _, latency, _ in samples], elapsed)
+    result["errors"] = sum(not ok for _, _, ok in samples)
+    result["concurrency"] = concurrency
+    result["paths"] = {
+        path: _latency_summary(
+            [latency for p, latency, _ in samples if p == path], elapsed
+        )
+        for path in paths
+    }
+    return result
@@ -0,0 +1,207 @@
+import csv
+from itertools import islice
+import time
+
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+import orjson
+
+from . import stats
+from .isbn import is_valid_isbn13, normalize_isbn
+from .models import Book, Borrowing, JobCheckpoint
+from .serializers import BOOK_EDITABLE_FIELDS
+
+IMPORT_BATCH_SIZE = 5000
+IMPORT_FORMATS = ("csv", "jsonl")
+_JOB_PREFIX = "catalog-import:"
+MAX_JOB_LENGTH = JobCheckpoint._meta.get_field("name").max_length - len(_JOB_PREFIX)
+MAX_REPORTED_ERRORS = 100
+
+_INTEGER_FIELDS = ("page_count", "quantity", "available")
+
+
+class InvalidRow(ValueError):
+    pass
+
+
+def read_rows(stream, fmt):
+    """Yield one dict per CSV record or JSONL line from a text stream."""
+    if fmt == "csv":
+        yield from csv.DictReader(stream)
+    elif fmt == "jsonl":
+        for line in stream:
+            if not line.strip():
+                continue
+            try:
+                row = orjson.loads(line)
+            except orjson.JSONDecodeError as e:
+                yield InvalidRow(f"invalid JSON: {e}")
+                continue
+            yield row if isinstance(row, dict) else InvalidRow("not a JSON object")
+    else:
+        raise ValueError(f"Unsupported import format {fmt!r}.")
+
+
+def clean_row(row):
+    """
+    Validate one source row into ``Book`` field values. The ISBN may come as
+    ``isbn_13``, ``isbn`` or ``isbn_10`` and is normalized to ISBN-13.
+    Raises ``InvalidRow`` with the reason.
+    """
+    if isinstance(row, InvalidRow):
+        raise row
+    raw_isbn = row.get("isbn_13") or row.get("isbn") or row.get("isbn_10")
+    if not raw_isbn:
+        raise InvalidRow("missing ISBN")
+    isbn_13 = normalize_isbn(raw_isbn)
+    if not is_valid_isbn13(isbn_13):
+        raise InvalidRow(f"invalid ISBN {raw_isbn!r}")
+
+    values = {"isbn_13": isbn_13}
+    if row.get("isbn_10"):
+        isbn_10 = "".join(str(row["isbn_10"]).split()).replace("-", "").upper()
+        if normalize_isbn(isbn_10) == isbn_10:  # not a well-formed ISBN-10
+            raise InvalidRow(f"invalid ISBN-10 {row['isbn_10']!r}")
+        values["isbn_10"] = isbn_10
+    for name in BOOK_EDITABLE_FIELDS:
+        if name == "isbn_10":
+            continue
+        value = row.get(name)
+        if value is None or value == "":
+            continue
+        if name in _INTEGER_FIELDS:
+            try:
+                value = int(value)
+            except (TypeError, ValueError):
+                raise InvalidRow(f"{name} must be an integer")
+            if value < 0:
+                raise InvalidRow(f"{name} must not be negative")
+        else:
+            value = str(value).strip()
+            max_length = Book._meta.get_field(name).max_length
+            if max_length and len(value) > max_length:
+                raise InvalidRow(f"{name} is longer than {max_length} characters")
+        values[name] = value
+    if not values.get("title"):
+        raise InvalidRow("missing title")
+    values.setdefault("publisher", "")
+    values.setdefault("quantity", 1)
+    values["available"] = min(
+        values.get("available", values["quantity"]), values["quantity"]
+    )
+    return values
+
+
+def _upsert(batch):
+    """Insert new books and refresh stock on existing ones; returns #created."""
+    # Lock the known books first: a loan takes its copy with an UPDATE of
+    # the Book row, so the outstanding counts cannot move under the upsert.
+    outstanding = Coalesce(
+        Subquery(
+            Borrowing.objects.filter(book=OuterRef("pk"), return_date__isnull=True)
+            .order_by()
+            .values("book")
+            .annotate(n=Count("id"))
+            .values("n")
+        ),
+        0,
+    )
+    existing = dict(
+        Book.objects.select_for_update(of=("self",))
+        .filter(isbn_13__in=batch)
+        .annotate(outstanding=outstanding)
+        .order_by("id")
+        .values_list("isbn_13", "outstanding")
+    )
+    for isbn, loans in existing.items():
+        values = batch[isbn]
+        values["available"] = max(values["quantity"] - loans, 0)
+    Book.objects.bulk_create(
+        [Book(**values) for values in batch.values()],
+        update_conflicts=True,
+        unique_fields=["isbn_13"],
+        update_fields=["quantity", "available"],
+    )
+    created = len(batch) - len(existing)
+    stats.bump(total_books=created, catalog_version=len(batch))
+    return created
+
+
+def import_catalog(
+    stream, fmt, job=None, batch_size=IMPORT_BATCH_SIZE, restart=False, progress=None
+):
+    """
+    Upsert books from a CSV/JSONL text stream ``batch_size`` rows at a time.
+    Rows are validated and keyed on the normalized ISBN-13; new ISBNs are
+    inserted and known ones get their ``quantity`` replaced, with
+    ``available`` recomputed as that quantity minus the copies still on loan.
+    Only one batch is held in memory.
+
+    With a ``job`` name, each batch commits together with a checkpoint of
+    the source rows consumed, so rerunning the same job skips what is
+    already imported (``restart`` starts over).
+
+    ``progress`` is called with the running result after every batch.
+    Returns ``{"rows", "created", "updated", "invalid", "errors", "seconds",
+    "rows_per_second"}``; ``errors`` lists the first invalid rows by number.
+    """
+    checkpoint = None
+    skip = 0
+    if job:
+        if len(job) > MAX_JOB_LENGTH:
+            raise ValueError(f"Job names are at most {MAX_JOB_LENGTH} characters.")
+        checkpoint, _ = JobCheckpoint.objects.get_or_create(name=_JOB_PREFIX + job)
+        if restart:
+            checkpoint.position, checkpoint.completed = 0, False
+            checkpoint.save()
+        skip = checkpoint.position
+
+    result = {
+        "rows": 0,
+        "created": 0,
+        "updated": 0,
+        "invalid": 0,
+        "errors": [],
+        "seconds": 0.0,
+        "rows_per_second": 0.0,
+    }
+    if checkpoint and checkpoint.completed:
+        return result
+
+    started = time.perf_counter()
+    rows = islice(read_rows(stream, fmt), skip, None)
+    position = skip
+    while True:
+        chunk = list(islice(rows, batch_size))
+        batch = {}
+        for number, row in enumerate(chunk, start=position + 1):
+            try:
+                values = clean_row(row)
+            except InvalidRow as e:
+                result["invalid"] += 1
+                if len(result["errors"]) < MAX_REPORTED_ERRORS:
+                    result["errors"].append({"row": number, "error": str(e)})
+                continue
+            # A repeated ISBN within one batch keeps its last row; the
+            # upsert cannot touch the same key twice in one statement.
+            batch[values["isbn_13"]] = values
+        position += len(chunk)
+
+        with transaction.atomic():
+            if batch:
+                created = _upsert(batch)
+                result["created"] += created
+                result["updated"] += len(batch) - created
+            if checkpoint:
+                checkpoint.position = position
+                checkpoint.completed = len(chunk) < batch_size
+                checkpoint.save(update_fields=["position", "completed", "updated_at"])
+
+        result["rows"] += len(chunk)
+        result["seconds"] = time.perf_counter() - started
+        result["rows_per_second"] = result["rows"] / max(result["seconds"], 1e-9)
+        if progress:
+            progress(result)
+        if len(chunk) < batch_size:
+            return result
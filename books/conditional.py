@@ -0,0 +1,47 @@
+from functools import wraps
+import hashlib
+
+from django.views.decorators.http import condition
+
+from . import stats
+
+
+def _catalog_state(request):
+    # etag_func and last_modified_func both ask; read the stamp once.
+    state = getattr(request, "_catalog_state", None)
+    if state is None:
+        state = request._catalog_state = stats.catalog_state()
+    return state
+
+
+def catalog_etag(request, *args, **kwargs):
+    version, _ = _catalog_state(request)
+    # Same catalog version, different page/fields/format -> different body.
+    variant = hashlib.blake2b(
+        request.get_full_path().encode(), digest_size=8
+    ).hexdigest()
+    return f"{version}-{variant}"
+
+
+def catalog_last_modified(request, *args, **kwargs):
+    return _catalog_state(request)[1]
+
+
+def catalog_conditional(view):
+    """
+    Answer If-None-Match / If-Modified-Since on GET/HEAD with 304 from the
+    catalog version stamp alone, before the view loads any Book rows. Apply
+    below @api_view so authentication and permissions still run first.
+    Unsafe methods skip the stamp lookup entirely.
+    """
+    conditional_view = condition(
+        etag_func=catalog_etag, last_modified_func=catalog_last_modified
+    )(view)
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method in ("GET", "HEAD"):
+            return conditional_view(request, *args, **kwargs)
+        return view(request, *args, **kwargs)
+
+    return wrapper
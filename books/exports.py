@@ -0,0 +1,105 @@
+from datetime import date, datetime
+
+from .fees import late_fee
+from .models import Book, Borrowing
+from .serializers import BOOK_FIELDS
+
+EXPORT_CHUNK_SIZE = 5000
+EXPORT_FORMATS = ("csv", "ndjson")
+
+CATALOG_EXPORT_FIELDS = BOOK_FIELDS + ("borrow_count",)
+CATALOG_STATUSES = ("available", "unavailable")
+
+BORROWING_EXPORT_FIELDS = (
+    "id",
+    "user_id",
+    "book_id",
+    "book__isbn_13",
+    "book__title",
+    "borrow_date",
+    "due_date",
+    "return_date",
+    "late_fee",
+)
+# late_fee is what was charged on return (or accrued by the last nightly
+# run for copies still out); fee_due prices those as of the export day.
+BORROWING_EXPORT_COLUMNS = BORROWING_EXPORT_FIELDS + ("status", "fee_due")
+BORROWING_STATUSES = ("outstanding", "overdue", "returned")
+
+
+class InvalidExportFilter(ValueError):
+    pass
+
+
+def _parse_date(params, name):
+    value = params.get(name)
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise InvalidExportFilter(f"{name} must be a date (YYYY-MM-DD).")
+
+
+def _parse_status(params, choices):
+    value = params.get("status") or None
+    if value is not None and value not in choices:
+        raise InvalidExportFilter(f"status must be one of: {', '.join(choices)}.")
+    return value
+
+
+def catalog_rows(params, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Every book in id order, read through a server-side cursor. ``params``
+    may filter on ``status`` (available/unavailable).
+    """
+    status = _parse_status(params, CATALOG_STATUSES)
+    books = Book.objects.order_by("id")
+    if status == "available":
+        books = books.filter(available__gt=0)
+    elif status == "unavailable":
+        books = books.filter(available__lte=0)
+    return books.values(*CATALOG_EXPORT_FIELDS).iterator(chunk_size=chunk_size)
+
+
+def borrowing_rows(params, chunk_size=EXPORT_CHUNK_SIZE, today=None):
+    """
+    The borrowing ledger in id order with each row's status and fee due.
+    ``params`` may filter on ``status`` (outstanding/overdue/returned) and
+    on a ``from``/``to`` borrow date range (inclusive). Filters are checked
+    before the first row is read.
+    """
+    today = today or datetime.now().date()
+    status = _parse_status(params, BORROWING_STATUSES)
+    start, end = _parse_date(params, "from"), _parse_date(params, "to")
+
+    borrowings = Borrowing.objects.order_by("id")
+    if status == "returned":
+        borrowings = borrowings.filter(return_date__isnull=False)
+    elif status == "outstanding":
+        borrowings = borrowings.filter(return_date__isnull=True)
+    elif status == "overdue":
+        borrowings = borrowings.filter(return_date__isnull=True, due_date__lt=today)
+    if start:
+        borrowings = borrowings.filter(borrow_date__gte=start)
+    if end:
+        borrowings = borrowings.filter(borrow_date__lte=end)
+    rows = borrowings.values(*BORROWING_EXPORT_FIELDS).iterator(chunk_size=chunk_size)
+    return _with_fees(rows, today)
+
+
+def _with_fees(rows, today):
+    for row in rows:
+        if row["return_date"]:
+            row["status"] = "returned"
+            row["fee_due"] = row["late_fee"]
+        else:
+            row["status"] = "overdue" if row["due_date"] < today else "outstanding"
+            row["fee_due"] = late_fee(row["due_date"], today)
+        yield row
+
+
+EXPORTS = {
+    "catalog": (catalog_rows, CATALOG_EXPORT_FIELDS),
+    "borrowings": (borrowing_rows, BORROWING_EXPORT_COLUMNS),
+}
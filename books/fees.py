@@ -0,0 +1,125 @@
+from datetime import datetime
+from decimal import Decimal
+import time
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import (
+    Count,
+    DateField,
+    DecimalField,
+    F,
+    Func,
+    IntegerField,
+    Q,
+    Sum,
+    Value,
+)
+from django.db.models.functions import Coalesce, Greatest, Least
+
+from .models import Borrowing, FeeBalance
+
+# Borrowing.late_fee is a DecimalField(max_digits=6, decimal_places=2).
+MAX_LATE_FEE = Decimal("9999.99")
+
+
+def fee_rate():
+    """Late fee per day overdue, from settings.LATE_FEE_PER_DAY."""
+    return Decimal(str(settings.LATE_FEE_PER_DAY))
+
+
+def late_fee(due_date, as_of):
+    """Fee for a copy due on ``due_date`` and returned (or still out) on ``as_of``."""
+    return min(max((as_of - due_date).days, 0) * fee_rate(), MAX_LATE_FEE)
+
+
+class DaysBetween(Func):
+    """Whole days from the second date expression to the first."""
+
+    arg_joiner = " - "
+    template = "(%(expressions)s)"
+    output_field = IntegerField()
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self.as_sql(
+            compiler,
+            connection,
+            template="CAST(julianday(%(expressions)s) AS INTEGER)",
+            arg_joiner=") - julianday(",
+            **extra_context,
+        )
+
+
+def late_fee_expression(as_of):
+    """``late_fee`` as SQL over the row's ``due_date``, for bulk UPDATEs."""
+    days = DaysBetween(Value(as_of, output_field=DateField()), F("due_date"))
+    return Greatest(
+        Least(
+            days * Value(fee_rate(), output_field=DecimalField()),
+            Value(MAX_LATE_FEE),
+        ),
+        Value(Decimal("0.00")),
+        output_field=DecimalField(max_digits=6, decimal_places=2),
+    )
+
+
+def _money(expression):
+    return Coalesce(
+        expression,
+        Value(Decimal("0.00")),
+        output_field=DecimalField(max_digits=12, decimal_places=2),
+    )
+
+
+def accrue_late_fees(as_of=None):
+    """
+    Set ``late_fee`` on every unreturned Borrowing overdue on ``as_of`` with
+    one UPDATE (driven by the outstanding-due-date partial index), then
+    rebuild FeeBalance with one INSERT ... SELECT grouped by patron. Fees are
+    recomputed from ``due_date``, so reruns on the same day change nothing.
+
+    Returns ``{"accrued", "patrons", "seconds"}``.
+    """
+    as_of = as_of or datetime.now().date()
+    started = time.perf_counter()
+    accrued = Borrowing.objects.filter(
+        return_date__isnull=True, due_date__lt=as_of
+    ).update(late_fee=late_fee_expression(as_of))
+
+    outstanding = Q(return_date__isnull=True)
+    totals = (
+        Borrowing.objects.filter(late_fee__gt=0)
+        .values("user_id")
+        .annotate(
+            overdue_loans=Count("id", filter=outstanding),
+            accruing=_money(Sum("late_fee", filter=outstanding)),
+            lifetime_charged=_money(Sum("late_fee", filter=~outstanding)),
+            as_of=Value(as_of, output_field=DateField()),
+        )
+        .order_by()
+    )
+    select, params = totals.query.sql_with_params()
+    quote = connection.ops.quote_name
+    columns = ", ".join(
+        quote(name)
+        for name in (
+            "user_id",
+            "overdue_loans",
+            "accruing",
+            "lifetime_charged",
+            "as_of",
+        )
+    )
+    with transaction.atomic():
+        FeeBalance.objects.all().delete()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {quote(FeeBalance._meta.db_table)} ({columns}) {select}",
+                params,
+            )
+            patrons = cursor.rowcount
+    return {
+        "accrued": accrued,
+        "patrons": patrons,
+        "seconds": time.perf_counter() - started,
+    }
@@ -0,0 +1,201 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import threading
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+import requests
+from requests.adapters import HTTPAdapter
+
+from project.http import async_session
+from project.metrics import upstream_call
+from . import metadata_cache
+from .isbn import is_valid_isbn13, normalize_isbn
+
+
+class BookLookupError(Exception):
+    pass
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """Process-wide keep-alive session sized for the lookup worker pool."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=1, pool_maxsize=settings.GOOGLE_BOOKS_MAX_WORKERS
+                )
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                _session = session
+    return _session
+
+
+def _check_status(isbn, status_code):
+    if status_code != 200:
+        raise BookLookupError(f"Failed to fetch book details for ISBN {isbn}")
+
+
+def _first_volume_info(book_data):
+    if not book_data.get("items"):
+        return None
+    return book_data["items"][0]["volumeInfo"]
+
+
+def fetch_volume_info(isbn, session=None):
+    """Return the first volumeInfo for ``isbn``, or None if Google has no match."""
+    session = session or get_session()
+    with upstream_call("books"):
+        response = session.get(
+            settings.GOOGLE_BOOKS_API_URL,
+            params={"q": f"isbn:{isbn}"},
+            timeout=settings.GOOGLE_BOOKS_TIMEOUT,
+        )
+        _check_status(isbn, response.status_code)
+        return _first_volume_info(response.json())
+
+
+async def afetch_volume_info(isbn):
+    """Async ``fetch_volume_info`` on the event loop's pooled aiohttp session."""
+    session = async_session(
+        "google-books",
+        settings.GOOGLE_BOOKS_ASYNC_CONNECTIONS,
+        settings.GOOGLE_BOOKS_TIMEOUT,
+    )
+    with upstream_call("books"):
+        async with session.get(
+            settings.GOOGLE_BOOKS_API_URL, params={"q": f"isbn:{isbn}"}
+        ) as response:
+            _check_status(isbn, response.status)
+            return _first_volume_info(await response.json())
+
+
+def volume_info_to_fields(isbn, volume_info):
+    image_links = volume_info.get("imageLinks", {})
+    return {
+        "isbn_13": isbn,
+        "isbn_10": next(
+            (
+                id["identifier"]
+                for id in volume_info.get("industryIdentifiers", [])
+                if id["type"] == "ISBN_10"
+            ),
+            None,
+        ),
+        "title": volume_info.get("title", ""),
+        "subtitle": volume_info.get("subtitle", ""),
+        "authors": ", ".join(volume_info.get("authors", [])),
+        "publisher": volume_info.get("publisher", ""),
+        "published_date": volume_info.get("publishedDate", ""),
+        "description": volume_info.get("description", ""),
+        "page_count": volume_info.get("pageCount"),
+        "categories": ", ".join(volume_info.get("categories", [])),
+        "language": volume_info.get("language", ""),
+        "preview_link": volume_info.get("previewLink", ""),
+        "info_link": volume_info.get("infoLink", ""),
+        "small_thumbnail": image_links.get("smallThumbnail", ""),
+        "thumbnail": image_links.get("thumbnail", ""),
+    }
+
+
+def _outcome(isbn, error):
+    if isinstance(error, BookLookupError):
+        return None, str(error)
+    return None, f"Error adding book with ISBN {isbn}: {str(error)}"
+
+
+def _fetch(isbn):
+    try:
+        return fetch_volume_info(isbn), None
+    except Exception as e:
+        return _outcome(isbn, e)
+
+
+async def _afetch(isbn, limit):
+    async with limit:
+        try:
+            return await afetch_volume_info(isbn), None
+        except Exception as e:
+            return _outcome(isbn, e)
+
+
+def _fetch_all(isbn_list, max_workers):
+    if max_workers <= 1 or len(isbn_list) <= 1:
+        return list(map(_fetch, isbn_list))
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(isbn_list))) as pool:
+        return list(pool.map(_fetch, isbn_list))
+
+
+def _plan(isbn_list):
+    keys = {isbn: normalize_isbn(isbn) for isbn in isbn_list}
+    valid = {key for key in keys.values() if is_valid_isbn13(key)}
+    known = metadata_cache.get_fresh(valid)
+    # One network request per distinct valid ISBN that isn't cached.
+    misses = list(
+        {
+            keys[isbn]: isbn
+            for isbn in isbn_list
+            if keys[isbn] in valid and keys[isbn] not in known
+        }.values()
+    )
+    return keys, known, misses
+
+
+def _results(isbn_list, keys, known, misses, outcomes):
+    errors = {}
+    fetched = {}
+    for isbn, (volume_info, error) in zip(misses, outcomes):
+        if error:
+            errors[keys[isbn]] = error
+        else:
+            fetched[keys[isbn]] = volume_info
+    metadata_cache.store(fetched)
+    known.update(fetched)
+
+    for isbn in isbn_list:
+        key = keys[isbn]
+        if not is_valid_isbn13(key):
+            yield isbn, None, f"Invalid ISBN {isbn}"
+        elif key in errors:
+            yield isbn, None, errors[key]
+        elif known.get(key) is None:
+            yield isbn, None, f"Book not found for ISBN {isbn}"
+        else:
+            # Books are stored under the normalized ISBN-13 only.
+            yield isbn, volume_info_to_fields(key, known[key]), None
+
+
+def _result_list(*args):
+    return list(_results(*args))
+
+
+def lookup_isbns(isbn_list, max_workers=None):
+    """
+    Resolve Book field dicts for every ISBN, consulting the persistent
+    metadata cache first and fetching only misses over a bounded thread pool.
+    Found volumes and "not found" answers are cached; transient failures are
+    not. Yields ``(isbn, fields, error)`` in input order; exactly one of
+    ``fields``/``error`` is set.
+    """
+    max_workers = max_workers or settings.GOOGLE_BOOKS_MAX_WORKERS
+    keys, known, misses = _plan(isbn_list)
+    outcomes = _fetch_all(misses, max_workers)
+    yield from _results(isbn_list, keys, known, misses, outcomes)
+
+
+async def alookup_isbns(isbn_list, max_concurrency=None):
+    """
+    ``lookup_isbns`` for async views: misses are fetched concurrently with
+    ``asyncio.gather`` (at most ``max_concurrency`` in flight) instead of a
+    thread pool. Returns the ``(isbn, fields, error)`` tuples as a list.
+    """
+    limit = asyncio.Semaphore(max_concurrency or settings.GOOGLE_BOOKS_MAX_WORKERS)
+    keys, known, misses = await sync_to_async(_plan)(isbn_list)
+    outcomes = await asyncio.gather(*(_afetch(isbn, limit) for isbn in misses))
+    return await sync_to_async(_result_list)(isbn_list, keys, known, misses, outcomes)
@@ -0,0 +1,57 @@
+import re
+
+_SEPARATORS = re.compile(r"[\s-]")
+# ASCII only: str.isdigit() also accepts superscripts and other scripts.
+_ISBN10 = re.compile(r"[0-9]{9}[0-9X]")
+_ISBN13 = re.compile(r"[0-9]{13}")
+
+
+def with_check_digit(body):
+    """ISBN-13 made of the 12-digit ``body`` and its check digit."""
+    total = sum(int(d) * (3 if i % 2 else 1) for i, d in enumerate(body))
+    return body + str((10 - total % 10) % 10)
+
+
+def isbn10_to_isbn13(isbn10):
+    return with_check_digit("978" + isbn10[:9])
+
+
+def is_valid_isbn10(isbn):
+    if not _ISBN10.fullmatch(isbn):
+        return False
+    digits = [int(d) for d in isbn[:9]] + [10 if isbn[9] == "X" else int(isbn[9])]
+    return sum(d * (10 - i) for i, d in enumerate(digits)) % 11 == 0
+
+
+def normalize_isbn(isbn):
+    """
+    Canonical cache/lookup key for an ISBN: separators stripped and valid
+    ISBN-10s converted to their ISBN-13 form. Anything else is returned
+    cleaned as-is, so ``is_valid_isbn13`` on the result validates the input.
+    """
+    isbn = _SEPARATORS.sub("", str(isbn)).upper()
+    if is_valid_isbn10(isbn):
+        return isbn10_to_isbn13(isbn)
+    return isbn
+
+
+def normalize_isbn_list(isbn_list):
+    """
+    ``(isbns, invalid)``: each input as a normalized ISBN-13 (duplicates
+    kept, in order) and the inputs that are not valid ISBN-10s or ISBN-13s.
+    """
+    isbns, invalid = [], []
+    for raw in isbn_list:
+        isbn = normalize_isbn(raw)
+        if is_valid_isbn13(isbn):
+            isbns.append(isbn)
+        else:
+            invalid.append(str(raw))
+    return isbns, invalid
+
+
+def is_valid_isbn13(isbn):
+    if not _ISBN13.fullmatch(isbn):
+        return False
+    total = sum(int(d) * (3 if i % 2 else 1) for i, d in enumerate(isbn[:12]))
+    return (10 - total % 10) % 10 == int(isbn[12])
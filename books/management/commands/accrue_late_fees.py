@@ -0,0 +1,27 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from books.fees import accrue_late_fees, fee_rate
+
+
+class Command(BaseCommand):
+    help = (
+        "Accrue late fees on every overdue, unreturned borrowing and rebuild "
+        "the per-patron fee balances. Run nightly; reruns are idempotent."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--date", type=date.fromisoformat, help="Run as of this day (YYYY-MM-DD)"
+        )
+
+    def handle(self, *args, **options):
+        result = accrue_late_fees(as_of=options["date"])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Accrued fees at {fee_rate()}/day on {result['accrued']} "
+                f"borrowings; {result['patrons']} patrons owe fees "
+                f"({result['seconds']:.1f}s)."
+            )
+        )
@@ -0,0 +1,56 @@
+import json
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+
+from books import stats
+from books.benchmarks import FakeBooksAPI, compare_add_books_modes
+from books.isbn import with_check_digit
+from books.models import Book, IsbnMetadata
+from users.models import UserProfile
+from users.views import get_tokens_for_user
+
+
+class Command(BaseCommand):
+    help = (
+        "Fire concurrent add_books requests at the sync view (on N worker "
+        "threads) and the async view (on one event loop) against a local "
+        "Google Books stub with injected latency, and report throughput and "
+        "latency percentiles. Creates and removes its own books and user; "
+        "run it against PostgreSQL."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=64, help="Per mode")
+        parser.add_argument("--isbns", type=int, default=4, help="Per request")
+        parser.add_argument(
+            "--latency", type=float, default=0.2, help="Upstream seconds per lookup"
+        )
+        parser.add_argument(
+            "--workers", type=int, default=4, help="Sync worker threads"
+        )
+
+    def handle(self, *args, **options):
+        prefix = "979999"
+        count, size = options["requests"], options["isbns"]
+        batches = [
+            [with_check_digit(f"{prefix}{(r * size + i):06d}") for i in range(size)]
+            for r in range(2 * count)
+        ]
+        user = User.objects.create_user(username="bench-async-io")
+        UserProfile.objects.create(auth_user=user, name=user.username, role="Librarian")
+        try:
+            token = get_tokens_for_user(user)["access"]
+            with FakeBooksAPI(latency=options["latency"]) as api, override_settings(
+                GOOGLE_BOOKS_API_URL=api.url
+            ):
+                results = compare_add_books_modes(token, batches, options["workers"])
+            results["upstream_latency_ms"] = options["latency"] * 1000
+            results["isbns_per_request"] = size
+        finally:
+            Book.objects.filter(isbn_13__startswith=prefix).delete()
+            IsbnMetadata.objects.filter(isbn__startswith=prefix).delete()
+            user.delete()
+            stats.reconcile()
+        self.stdout.write(json.dumps(results, indent=2))
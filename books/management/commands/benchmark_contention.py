@@ -0,0 +1,60 @@
+import json
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from books import stats
+from books.benchmarks import hammer_popular_book
+from books.models import Book, Borrowing
+from users.models import UserProfile
+
+
+class Command(BaseCommand):
+    help = (
+        "Hammer borrow/return on one popular book from many threads, verify the "
+        "availability invariants and report throughput. Creates and removes its "
+        "own book and users."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=16)
+        parser.add_argument("--copies", type=int, default=4)
+        parser.add_argument("--rounds", type=int, default=50)
+
+    def handle(self, *args, **options):
+        prefix = "bench-contention"
+        # The maintained stats count this book and its loans like any other;
+        # add and remove it the way the book views do.
+        with transaction.atomic():
+            book = Book.objects.create(
+                isbn_13="0000000000000",
+                title=f"{prefix} book",
+                publisher="bench",
+                quantity=options["copies"],
+                available=options["copies"],
+            )
+            stats.bump(total_books=1, catalog_version=1)
+        profiles = []
+        try:
+            for i in range(options["threads"]):
+                user = User.objects.create_user(username=f"{prefix}-{i}")
+                profiles.append(
+                    UserProfile.objects.create(auth_user=user, name=user.username)
+                )
+            results = hammer_popular_book(book, profiles, options["rounds"])
+        finally:
+            with transaction.atomic():
+                book.refresh_from_db(fields=["borrow_count"])
+                outstanding = Borrowing.objects.filter(
+                    book=book, return_date__isnull=True
+                ).count()
+                book.delete()
+                stats.bump(
+                    total_books=-1,
+                    total_borrowings=-book.borrow_count,
+                    outstanding_borrowings=-outstanding,
+                    catalog_version=1,
+                )
+            User.objects.filter(username__startswith=f"{prefix}-").delete()
+        self.stdout.write(json.dumps(results, indent=2))
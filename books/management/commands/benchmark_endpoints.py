@@ -0,0 +1,52 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from books.benchmarks import BENCHMARK_SIZES, benchmark_endpoints
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed synthetic libraries of several sizes and call every API route "
+        "through the test client, writing latency percentiles, SQL counts "
+        "and status codes per route to a JSON file. Seeded rows are rolled "
+        "back afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes",
+            type=int,
+            nargs="+",
+            default=list(BENCHMARK_SIZES),
+            help="Library sizes in books",
+        )
+        parser.add_argument("--repeat", type=int, default=20, help="Calls per route")
+        parser.add_argument(
+            "--warm-cache",
+            action="store_true",
+            help="Let repeated reads hit the response cache",
+        )
+        parser.add_argument("--seed", type=int, default=0, help="Random seed")
+        parser.add_argument("--output", default="benchmark-endpoints.json")
+
+    def handle(self, *args, **options):
+        results = benchmark_endpoints(
+            sizes=options["sizes"],
+            repeat=options["repeat"],
+            warm_cache=options["warm_cache"],
+            seed=options["seed"],
+            progress=self.stdout.write if options["verbosity"] > 1 else None,
+        )
+        with open(options["output"], "w") as f:
+            json.dump(results, f, indent=2)
+        for size, result in results["sizes"].items():
+            slowest = sorted(
+                result["endpoints"].items(), key=lambda item: -item[1]["p90_ms"]
+            )[:5]
+            self.stdout.write(f"{size} books, slowest p90:")
+            for route, summary in slowest:
+                self.stdout.write(
+                    f"  {route}: {summary['p90_ms']} ms, {summary['queries']} queries"
+                )
+        self.stdout.write(self.style.SUCCESS(f"Wrote {options['output']}"))
@@ -0,0 +1,136 @@
+from datetime import datetime
+import json
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from books.models import Book, BookNeighbor, Borrowing
+from books.recommendations import compute_neighbors, recommend_for
+from books.seeding import SEED_BATCH_SIZE
+from users.models import UserProfile
+
+PREFIX = "bench-recommendations"
+
+
+def _batched_create(model, rows, batch_size=SEED_BATCH_SIZE):
+    created, batch = [], []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            created += model.objects.bulk_create(batch)
+            batch = []
+    return created + model.objects.bulk_create(batch)
+
+
+class Command(BaseCommand):
+    help = (
+        "Time the co-borrow similarity build on synthetic data (Zipf-skewed "
+        "popularity) and, optionally, recommendation serving on that same data."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=100_000)
+        parser.add_argument("--books", type=int, default=50_000)
+        parser.add_argument("--borrows-per-user", type=int, default=20)
+        parser.add_argument("--top-k", type=int, default=20)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--serve",
+            type=int,
+            default=0,
+            help=(
+                "Also time recommend_for() for this many synthetic patrons; the "
+                "generated data is loaded in a transaction that is rolled back"
+            ),
+        )
+
+    def handle(self, *args, **options):
+        import numpy as np
+
+        rng = np.random.default_rng(options["seed"])
+        n_users, n_books = options["users"], options["books"]
+        size = n_users * options["borrows_per_user"]
+        user_ids = rng.integers(0, n_users, size=size)
+        book_ids = (rng.zipf(1.3, size=size) - 1) % n_books
+
+        started = time.perf_counter()
+        neighbors = compute_neighbors(user_ids, book_ids, options["top_k"])
+        build_seconds = time.perf_counter() - started
+        results = {
+            "users": n_users,
+            "books": n_books,
+            "borrow_pairs": size,
+            "build_seconds": round(build_seconds, 3),
+            "books_with_neighbors": len(neighbors),
+        }
+
+        if options["serve"]:
+            with transaction.atomic():
+                started = time.perf_counter()
+                profiles = self.load(user_ids, book_ids, neighbors, n_users, n_books)
+                results["load_seconds"] = round(time.perf_counter() - started, 3)
+                patrons = rng.choice(
+                    n_users, size=min(options["serve"], n_users), replace=False
+                )
+                timings = []
+                for patron in patrons:
+                    started = time.perf_counter()
+                    recommend_for(profiles[patron])
+                    timings.append((time.perf_counter() - started) * 1000)
+                transaction.set_rollback(True)
+            timings.sort()
+            results["serve_ms"] = {
+                "count": len(timings),
+                "p50": round(statistics.median(timings), 3),
+                "p95": round(timings[int((len(timings) - 1) * 0.95)], 3),
+                "max": round(timings[-1], 3),
+            }
+        self.stdout.write(json.dumps(results, indent=2))
+
+    def load(self, user_ids, book_ids, neighbors, n_users, n_books):
+        """
+        Insert the synthetic patrons, books, distinct borrow pairs and their
+        neighbours; returns the profiles indexed like ``user_ids``.
+        """
+        import numpy as np
+
+        users = _batched_create(
+            User, (User(username=f"{PREFIX}-{i}", password="!") for i in range(n_users))
+        )
+        profiles = _batched_create(
+            UserProfile, (UserProfile(auth_user=u, name=u.username) for u in users)
+        )
+        # No valid ISBN-13 starts with 0, so these never meet real books.
+        books = _batched_create(
+            Book,
+            (
+                Book(isbn_13=f"0{i:012d}", title=f"{PREFIX} {i}", publisher="bench")
+                for i in range(n_books)
+            ),
+        )
+        today = datetime.now().date()
+        pairs = np.unique(np.stack([user_ids, book_ids], axis=1), axis=0)
+        _batched_create(
+            Borrowing,
+            (
+                Borrowing(
+                    user=profiles[user],
+                    book=books[book],
+                    due_date=today,
+                    return_date=today,
+                )
+                for user, book in pairs.tolist()
+            ),
+        )
+        _batched_create(
+            BookNeighbor,
+            (
+                BookNeighbor(book=books[book], neighbor=books[other], score=score)
+                for book, entries in neighbors.items()
+                for other, score in entries
+            ),
+        )
+        return profiles
@@ -0,0 +1,75 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from books.models import Book
+from books.serializers import BOOK_FIELDS, book_to_dict, project_books
+from project.renderers import ORJSONRenderer
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare rows/second for a full Book payload: model instances + "
+        "book_to_dict + DRF JSONRenderer versus values() projection + orjson. "
+        "Synthetic rows are inserted in a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--books", type=int, default=10_000)
+        parser.add_argument("--repeat", type=int, default=3)
+
+    def best_of(self, repeat, fn):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            fn()
+            timings.append(time.perf_counter() - started)
+        return min(timings)
+
+    def handle(self, *args, **options):
+        count = options["books"]
+        with transaction.atomic():
+            Book.objects.bulk_create(
+                (
+                    Book(
+                        isbn_13=f"B{i:012d}",
+                        title=f"Benchmark title {i}",
+                        authors="Some Author, Another Author",
+                        publisher="Benchmark Press",
+                        description="Lorem ipsum dolor sit amet. " * 10,
+                        categories="Fiction",
+                        info_link="https://example.com/book",
+                    )
+                    for i in range(count)
+                ),
+                batch_size=2000,
+            )
+            queryset = Book.objects.filter(isbn_13__startswith="B").order_by("id")
+
+            def before():
+                JSONRenderer().render([book_to_dict(book) for book in queryset])
+
+            def after():
+                ORJSONRenderer().render(list(project_books(queryset, BOOK_FIELDS)))
+
+            def after_sparse():
+                ORJSONRenderer().render(
+                    list(project_books(queryset, ("id", "title", "authors")))
+                )
+
+            results = {"books": count}
+            for name, fn in (
+                ("before", before),
+                ("after", after),
+                ("after_sparse_fields", after_sparse),
+            ):
+                seconds = self.best_of(options["repeat"], fn)
+                results[name] = {
+                    "seconds": round(seconds, 4),
+                    "rows_per_second": round(count / seconds),
+                }
+            transaction.set_rollback(True)
+        self.stdout.write(json.dumps(results, indent=2))
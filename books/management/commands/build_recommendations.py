@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from books.recommendations import DEFAULT_TOP_K, build_neighbors
+
+
+class Command(BaseCommand):
+    help = "Rebuild the precomputed co-borrow neighbour table used by book_recommendations."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--top-k", type=int, default=DEFAULT_TOP_K)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        books, rows = build_neighbors(top_k=options["top_k"])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Stored {rows} neighbours for {books} books in "
+                f"{time.perf_counter() - started:.1f}s."
+            )
+        )
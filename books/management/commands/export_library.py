@@ -0,0 +1,57 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from books.exports import (
+    BORROWING_STATUSES,
+    CATALOG_STATUSES,
+    EXPORT_CHUNK_SIZE,
+    EXPORT_FORMATS,
+    EXPORTS,
+    InvalidExportFilter,
+)
+from books.streaming import STREAM_FORMATS
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream the book catalog or the borrowing ledger (with fees) as CSV or "
+        "NDJSON using a server-side cursor."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("dataset", choices=sorted(EXPORTS))
+        parser.add_argument("--format", choices=EXPORT_FORMATS, default="csv")
+        parser.add_argument("--output", help="File to write (default: stdout)")
+        parser.add_argument(
+            "--status",
+            choices=sorted(set(BORROWING_STATUSES + CATALOG_STATUSES)),
+            help="Row status filter",
+        )
+        parser.add_argument(
+            "--from", dest="from", help="Borrowed on or after (YYYY-MM-DD)"
+        )
+        parser.add_argument("--to", help="Borrowed on or before (YYYY-MM-DD)")
+        parser.add_argument("--chunk-size", type=int, default=EXPORT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        rows_for, columns = EXPORTS[options["dataset"]]
+        params = {
+            name: options[name]
+            for name in ("status", "from", "to")
+            if options[name] is not None
+        }
+        try:
+            rows = rows_for(params, chunk_size=options["chunk_size"])
+        except InvalidExportFilter as e:
+            raise CommandError(str(e))
+
+        render, _ = STREAM_FORMATS[options["format"]]
+        kwargs = {"columns": columns} if options["format"] == "csv" else {}
+        out = open(options["output"], "wb") if options["output"] else sys.stdout.buffer
+        try:
+            for chunk in render(rows, options["chunk_size"], **kwargs):
+                out.write(chunk)
+        finally:
+            if options["output"]:
+                out.close()
@@ -0,0 +1,82 @@
+import hashlib
+import os
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from books.catalog_import import (
+    IMPORT_BATCH_SIZE,
+    IMPORT_FORMATS,
+    MAX_JOB_LENGTH,
+    import_catalog,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream books from a CSV or JSONL file into the catalog, upserting on "
+        "ISBN-13. Resumes from its checkpoint when rerun for the same job."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="CSV/JSONL file (use '-' for stdin)")
+        parser.add_argument(
+            "--format",
+            choices=IMPORT_FORMATS,
+            help="Input format (default: from the file extension)",
+        )
+        parser.add_argument(
+            "--job",
+            help=(
+                "Checkpoint name (default: a hash of the file's absolute path, "
+                "size and mtime)"
+            ),
+        )
+        parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE)
+        parser.add_argument(
+            "--restart", action="store_true", help="Ignore the job's checkpoint"
+        )
+
+    def progress(self, result):
+        self.stdout.write(
+            f"rows={result['rows']} created={result['created']} "
+            f"updated={result['updated']} invalid={result['invalid']} "
+            f"rows/s={result['rows_per_second']:.0f}"
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        fmt = options["format"] or os.path.splitext(path)[1].lstrip(".").lower()
+        if fmt not in IMPORT_FORMATS:
+            raise CommandError("Cannot tell the format; pass --format csv|jsonl.")
+        if options["job"] and len(options["job"]) > MAX_JOB_LENGTH:
+            raise CommandError(f"--job is at most {MAX_JOB_LENGTH} characters.")
+        if path == "-":
+            job = options["job"]
+            stream = sys.stdin
+        else:
+            # A replaced or appended file is a new job, not a resume. Hashed
+            # so long paths still fit the checkpoint name.
+            st = os.stat(path)
+            key = f"{os.path.abspath(path)}:{st.st_size}:{st.st_mtime_ns}"
+            job = options["job"] or hashlib.sha256(key.encode()).hexdigest()
+            stream = open(path, newline="", encoding="utf-8-sig")
+
+        with stream:
+            result = import_catalog(
+                stream,
+                fmt,
+                job=job,
+                batch_size=options["batch_size"],
+                restart=options["restart"],
+                progress=self.progress if options["verbosity"] > 0 else None,
+            )
+        for error in result["errors"]:
+            self.stderr.write(f"row {error['row']}: {error['error']}")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported {result['rows']} rows: {result['created']} created, "
+                f"{result['updated']} updated, {result['invalid']} invalid in "
+                f"{result['seconds']:.1f}s ({result['rows_per_second']:.0f} rows/s)."
+            )
+        )
@@ -0,0 +1,62 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+import requests
+
+from books.benchmarks import LOAD_TEST_PATHS, load_test
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-test a running server (e.g. gunicorn -c gunicorn.conf.py) with "
+        "concurrent keep-alive clients on read endpoints and report "
+        "throughput and latency percentiles."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--url", default="http://127.0.0.1:8000")
+        parser.add_argument("--concurrency", type=int, default=16)
+        parser.add_argument("--seconds", type=int, default=20)
+        parser.add_argument(
+            "--path",
+            action="append",
+            dest="paths",
+            help="Path to request (repeatable); defaults to a read mix",
+        )
+        parser.add_argument("--username", help="Sign in to send a JWT")
+        parser.add_argument("--password")
+        parser.add_argument("--output", help="Also write the result as JSON here")
+
+    def handle(self, *args, **options):
+        token = None
+        if options["username"]:
+            response = requests.post(
+                f"{options['url']}/api/users/api/token/",
+                json={
+                    "username": options["username"],
+                    "password": options["password"],
+                },
+            )
+            if response.status_code != 200:
+                raise CommandError(f"Sign-in failed: {response.status_code}")
+            token = response.json()["tokens"]["access"]
+
+        result = load_test(
+            options["url"],
+            paths=options["paths"] or LOAD_TEST_PATHS,
+            concurrency=options["concurrency"],
+            seconds=options["seconds"],
+            token=token,
+        )
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                json.dump(result, f, indent=2)
+        self.stdout.write(
+            f"{result['requests']} requests in {result['seconds']}s: "
+            f"{result['requests_per_second']} req/s, p50 {result['p50_ms']} ms, "
+            f"p95 {result['p95_ms']} ms, {result['errors']} errors"
+        )
+        for path, summary in result["paths"].items():
+            self.stdout.write(
+                f"  {path}: p50 {summary['p50_ms']} ms, p95 {summary['p95_ms']} ms"
+            )
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from books import stats
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the library stats row and per-book borrow counts from "
+        "Book/Borrowing and fix any drift. Safe to run periodically."
+    )
+
+    def handle(self, *args, **options):
+        drift, books_fixed = stats.reconcile()
+        for field, (stored, actual) in drift.items():
+            self.stdout.write(f"{field}: {stored} -> {actual}")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Reconciled stats: {len(drift)} totals and {books_fixed} "
+                "book borrow counts corrected."
+            )
+        )
@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from books.seeding import SEED_BATCH_SIZE, clear_seeded_library, seed_library
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate a synthetic library (users, books, skewed borrowings, "
+        "notifications) with bulk inserts, for benchmarks and load tests."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1_000)
+        parser.add_argument("--books", type=int, default=10_000)
+        parser.add_argument("--borrowings", type=int, default=50_000)
+        parser.add_argument("--notifications", type=int, default=20_000)
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=365,
+            help="Spread borrowings over this many days",
+        )
+        parser.add_argument("--seed", type=int, default=0, help="Random seed")
+        parser.add_argument("--batch-size", type=int, default=SEED_BATCH_SIZE)
+        parser.add_argument(
+            "--clear",
+            action="store_true",
+            help="Delete previously seeded data first",
+        )
+
+    def handle(self, *args, **options):
+        if options["clear"]:
+            deleted = clear_seeded_library()
+            self.stdout.write(f"Cleared {deleted} seeded rows.")
+        try:
+            result = seed_library(
+                users=options["users"],
+                books=options["books"],
+                borrowings=options["borrowings"],
+                notifications=options["notifications"],
+                days=options["days"],
+                seed=options["seed"],
+                batch_size=options["batch_size"],
+                progress=self.stdout.write if options["verbosity"] > 1 else None,
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Seeded {result['users']} users, {result['books']} books, "
+                f"{result['borrowings']} borrowings and {result['notifications']} "
+                f"notifications in {result['seconds']:.1f}s."
+            )
+        )
@@ -0,0 +1,54 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from books import metadata_cache
+from books.google_books import lookup_isbns
+
+
+class Command(BaseCommand):
+    help = "Pre-fetch Google Books metadata for a list of ISBNs into the ISBN cache."
+
+    def add_arguments(self, parser):
+        parser.add_argument("isbns", nargs="*", help="ISBNs to warm")
+        parser.add_argument(
+            "--file", help="File with one ISBN per line (use '-' for stdin)"
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=500, help="ISBNs resolved per batch"
+        )
+        parser.add_argument("--workers", type=int, help="Concurrent lookups")
+
+    def handle(self, *args, **options):
+        isbns = list(options["isbns"])
+        if options["file"]:
+            if options["file"] == "-":
+                isbns.extend(line.strip() for line in sys.stdin)
+            else:
+                with open(options["file"]) as f:
+                    isbns.extend(line.strip() for line in f)
+        isbns = [isbn for isbn in isbns if isbn]
+        if not isbns:
+            raise CommandError("No ISBNs given.")
+
+        metadata_cache.reset_cache_stats()
+        batch_size = options["batch_size"]
+        found = failed = 0
+        for start in range(0, len(isbns), batch_size):
+            batch = isbns[start : start + batch_size]
+            for isbn, fields, error in lookup_isbns(batch, options["workers"]):
+                if fields:
+                    found += 1
+                elif not error.startswith("Book not found"):
+                    failed += 1
+                    self.stderr.write(error)
+
+        stats = metadata_cache.cache_stats()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Warmed {len(isbns)} ISBNs: {found} found, {failed} failed; "
+                f"cache hits={stats['hits']} negative_hits={stats['negative_hits']} "
+                f"misses={stats['misses']} stored={stats['stores']} "
+                f"evicted={stats['evictions']}"
+            )
+        )
@@ -0,0 +1,126 @@
+from datetime import timedelta
+import threading
+
+from django.conf import settings
+from django.utils import timezone
+
+from project import metrics
+from .isbn import is_valid_isbn13
+from .models import IsbnMetadata
+
+_stats = {"hits": 0, "negative_hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+_stats_lock = threading.Lock()
+_stored_since_evict = 0
+
+# Per-process counter -> (metric, labels) in project.metrics, which the
+# /api/metrics/ view merges across workers.
+_METRICS = {
+    "hits": ("isbn_cache_lookups_total", (("result", "hit"),)),
+    "negative_hits": ("isbn_cache_lookups_total", (("result", "negative_hit"),)),
+    "misses": ("isbn_cache_lookups_total", (("result", "miss"),)),
+    "stores": ("isbn_cache_stores_total", ()),
+    "evictions": ("isbn_cache_evictions_total", ()),
+}
+
+
+def _count(**deltas):
+    with _stats_lock:
+        for key, value in deltas.items():
+            _stats[key] += value
+    for key, value in deltas.items():
+        if value:
+            metrics.inc(*_METRICS[key], value)
+
+
+def cache_stats():
+    """
+    Hit/miss counters for this process since start (or the last reset);
+    the same counts are exported across workers as ``isbn_cache_*`` metrics.
+    """
+    with _stats_lock:
+        return dict(_stats)
+
+
+def reset_cache_stats():
+    with _stats_lock:
+        for key in _stats:
+            _stats[key] = 0
+
+
+def get_fresh(isbns):
+    """
+    Return ``{isbn: volume_info_or_None}`` for every ISBN with an unexpired
+    entry, in one query. Positive entries live for ``ISBN_CACHE_TTL``,
+    negative ones for ``ISBN_CACHE_NEGATIVE_TTL``.
+    """
+    isbns = set(isbns)
+    if not isbns:
+        return {}
+    now = timezone.now()
+    positive_cutoff = now - timedelta(seconds=settings.ISBN_CACHE_TTL)
+    negative_cutoff = now - timedelta(seconds=settings.ISBN_CACHE_NEGATIVE_TTL)
+    found = {}
+    for isbn, volume_info, fetched_at in IsbnMetadata.objects.filter(
+        isbn__in=isbns, fetched_at__gte=min(positive_cutoff, negative_cutoff)
+    ).values_list("isbn", "volume_info", "fetched_at"):
+        cutoff = negative_cutoff if volume_info is None else positive_cutoff
+        if fetched_at >= cutoff:
+            found[isbn] = volume_info
+
+    negative = sum(1 for v in found.values() if v is None)
+    _count(
+        hits=len(found) - negative,
+        negative_hits=negative,
+        misses=len(isbns) - len(found),
+    )
+    return found
+
+
+def store(entries):
+    """
+    Upsert ``{isbn: volume_info_or_None}``. Keys must be normalized
+    ISBN-13s; anything else is skipped. Every ``ISBN_CACHE_EVICT_EVERY``
+    stores the table is trimmed back to its bound.
+    """
+    global _stored_since_evict
+    entries = {
+        isbn: volume_info
+        for isbn, volume_info in entries.items()
+        if is_valid_isbn13(isbn)
+    }
+    if not entries:
+        return
+    now = timezone.now()
+    IsbnMetadata.objects.bulk_create(
+        [
+            IsbnMetadata(isbn=isbn, volume_info=volume_info, fetched_at=now)
+            for isbn, volume_info in entries.items()
+        ],
+        update_conflicts=True,
+        unique_fields=["isbn"],
+        update_fields=["volume_info", "fetched_at"],
+    )
+    _count(stores=len(entries))
+    with _stats_lock:
+        _stored_since_evict += len(entries)
+        due = _stored_since_evict >= settings.ISBN_CACHE_EVICT_EVERY
+        if due:
+            _stored_since_evict = 0
+    if due:
+        evict()
+
+
+def evict():
+    """Drop the oldest entries once the table grows past ``ISBN_CACHE_MAX_ENTRIES``."""
+    max_entries = settings.ISBN_CACHE_MAX_ENTRIES
+    overflow = IsbnMetadata.objects.count() - max_entries
+    if overflow <= 0:
+        return 0
+    stale_ids = list(
+        IsbnMetadata.objects.order_by("fetched_at", "id").values_list("id", flat=True)[
+            :overflow
+        ]
+    )
+    deleted, _ = IsbnMetadata.objects.filter(id__in=stale_ids).delete()
+    _count(evictions=deleted)
+    return deleted
@@ -1,3 +1,4 @@
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 from django.contrib.auth.models import User
 import random
@@ -53,6 +54,15 @@ class Book(models.Model):
     thumbnail = models.URLField(max_length=500, blank=True, null=True)
     quantity = models.IntegerField(default=1)
     available = models.IntegerField(default=1)
+    # Lifetime borrowings, bumped in the same UPDATE that claims a copy.
+    borrow_count = models.PositiveIntegerField(default=0, editable=False)
+    # Maintained by a database trigger on PostgreSQL (books.search).
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["-borrow_count", "id"], name="book_popularity_idx"),
+        ]
 
     def __str__(self):
         return self.title
@@ -66,15 +76,120 @@ class Borrowing(models.Model):
     return_date = models.DateField(null=True, blank=True)
     late_fee = models.DecimalField(max_digits=6, decimal_places=2, default=0)
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["due_date"],
+                condition=models.Q(return_date__isnull=True),
+                name="borrowing_outstanding_due_idx",
+            ),
+        ]
+
     def __str__(self):
         return f"{self.user.name} - {self.book.title}"
 
 
+class FeeBalance(models.Model):
+    # Per-patron late-fee totals rebuilt in bulk by the accrue_late_fees
+    # command (books.fees); one primary-key lookup serves a patron's balance.
+    user = models.OneToOneField(UserProfile, on_delete=models.CASCADE, primary_key=True)
+    overdue_loans = models.PositiveIntegerField(default=0)
+    # Fees accrued so far on copies still out, and the lifetime total charged
+    # on returned ones. There is no payment model, so the latter is history,
+    # not money owed.
+    accruing = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    lifetime_charged = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    as_of = models.DateField()
+
+    def __str__(self):
+        return f"{self.user_id}: {self.accruing} accruing as of {self.as_of}"
+
+
 class Notification(models.Model):
     user = models.ForeignKey(UserProfile, on_delete=models.CASCADE)
     message = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
     is_read = models.BooleanField(default=False)
+    # Set for overdue reminders so each borrowing is notified once per day.
+    borrowing = models.ForeignKey(
+        Borrowing, on_delete=models.CASCADE, null=True, blank=True
+    )
+    notify_date = models.DateField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["borrowing", "notify_date"], name="unique_daily_reminder"
+            ),
+        ]
+        indexes = [
+            # newest-first keyset pages per user
+            models.Index(
+                fields=["user", "-created_at", "-id"], name="notification_feed_idx"
+            ),
+            # unread counts and unread-only pages
+            models.Index(
+                fields=["user", "is_read", "created_at"], name="notification_unread_idx"
+            ),
+        ]
 
     def __str__(self):
         return f"{self.user.name} - {self.message[:20]}"
+
+
+class IsbnMetadata(models.Model):
+    # Cached Google Books volumeInfo keyed by normalized ISBN-13.
+    # volume_info is null for negative entries ("Book not found").
+    isbn = models.CharField(max_length=13, unique=True)
+    volume_info = models.JSONField(null=True, blank=True)
+    fetched_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return self.isbn
+
+
+class LibraryStats(models.Model):
+    # Running totals kept up to date by the views that add/delete books and
+    # borrow/return them, split over STATS_SHARDS rows (pk 1..n) so writers
+    # don't queue on one row lock; the totals are the sums. See books.stats.
+    total_books = models.BigIntegerField(default=0)
+    total_borrowings = models.BigIntegerField(default=0)
+    outstanding_borrowings = models.BigIntegerField(default=0)
+    # Bumped by every write that changes a book payload (including
+    # available); the sum over shards and latest modification drive
+    # ETag/Last-Modified on the catalog endpoints.
+    catalog_version = models.BigIntegerField(default=0)
+    catalog_modified = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.total_books} books, {self.total_borrowings} borrowings"
+
+
+class BookNeighbor(models.Model):
+    # Top-K precomputed "borrowed together" neighbours per book, rebuilt by
+    # the build_recommendations command (books.recommendations).
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name="neighbors")
+    neighbor = models.ForeignKey(Book, on_delete=models.CASCADE, related_name="+")
+    score = models.FloatField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["book", "neighbor"], name="unique_book_neighbor"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.book_id} -> {self.neighbor_id} ({self.score:.3f})"
+
+
+class JobCheckpoint(models.Model):
+    # Last processed key of a resumable batch job, e.g. overdue reminders.
+    name = models.CharField(max_length=100, unique=True)
+    position = models.BigIntegerField(default=0)
+    completed = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} @ {self.position}"
@@ -0,0 +1,90 @@
+from datetime import datetime
+import time
+
+from django.db import transaction
+
+from .models import Borrowing, JobCheckpoint, Notification
+
+OVERDUE_CHUNK_SIZE = 5000
+
+
+def overdue_message(title, due_date, today):
+    days = (today - due_date).days
+    return (
+        f'"{title}" was due on {due_date.isoformat()} and is {days} '
+        f'day{"s" if days != 1 else ""} overdue. Please return it.'
+    )
+
+
+def generate_overdue_notifications(
+    today=None, chunk_size=OVERDUE_CHUNK_SIZE, restart=False, progress=None
+):
+    """
+    Create one reminder Notification per overdue, unreturned Borrowing for
+    ``today``. Borrowings are streamed in id order ``chunk_size`` at a time;
+    each chunk is inserted with one ``bulk_create`` and commits together with
+    a checkpoint, so a crashed run resumes after the last committed chunk.
+    The (borrowing, notify_date) unique constraint makes reruns idempotent.
+
+    ``progress`` is called with the running stats dict after every chunk.
+    Returns ``{"scanned", "created", "seconds", "rows_per_second"}``.
+    """
+    today = today or datetime.now().date()
+    checkpoint, _ = JobCheckpoint.objects.get_or_create(
+        name=f"overdue-notifications:{today.isoformat()}"
+    )
+    if restart:
+        checkpoint.position, checkpoint.completed = 0, False
+        checkpoint.save()
+
+    result = {"scanned": 0, "created": 0, "seconds": 0.0, "rows_per_second": 0.0}
+    started = time.perf_counter()
+    last_id = checkpoint.position
+    while not checkpoint.completed:
+        chunk = list(
+            Borrowing.objects.filter(
+                return_date__isnull=True, due_date__lt=today, id__gt=last_id
+            )
+            .order_by("id")
+            .values_list("id", "user_id", "due_date", "book__title")[:chunk_size]
+        )
+        with transaction.atomic():
+            if chunk:
+                last_id = chunk[-1][0]
+                # A second run of the same day's job waits here, so it sees
+                # every reminder the first one committed for this chunk.
+                list(
+                    JobCheckpoint.objects.select_for_update()
+                    .filter(pk=checkpoint.pk)
+                    .values_list("pk", flat=True)
+                )
+                reminders = Notification.objects.filter(
+                    borrowing_id__in=[row[0] for row in chunk], notify_date=today
+                )
+                already = set(reminders.values_list("borrowing_id", flat=True))
+                Notification.objects.bulk_create(
+                    [
+                        Notification(
+                            user_id=user_id,
+                            borrowing_id=borrowing_id,
+                            notify_date=today,
+                            message=overdue_message(title, due_date, today),
+                        )
+                        for borrowing_id, user_id, due_date, title in chunk
+                        if borrowing_id not in already
+                    ],
+                    ignore_conflicts=True,
+                )
+                # bulk_create returns every object, skipped conflicts too:
+                # count the rows that actually landed.
+                result["scanned"] += len(chunk)
+                result["created"] += reminders.count() - len(already)
+            checkpoint.position = last_id
+            checkpoint.completed = len(chunk) < chunk_size
+            checkpoint.save(update_fields=["position", "completed", "updated_at"])
+
+        result["seconds"] = time.perf_counter() - started
+        result["rows_per_second"] = result["scanned"] / max(result["seconds"], 1e-9)
+        if progress:
+            progress(result)
+    return result
@@ -0,0 +1,114 @@
+import base64
+import binascii
+import json
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(position, reverse=False):
+    payload = json.dumps({"p": list(position), "r": reverse}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return list(payload["p"]), bool(payload["r"])
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        raise InvalidCursor("Invalid cursor.")
+
+
+def get_page_size(request):
+    default = getattr(settings, "CURSOR_PAGE_SIZE", 50)
+    maximum = getattr(settings, "CURSOR_MAX_PAGE_SIZE", 500)
+    try:
+        page_size = int(request.query_params.get("page_size", default))
+    except (TypeError, ValueError):
+        page_size = default
+    return max(1, min(page_size, maximum))
+
+
+def _parse_position(model, fields, position):
+    # Cursors come from clients: each value must convert to its field's type.
+    if len(position) != len(fields):
+        raise InvalidCursor("Invalid cursor.")
+    parsed = []
+    for field, value in zip(fields, position):
+        try:
+            value = model._meta.get_field(field).to_python(value)
+        except (ValidationError, TypeError, ValueError):
+            raise InvalidCursor("Invalid cursor.")
+        if value is None:
+            raise InvalidCursor("Invalid cursor.")
+        parsed.append(value)
+    return parsed
+
+
+def _after(fields, position, descending):
+    # Row-value comparison spelled out as nested Qs so it works on every backend:
+    # (a, b) > (x, y)  <=>  a > x OR (a = x AND b > y)
+    lookup = "lt" if descending else "gt"
+    condition = Q()
+    equal = Q()
+    for field, value in zip(fields, position):
+        condition |= equal & Q(**{f"{field}__{lookup}": value})
+        equal &= Q(**{field: value})
+    return condition
+
+
+def keyset_paginate(queryset, request, fields=("id",), descending=False, key=None):
+    """
+    Slice ``queryset`` into one page ordered by ``fields`` using an opaque
+    cursor from ``?cursor=``. Returns ``(rows, next_cursor, previous_cursor)``.
+
+    ``key`` extracts the cursor position from a row; by default the ordering
+    fields are read as attributes (or dict keys for ``values()`` querysets).
+    """
+    page_size = get_page_size(request)
+    cursor = request.query_params.get("cursor")
+    position, reverse = decode_cursor(cursor) if cursor else (None, False)
+    if position is not None:
+        position = _parse_position(queryset.model, fields, position)
+
+    if key is None:
+
+        def key(row):
+            if isinstance(row, dict):
+                return [row[field] for field in fields]
+            return [getattr(row, field) for field in fields]
+
+    scan_descending = descending != reverse
+    prefix = "-" if scan_descending else ""
+    queryset = queryset.order_by(*(prefix + field for field in fields))
+    if position is not None:
+        queryset = queryset.filter(_after(fields, position, scan_descending))
+
+    rows = list(queryset[: page_size + 1])
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    if reverse:
+        rows.reverse()
+
+    next_cursor = previous_cursor = None
+    if rows:
+        has_next = has_more if not reverse else True
+        has_previous = has_more if reverse else position is not None
+        if has_next:
+            next_cursor = encode_cursor(_jsonable(key(rows[-1])))
+        if has_previous:
+            previous_cursor = encode_cursor(_jsonable(key(rows[0])), reverse=True)
+    return rows, next_cursor, previous_cursor
+
+
+def _jsonable(position):
+    return [
+        value.isoformat() if hasattr(value, "isoformat") else value
+        for value in position
+    ]
@@ -0,0 +1,165 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Sum
+
+from .models import Book, BookNeighbor, Borrowing
+
+DEFAULT_TOP_K = 20
+# Category-overlap neighbours for cold-start books rank below any real
+# co-borrow signal.
+COLD_START_WEIGHT = 0.01
+
+
+def compute_neighbors(user_ids, book_ids, top_k=DEFAULT_TOP_K):
+    """
+    Item-item cosine similarity from (user, book) borrow pairs.
+
+    Builds the binary user x book incidence matrix X, takes the sparse
+    co-occurrence X.T @ X and normalizes by sqrt(n_i * n_j) where n is the
+    number of distinct borrowers per book. Returns ``{book_id: [(neighbor_id,
+    score), ...]}`` with at most ``top_k`` entries per book, best first.
+    """
+    # numpy/scipy are only needed by the batch build; keep them out of the
+    # web workers that just serve recommend_for().
+    import numpy as np
+    from scipy import sparse
+
+    user_ids = np.asarray(user_ids)
+    book_ids = np.asarray(book_ids)
+    if not len(book_ids):
+        return {}
+    users, user_index = np.unique(user_ids, return_inverse=True)
+    books, book_index = np.unique(book_ids, return_inverse=True)
+
+    incidence = sparse.csr_matrix(
+        (np.ones(len(book_index), dtype=np.float32), (user_index, book_index)),
+        shape=(len(users), len(books)),
+    )
+    incidence.data[:] = 1  # repeat borrows by one user count once
+    co = (incidence.T @ incidence).tocsr()
+    borrowers = co.diagonal()
+    co.setdiag(0)
+    co.eliminate_zeros()
+
+    # cosine: scale each stored (i, j) by 1 / sqrt(n_i * n_j)
+    norms = np.sqrt(borrowers)
+    rows = np.repeat(np.arange(co.shape[0]), np.diff(co.indptr))
+    co.data = co.data / (norms[rows] * norms[co.indices])
+
+    neighbors = {}
+    for i in range(co.shape[0]):
+        start, end = co.indptr[i], co.indptr[i + 1]
+        if start == end:
+            continue
+        scores = co.data[start:end]
+        cols = co.indices[start:end]
+        if len(scores) > top_k:
+            best = np.argpartition(-scores, top_k)[:top_k]
+            scores, cols = scores[best], cols[best]
+        order = np.lexsort((books[cols], -scores))
+        neighbors[int(books[i])] = [
+            (int(books[cols[j]]), float(scores[j])) for j in order
+        ]
+    return neighbors
+
+
+def category_neighbors(missing, top_k=DEFAULT_TOP_K):
+    """
+    Cold-start neighbours from ``categories`` overlap for the book ids in
+    ``missing``, preferring the most borrowed books of each shared category.
+    """
+    if not missing:
+        return {}
+    by_category = defaultdict(list)
+    book_categories = {}
+    for book_id, categories in (
+        Book.objects.exclude(categories__isnull=True)
+        .exclude(categories="")
+        .order_by("-borrow_count", "id")
+        .values_list("id", "categories")
+        .iterator(chunk_size=5000)
+    ):
+        names = {c.strip().lower() for c in categories.split(",") if c.strip()}
+        if book_id in missing:
+            book_categories[book_id] = names
+        for name in names:
+            # only the most popular few per category can ever be picked
+            if len(by_category[name]) <= top_k:
+                by_category[name].append(book_id)
+
+    neighbors = {}
+    for book_id, names in book_categories.items():
+        shared = defaultdict(int)
+        rank = {}
+        for name in names:
+            for position, other in enumerate(by_category[name]):
+                if other != book_id:
+                    shared[other] += 1
+                    rank[other] = min(rank.get(other, position), position)
+        best = sorted(shared, key=lambda other: (-shared[other], rank[other], other))
+        neighbors[book_id] = [
+            (other, COLD_START_WEIGHT * shared[other] / len(names))
+            for other in best[:top_k]
+        ]
+    return neighbors
+
+
+def build_neighbors(top_k=DEFAULT_TOP_K, batch_size=5000):
+    """
+    Rebuild BookNeighbor from the whole Borrowing ledger. Books nobody has
+    borrowed alongside anything else fall back to category overlap. Returns
+    ``(books_with_neighbors, rows_written)``.
+    """
+    import numpy as np
+
+    pairs = np.fromiter(
+        (
+            value
+            for pair in Borrowing.objects.order_by()
+            .values_list("user_id", "book_id")
+            .distinct()
+            .iterator(chunk_size=batch_size)
+            for value in pair
+        ),
+        dtype=np.int64,
+    ).reshape(-1, 2)
+    neighbors = compute_neighbors(pairs[:, 0], pairs[:, 1], top_k)
+
+    missing = set(Book.objects.values_list("id", flat=True)) - set(neighbors)
+    neighbors.update(category_neighbors(missing, top_k))
+
+    rows = (
+        BookNeighbor(book_id=book_id, neighbor_id=other, score=score)
+        for book_id, entries in neighbors.items()
+        for other, score in entries
+    )
+    written = 0
+    with transaction.atomic():
+        BookNeighbor.objects.all().delete()
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= batch_size:
+                BookNeighbor.objects.bulk_create(batch)
+                written += len(batch)
+                batch = []
+        BookNeighbor.objects.bulk_create(batch)
+        written += len(batch)
+    return len(neighbors), written
+
+
+def recommend_for(user_profile, limit=5, history=50):
+    """
+    Merge the precomputed neighbours of the patron's last ``history`` borrowed
+    books in one query, dropping books they have already borrowed.
+    """
+    borrowed = Borrowing.objects.filter(user=user_profile).values("book_id")
+    recent = borrowed.order_by("-borrow_date", "-id")[:history]
+    return list(
+        BookNeighbor.objects.filter(book_id__in=recent)
+        .exclude(neighbor_id__in=borrowed)
+        .values("neighbor_id", "neighbor__title", "neighbor__authors")
+        .annotate(total=Sum("score"))
+        .order_by("-total", "neighbor_id")[:limit]
+    )
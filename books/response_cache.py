@@ -0,0 +1,192 @@
+from functools import wraps
+import hashlib
+import os
+import time
+import uuid
+
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from rest_framework.response import Response
+
+CACHE_ALIAS = "responses"
+STATS_FLUSH_INTERVAL = 1.0  # seconds between per-worker stats writes
+STATS_TTL = 600  # seconds a silent (or recycled) worker stays reported
+STATS_SLOTS = 256  # most workers cache_stats() can see at once
+
+# Which cached data each model's writes make stale. "catalog" covers every
+# book field; "stock" only the copy counts that loans and returns move.
+MODEL_TAGS = {
+    "Book": ("catalog",),
+    "Borrowing": ("stock", "borrowings"),
+}
+
+_stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+_last_flush = 0.0
+_slot = None
+
+
+def _cache():
+    return caches[CACHE_ALIAS]
+
+
+def _generation_key(tag):
+    return f"respcache:gen:{tag}"
+
+
+def _generations(tags):
+    """
+    Current generation token per tag. Tokens are random rather than counters
+    so a culled or expired token can never bring old entries back.
+    """
+    cache = _cache()
+    keys = [_generation_key(tag) for tag in tags]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            cache.add(key, uuid.uuid4().hex, timeout=None)
+            found[key] = cache.get(key)
+    return [found[key] for key in keys]
+
+
+def invalidate(*tags):
+    """Make every cached response that depends on ``tags`` unreachable."""
+    if not tags:
+        return
+    _cache().set_many(
+        {_generation_key(tag): uuid.uuid4().hex for tag in tags}, timeout=None
+    )
+    _count("evictions", len(tags))
+
+
+def invalidate_on_commit(*tags):
+    # Evicting before commit would let a concurrent request re-cache the
+    # old rows; wait until the change is visible.
+    transaction.on_commit(lambda: invalidate(*tags))
+
+
+def _normalized_query(request):
+    params = sorted(
+        (key, value)
+        for key, values in request.query_params.lists()
+        for value in values
+        if value != ""
+    )
+    return hashlib.blake2b(repr(params).encode(), digest_size=12).hexdigest()
+
+
+def cached_response(name, tags, timeout=300, bypass_params=()):
+    """
+    Cache a view's 200 response data in the shared ``responses`` cache, keyed
+    on the view ``name``, the normalized query string and the generation of
+    each of ``tags`` (or of the tags a ``tags(request)`` callable returns).
+    Requests carrying any of ``bypass_params`` skip the cache. Apply below
+    @api_view/@permission_classes so access checks run on every request.
+    """
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method != "GET" or any(
+                param in request.query_params for param in bypass_params
+            ):
+                return view(request, *args, **kwargs)
+
+            key = "respcache:{}:{}:{}".format(
+                name,
+                ".".join(_generations(tags(request) if callable(tags) else tags)),
+                _normalized_query(request),
+            )
+            cache = _cache()
+            data = cache.get(key)
+            if data is not None:
+                _count("hits")
+                return Response(data)
+
+            _count("misses")
+            response = view(request, *args, **kwargs)
+            if response.status_code == 200 and isinstance(response, Response):
+                cache.set(key, response.data, timeout)
+                _count("stores")
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def _count(name, amount=1):
+    global _last_flush
+    _stats[name] += amount
+    now = time.monotonic()
+    if now - _last_flush >= STATS_FLUSH_INTERVAL:
+        _last_flush = now
+        _flush_stats()
+
+
+def _slot_key(slot):
+    return f"respcache:worker:{slot}"
+
+
+def _stats_key(pid):
+    return f"respcache:stats:{pid}"
+
+
+def _claim_slot(cache, pid):
+    # add() is atomic, so two workers never take the same free slot.
+    keys = [_slot_key(slot) for slot in range(STATS_SLOTS)]
+    taken = cache.get_many(keys)
+    for slot, key in enumerate(keys):
+        if key not in taken and cache.add(key, pid, timeout=STATS_TTL):
+            return slot
+    return None
+
+
+def _flush_stats():
+    # Each worker publishes its own counters under its pid and holds one
+    # slot key naming that pid; both expire unless refreshed, so recycled
+    # workers drop out of cache_stats() on their own.
+    global _slot
+    cache = _cache()
+    pid = os.getpid()
+    if _slot is None or cache.get(_slot_key(_slot)) != pid:
+        _slot = _claim_slot(cache, pid)
+    else:
+        cache.touch(_slot_key(_slot), timeout=STATS_TTL)
+    cache.set(_stats_key(pid), dict(_stats), timeout=STATS_TTL)
+
+
+def cache_stats():
+    """Hit/miss/store/eviction totals across all workers, plus hit ratio."""
+    _flush_stats()
+    cache = _cache()
+    pids = cache.get_many([_slot_key(slot) for slot in range(STATS_SLOTS)])
+    workers = cache.get_many([_stats_key(pid) for pid in set(pids.values())])
+    totals = dict.fromkeys(_stats, 0)
+    for counters in workers.values():
+        for name, value in counters.items():
+            totals[name] += value
+    lookups = totals["hits"] + totals["misses"]
+    totals["hit_ratio"] = round(totals["hits"] / lookups, 4) if lookups else None
+    totals["workers"] = len(workers)
+    return totals
+
+
+def _model_changed(sender, **kwargs):
+    invalidate_on_commit(*MODEL_TAGS[sender.__name__])
+
+
+def connect_signals():
+    from .models import Book, Borrowing
+
+    for model in (Book, Borrowing):
+        post_save.connect(
+            _model_changed,
+            sender=model,
+            dispatch_uid=f"respcache-save-{model.__name__}",
+        )
+        post_delete.connect(
+            _model_changed,
+            sender=model,
+            dispatch_uid=f"respcache-delete-{model.__name__}",
+        )
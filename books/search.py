@@ -0,0 +1,115 @@
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    TrigramWordSimilarity,
+)
+from django.db import connection, connections
+from django.db.models import Case, F, FloatField, IntegerField, Q, Value, When
+from django.db.models.functions import Greatest
+
+from .models import Book
+
+SEARCH_CONFIG = "english"
+
+# Installed after migrate on PostgreSQL (see BooksConfig.ready). The trigger
+# keeps search_vector current for every INSERT/UPDATE, including bulk_create,
+# without Django having to recompute it.
+POSTGRES_SEARCH_SQL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    """
+    CREATE OR REPLACE FUNCTION {table}_search_vector_trigger() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector :=
+            setweight(to_tsvector('{config}', coalesce(NEW.title, '')), 'A') ||
+            setweight(to_tsvector('{config}', coalesce(NEW.authors, '')), 'A') ||
+            setweight(to_tsvector('{config}', coalesce(NEW.subtitle, '')), 'B') ||
+            setweight(to_tsvector('{config}', coalesce(NEW.description, '')), 'C');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    "DROP TRIGGER IF EXISTS {table}_search_vector_update ON {table}",
+    """
+    CREATE TRIGGER {table}_search_vector_update
+    BEFORE INSERT OR UPDATE OF title, subtitle, authors, description ON {table}
+    FOR EACH ROW EXECUTE FUNCTION {table}_search_vector_trigger()
+    """,
+    "CREATE INDEX IF NOT EXISTS {table}_search_vector_gin ON {table} USING gin (search_vector)",
+    "CREATE INDEX IF NOT EXISTS {table}_title_trgm ON {table} USING gin (title gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS {table}_authors_trgm ON {table} USING gin (authors gin_trgm_ops)",
+    # Backfill rows written before the trigger existed.
+    "UPDATE {table} SET title = title WHERE search_vector IS NULL",
+]
+
+
+def install_postgres_search(sender, using="default", **kwargs):
+    db = connections[using]
+    if db.vendor != "postgresql":
+        return
+    with db.cursor() as cursor:
+        for statement in POSTGRES_SEARCH_SQL:
+            cursor.execute(
+                statement.format(table=Book._meta.db_table, config=SEARCH_CONFIG)
+            )
+
+
+class PostgresSearchEngine:
+    """
+    Full-text search over the trigger-maintained ``search_vector`` (GIN) OR'd
+    with trigram word similarity on title/authors (GIN pg_trgm) so misspelt
+    queries still match. Ranked by ts_rank plus the best trigram score.
+    """
+
+    def search(self, query):
+        ts_query = SearchQuery(query, search_type="websearch", config=SEARCH_CONFIG)
+        return (
+            Book.objects.filter(
+                Q(search_vector=ts_query)
+                | Q(title__trigram_word_similar=query)
+                | Q(authors__trigram_word_similar=query)
+            )
+            .annotate(
+                rank=SearchRank(F("search_vector"), ts_query)
+                + Greatest(
+                    TrigramWordSimilarity(query, "title"),
+                    TrigramWordSimilarity(query, "authors"),
+                )
+            )
+            .order_by("-rank", "id")
+        )
+
+
+class SimpleSearchEngine:
+    """
+    Portable fallback for SQLite and other test databases: every term must
+    appear in one of the searchable fields, weighted by where it matched.
+    """
+
+    weights = (("title", 4), ("authors", 3), ("subtitle", 2), ("description", 1))
+
+    def search(self, query):
+        terms = query.split()
+        condition = Q()
+        rank = Value(0, output_field=IntegerField())
+        for term in terms:
+            condition &= Q(
+                *(Q(**{f"{field}__icontains": term}) for field, _ in self.weights),
+                _connector=Q.OR,
+            )
+            for field, weight in self.weights:
+                rank = rank + Case(
+                    When(**{f"{field}__icontains": term}, then=Value(weight)),
+                    default=Value(0),
+                    output_field=IntegerField(),
+                )
+        return (
+            Book.objects.filter(condition)
+            .annotate(rank=rank * Value(1.0, output_field=FloatField()))
+            .order_by("-rank", "id")
+        )
+
+
+def get_search_engine():
+    if connection.vendor == "postgresql":
+        return PostgresSearchEngine()
+    return SimpleSearchEngine()
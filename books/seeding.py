@@ -0,0 +1,210 @@
+from bisect import bisect
+from datetime import datetime, timedelta
+from itertools import accumulate
+import random
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from users.models import UserProfile
+from . import stats
+from .fees import late_fee
+from .isbn import with_check_digit
+from .models import GENRE_TYPE_CHOICES, Book, Borrowing, Notification
+
+SEED_BATCH_SIZE = 5000
+SEED_USER_PREFIX = "seed-user-"
+SEED_PUBLISHER = "Synthetic Press"
+SEED_PASSWORD = "password123"
+LOAN_DAYS = 14
+
+_WORDS = (
+    "shadow river garden winter empire silent glass iron last night city "
+    "ocean secret stone wild broken golden hidden house journey crown star "
+    "forest fire memory storm paper lost blue song"
+).split()
+_NAMES = (
+    "Ada Alan Grace Linus Barbara Ken Dennis Margaret Edsger Donald Frances "
+    "John Radia Guido Yukihiro Anders Bjarne Niklaus Tony Leslie"
+).split()
+_GENRES = [genre for genre, _ in GENRE_TYPE_CHOICES]
+
+
+def _isbn13(n):
+    return with_check_digit(f"97990{n:07d}")
+
+
+def _batches(items, size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _loans(rng, users, books, borrowings, days, today):
+    """
+    Yield ``(user_idx, book_idx, borrow_date, return_date)`` in borrow-date
+    order. Book popularity follows a Zipf-like curve so a few titles take
+    most loans; loans due in the past are mostly returned, some late.
+    """
+    weights = list(accumulate(1 / (rank + 1) for rank in range(books)))
+    first_day = today - timedelta(days=days)
+    for i in range(borrowings):
+        borrow_date = first_day + timedelta(days=i * days // max(borrowings, 1))
+        due_date = borrow_date + timedelta(days=LOAN_DAYS)
+        return_date = None
+        if due_date < today and rng.random() < 0.9:
+            kept = rng.randint(1, LOAN_DAYS + 10)
+            return_date = min(borrow_date + timedelta(days=kept), today)
+        book = bisect(weights, rng.random() * weights[-1])
+        yield rng.randrange(users), book, borrow_date, return_date
+
+
+def seed_library(
+    users,
+    books,
+    borrowings,
+    notifications,
+    days=365,
+    seed=0,
+    batch_size=SEED_BATCH_SIZE,
+    progress=None,
+):
+    """
+    Insert a synthetic library with bulk inserts: ``users`` customer
+    accounts, ``books`` titles, ``borrowings`` loans over the last ``days``
+    with skewed popularity, and ``notifications`` messages. Stock and the
+    stats row are consistent with the loans. The same ``seed`` always
+    produces the same data. Returns the counts and elapsed seconds.
+
+    ``progress`` is called with a message after each table.
+    """
+    if (borrowings or notifications) and not users or borrowings and not books:
+        raise ValueError("Borrowings need users and books; notifications need users.")
+    started = time.perf_counter()
+    today = datetime.now().date()
+    progress = progress or (lambda message: None)
+
+    # First pass over the loans: per-book totals so stock can be set on insert.
+    outstanding = [0] * books
+    borrow_counts = [0] * books
+    for _, book, _, return_date in _loans(
+        random.Random(seed), users, books, borrowings, days, today
+    ):
+        borrow_counts[book] += 1
+        outstanding[book] += return_date is None
+
+    rng = random.Random(seed + 1)
+    password = make_password(SEED_PASSWORD)
+    user_ids = []
+    with transaction.atomic():
+        first = User.objects.filter(username__startswith=SEED_USER_PREFIX).count()
+        for batch in _batches(range(users), batch_size):
+            created = User.objects.bulk_create(
+                User(
+                    username=f"{SEED_USER_PREFIX}{first + i}",
+                    email=f"{SEED_USER_PREFIX}{first + i}@example.com",
+                    password=password,
+                )
+                for i in batch
+            )
+            profiles = UserProfile.objects.bulk_create(
+                UserProfile(
+                    auth_user=user,
+                    name=f"{rng.choice(_NAMES)} {rng.choice(_NAMES)}son",
+                )
+                for user in created
+            )
+            user_ids.extend(profile.pk for profile in profiles)
+    progress(f"users: {users}")
+
+    book_ids = []
+    with transaction.atomic():
+        offset = Book.objects.filter(publisher=SEED_PUBLISHER).count()
+        for batch in _batches(range(books), batch_size):
+            new_books = []
+            for i in batch:
+                quantity = max(outstanding[i] + rng.randint(0, 3), 1)
+                new_books.append(
+                    Book(
+                        isbn_13=_isbn13(offset + i),
+                        title=" ".join(rng.sample(_WORDS, rng.randint(1, 4))).title(),
+                        authors=f"{rng.choice(_NAMES)} {rng.choice(_NAMES)}son",
+                        publisher=SEED_PUBLISHER,
+                        published_date=str(rng.randint(1950, today.year)),
+                        description=" ".join(rng.choices(_WORDS, k=40)),
+                        page_count=rng.randint(80, 900),
+                        categories=", ".join(rng.sample(_GENRES, rng.randint(1, 2))),
+                        language="en",
+                        quantity=quantity,
+                        available=quantity - outstanding[i],
+                        borrow_count=borrow_counts[i],
+                    )
+                )
+            book_ids.extend(book.pk for book in Book.objects.bulk_create(new_books))
+    progress(f"books: {books}")
+
+    # borrow_date is auto_now_add, so inserts get today's date; loans come
+    # out in date order, so each day is one id range fixed by one UPDATE.
+    day_ranges = {}
+    with transaction.atomic():
+        loans = _loans(random.Random(seed), users, books, borrowings, days, today)
+        for batch in _batches(loans, batch_size):
+            created = Borrowing.objects.bulk_create(
+                Borrowing(
+                    user_id=user_ids[user],
+                    book_id=book_ids[book],
+                    due_date=borrow_date + timedelta(days=LOAN_DAYS),
+                    return_date=return_date,
+                    late_fee=(
+                        late_fee(borrow_date + timedelta(days=LOAN_DAYS), return_date)
+                        if return_date
+                        else 0
+                    ),
+                )
+                for user, book, borrow_date, return_date in batch
+            )
+            for borrowing, (_, _, borrow_date, _) in zip(created, batch):
+                low, _ = day_ranges.get(borrow_date, (borrowing.pk, None))
+                day_ranges[borrow_date] = (low, borrowing.pk)
+        for borrow_date, id_range in day_ranges.items():
+            Borrowing.objects.filter(pk__range=id_range).update(borrow_date=borrow_date)
+    progress(f"borrowings: {borrowings}")
+
+    with transaction.atomic():
+        for batch in _batches(range(notifications), batch_size):
+            Notification.objects.bulk_create(
+                Notification(
+                    user_id=user_ids[rng.randrange(users)],
+                    message=f"Library news #{i}: {' '.join(rng.sample(_WORDS, 6))}.",
+                    is_read=rng.random() < 0.6,
+                )
+                for i in batch
+            )
+    progress(f"notifications: {notifications}")
+
+    stats.reconcile()
+    stats.bump(catalog_version=1)
+    return {
+        "users": users,
+        "books": books,
+        "borrowings": borrowings,
+        "notifications": notifications,
+        "seconds": round(time.perf_counter() - started, 2),
+    }
+
+
+def clear_seeded_library():
+    """Remove everything ``seed_library`` inserted; returns rows deleted."""
+    with transaction.atomic():
+        deleted, _ = Book.objects.filter(publisher=SEED_PUBLISHER).delete()
+        users, _ = User.objects.filter(username__startswith=SEED_USER_PREFIX).delete()
+    stats.reconcile()
+    stats.bump(catalog_version=1)
+    return deleted + users
@@ -0,0 +1,59 @@
+# Projection-based serialization for Book payloads: read only the requested
+# columns with values() instead of hydrating model instances.
+
+BOOK_FIELDS = (
+    "id",
+    "isbn_10",
+    "isbn_13",
+    "title",
+    "subtitle",
+    "authors",
+    "publisher",
+    "published_date",
+    "description",
+    "page_count",
+    "categories",
+    "language",
+    "preview_link",
+    "info_link",
+    "small_thumbnail",
+    "thumbnail",
+    "quantity",
+    "available",
+)
+
+BOOK_EDITABLE_FIELDS = [
+    field for field in BOOK_FIELDS if field not in ("id", "isbn_13")
+]
+
+BOOK_SUMMARY_FIELDS = ("id", "title", "authors", "available")
+
+# Fields that change with every loan and return.
+BOOK_STOCK_FIELDS = frozenset(("quantity", "available"))
+
+
+class InvalidFields(ValueError):
+    pass
+
+
+def requested_fields(request, default=BOOK_FIELDS, allowed=BOOK_FIELDS):
+    """
+    Parse a ``?fields=title,authors`` sparse fieldset. ``id`` is always
+    included so clients and keyset cursors can address the rows.
+    """
+    raw = request.query_params.get("fields")
+    if not raw:
+        return tuple(default)
+    fields = [field.strip() for field in raw.split(",") if field.strip()]
+    unknown = sorted(set(fields) - set(allowed))
+    if unknown:
+        raise InvalidFields(f"Unknown fields: {', '.join(unknown)}.")
+    return ("id",) + tuple(dict.fromkeys(f for f in fields if f != "id"))
+
+
+def project_books(queryset, fields=BOOK_FIELDS):
+    return queryset.values(*fields)
+
+
+def book_to_dict(book, fields=BOOK_FIELDS):
+    return {field: getattr(book, field) for field in fields}
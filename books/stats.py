@@ -0,0 +1,177 @@
+from datetime import datetime
+import random
+import threading
+
+from django.db import transaction
+from django.db.models import Count, F, Max, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import response_cache
+from .models import Book, Borrowing, LibraryStats
+
+STATS_SHARDS = 16
+TOTAL_FIELDS = ("total_books", "total_borrowings", "outstanding_borrowings")
+
+_local = threading.local()
+
+
+def _shard():
+    # One shard per thread, picked at random: a transaction never locks two
+    # shard rows, and concurrent writers rarely wait on the same one.
+    shard = getattr(_local, "shard", None)
+    if shard is None:
+        shard = _local.shard = random.randint(1, STATS_SHARDS)
+    return shard
+
+
+def create_shards(sender=None, using="default", **kwargs):
+    """Create any missing shard rows (all zeros); connected to post_migrate."""
+    LibraryStats.objects.using(using).bulk_create(
+        [LibraryStats(pk=pk) for pk in range(1, STATS_SHARDS + 1)],
+        ignore_conflicts=True,
+    )
+
+
+def bump(**deltas):
+    """
+    Apply counter deltas (e.g. ``total_books=3``) with a single UPDATE of
+    this thread's shard row. Call inside the transaction that made the
+    change so the totals commit or roll back with it. A ``catalog_version``
+    delta also stamps ``catalog_modified``. Cached responses built from the
+    changed data are evicted once the transaction commits.
+    """
+    deltas = {field: delta for field, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    response_cache.invalidate_on_commit(*_stale_tags(deltas))
+    now = timezone.now()
+    values = {field: F(field) + delta for field, delta in deltas.items()}
+    if "catalog_version" in deltas:
+        values["catalog_modified"] = now
+    shard = LibraryStats.objects.filter(pk=_shard())
+    if not shard.update(updated_at=now, **values):
+        # Shards are created after migrate; a flushed database gets them
+        # back here. Totals are fixed by reconcile_stats, never in a request.
+        create_shards()
+        shard.update(updated_at=now, **values)
+
+
+def _stale_tags(deltas):
+    # A loan or return only moves copy counts: it bumps the catalog version
+    # for conditional GETs but leaves pages without stock fields cached.
+    tags = set()
+    if "total_borrowings" in deltas or "outstanding_borrowings" in deltas:
+        tags.update(("stock", "borrowings"))
+    elif "catalog_version" in deltas:
+        tags.add("catalog")
+    if "total_books" in deltas:
+        tags.add("catalog")
+    return sorted(tags)
+
+
+def maintained_totals():
+    """The maintained totals, summed over the shards in one query."""
+    return LibraryStats.objects.aggregate(
+        **{field: Coalesce(Sum(field), 0) for field in TOTAL_FIELDS}
+    )
+
+
+def catalog_state():
+    """``(catalog_version, catalog_modified)`` summed over the shards."""
+    state = LibraryStats.objects.aggregate(
+        version=Coalesce(Sum("catalog_version"), 0), modified=Max("catalog_modified")
+    )
+    return state["version"], state["modified"]
+
+
+def fresh_totals():
+    borrowing_totals = Borrowing.objects.aggregate(
+        total=Count("id"), outstanding=Count("id", filter=Q(return_date__isnull=True))
+    )
+    return {
+        "total_books": Book.objects.count(),
+        "total_borrowings": borrowing_totals["total"],
+        "outstanding_borrowings": borrowing_totals["outstanding"],
+    }
+
+
+def reconcile():
+    """
+    Recompute the totals and every Book.borrow_count from the source
+    tables. Returns ``(drift, books_fixed)`` where ``drift`` maps each total
+    to ``(stored, actual)`` for the ones that were wrong.
+    """
+    with transaction.atomic():
+        create_shards()
+        # Lock every shard before counting: a bump committing meanwhile
+        # waits, so it can't fall between the count and the write.
+        shards = list(LibraryStats.objects.select_for_update().order_by("pk"))
+        actual = fresh_totals()
+        drift = {}
+        for field in TOTAL_FIELDS:
+            stored = sum(getattr(shard, field) for shard in shards)
+            if stored != actual[field]:
+                drift[field] = (stored, actual[field])
+        if drift:
+            # Fold the totals into the first shard; catalog versions stay.
+            for shard in shards:
+                for field in TOTAL_FIELDS:
+                    setattr(shard, field, actual[field] if shard is shards[0] else 0)
+            LibraryStats.objects.bulk_update(shards, TOTAL_FIELDS)
+
+    # Outside the shard locks, so writers are not held up by this UPDATE.
+    actual_count = Coalesce(
+        Subquery(
+            Borrowing.objects.filter(book=OuterRef("pk"))
+            .order_by()
+            .values("book")
+            .annotate(n=Count("id"))
+            .values("n")
+        ),
+        0,
+    )
+    books_fixed = (
+        Book.objects.annotate(actual=actual_count)
+        .exclude(borrow_count=F("actual"))
+        .update(borrow_count=actual_count)
+    )
+    if drift or books_fixed:
+        response_cache.invalidate_on_commit("catalog", "borrowings")
+    return drift, books_fixed
+
+
+def most_borrowed(limit=5):
+    return list(
+        Book.objects.filter(borrow_count__gt=0)
+        .order_by("-borrow_count", "id")
+        .values("title", "borrow_count")[:limit]
+    )
+
+
+def overdue_count():
+    return Borrowing.objects.filter(
+        return_date__isnull=True, due_date__lt=datetime.now().date()
+    ).count()
+
+
+def build_report(fresh=False):
+    if fresh:
+        totals = fresh_totals()
+        most_borrowed_books = [
+            {"title": title, "borrow_count": n}
+            for title, n in Book.objects.annotate(n=Count("borrowing"))
+            .filter(n__gt=0)
+            .order_by("-n", "id")
+            .values_list("title", "n")[:5]
+        ]
+    else:
+        totals = maintained_totals()
+        most_borrowed_books = most_borrowed()
+    return {
+        "total_books": totals["total_books"],
+        "total_borrowings": totals["total_borrowings"],
+        "outstanding_borrowings": totals["outstanding_borrowings"],
+        "overdue_books": overdue_count(),
+        "most_borrowed_books": most_borrowed_books,
+    }
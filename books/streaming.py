@@ -0,0 +1,79 @@
+import csv
+from functools import partial
+import io
+
+from django.http import StreamingHttpResponse
+
+from project.renderers import orjson_dumps
+
+STREAM_CHUNK_SIZE = 2000
+
+
+def _batched(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def json_array_lines(rows, chunk_size=STREAM_CHUNK_SIZE):
+    yield b"["
+    first = True
+    for batch in _batched(rows, chunk_size):
+        body = b",".join(orjson_dumps(row) for row in batch)
+        yield body if first else b"," + body
+        first = False
+    yield b"]"
+
+
+def ndjson_lines(rows, chunk_size=STREAM_CHUNK_SIZE):
+    for batch in _batched(rows, chunk_size):
+        yield b"".join(orjson_dumps(row) + b"\n" for row in batch)
+
+
+def csv_lines(rows, chunk_size=STREAM_CHUNK_SIZE, columns=None):
+    """CSV with a header row; ``columns`` defaults to the first row's keys."""
+    buffer = io.StringIO()
+    writer = None
+    for batch in _batched(rows, chunk_size):
+        if writer is None:
+            writer = csv.DictWriter(buffer, fieldnames=columns or list(batch[0]))
+            writer.writeheader()
+        writer.writerows(batch)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if writer is None and columns:
+        csv.writer(buffer).writerow(columns)
+        yield buffer.getvalue().encode()
+
+
+STREAM_FORMATS = {
+    "json": (json_array_lines, "application/json"),
+    "ndjson": (ndjson_lines, "application/x-ndjson"),
+    "csv": (csv_lines, "text/csv"),
+}
+
+
+def streaming_response(
+    rows, fmt, chunk_size=STREAM_CHUNK_SIZE, columns=None, filename=None
+):
+    """
+    Stream an iterable of dicts as a JSON array, NDJSON or CSV without
+    building the whole payload in memory. ``rows`` should come from
+    ``QuerySet.iterator()``. ``columns`` fixes the CSV header; ``filename``
+    makes the response a download.
+    """
+    render, content_type = STREAM_FORMATS[fmt]
+    if fmt == "csv":
+        render = partial(render, columns=columns)
+    response = StreamingHttpResponse(
+        render(rows, chunk_size), content_type=content_type
+    )
+    if filename:
+        response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
@@ -1,3 +1,1927 @@
-from django.test import TestCase
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from io import StringIO
+import csv
+import json
+import os
+import shutil
+import tempfile
+import time
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Count, Q
+from django.test import (
+    AsyncClient,
+    AsyncRequestFactory,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from project import metrics
+from project.renderers import ORJSONRenderer
+from users import urls as users_urls
+from users.benchmarks import FakeGoogleCerts
+from users.models import UserProfile
+from users.views import get_tokens_for_user
+from . import async_views, metadata_cache, pagination, response_cache, stats
+from . import urls as books_urls
+from .benchmarks import (
+    ENDPOINTS,
+    FakeBooksAPI,
+    benchmark_endpoints,
+    hammer_popular_book,
+)
+from .catalog_import import import_catalog
+from .exports import BORROWING_EXPORT_COLUMNS
+from .fees import MAX_LATE_FEE, accrue_late_fees
+from .inventory import check_inventory
+from .isbn import normalize_isbn, normalize_isbn_list, with_check_digit
+from .models import (
+    Book,
+    BookNeighbor,
+    Borrowing,
+    FeeBalance,
+    IsbnMetadata,
+    JobCheckpoint,
+    LibraryStats,
+    Notification,
+)
+from .notifications import generate_overdue_notifications
+from .recommendations import compute_neighbors
+from .seeding import SEED_PUBLISHER, clear_seeded_library, seed_library
+from .views import save_new_books
+
+
+def make_books(count, start=0):
+    return Book.objects.bulk_create(
+        Book(
+            isbn_13=f"{9780000000000 + start + i}",
+            title=f"Book {start + i}",
+            authors="Author",
+            publisher="Publisher",
+        )
+        for i in range(count)
+    )
+
+
+def clear_response_cache():
+    # Test data is written with bulk_create and TestCase never runs on_commit
+    # hooks, so nothing evicts cached pages between tests on its own.
+    caches[response_cache.CACHE_ALIAS].clear()
+
+
+def use_temporary_profiling_dir(test):
+    profiling_dir = tempfile.mkdtemp()
+    test.addCleanup(shutil.rmtree, profiling_dir)
+    overrides = override_settings(PROFILING_DIR=profiling_dir)
+    overrides.enable()
+    test.addCleanup(overrides.disable)
+
+
+def make_profile(username, role="Customer"):
+    user = User.objects.create_user(username=username, password="password123")
+    return UserProfile.objects.create(auth_user=user, name=username, role=role)
+
+
+class BookListTests(TestCase):
+    def setUp(self):
+        clear_response_cache()
+        self.client = APIClient()
+        make_books(7)
+
+    def test_keyset_pages_forward_and_back(self):
+        first = self.client.get("/api/lib/books/", {"page_size": 3}).json()
+        self.assertEqual(
+            [b["title"] for b in first["results"]], ["Book 0", "Book 1", "Book 2"]
+        )
+        self.assertIsNone(first["previous"])
+
+        second = self.client.get(
+            "/api/lib/books/", {"page_size": 3, "cursor": first["next"]}
+        ).json()
+        self.assertEqual(
+            [b["title"] for b in second["results"]], ["Book 3", "Book 4", "Book 5"]
+        )
+
+        third = self.client.get(
+            "/api/lib/books/", {"page_size": 3, "cursor": second["next"]}
+        ).json()
+        self.assertEqual([b["title"] for b in third["results"]], ["Book 6"])
+        self.assertIsNone(third["next"])
+
+        back = self.client.get(
+            "/api/lib/books/", {"page_size": 3, "cursor": third["previous"]}
+        ).json()
+        self.assertEqual(back["results"], second["results"])
+        back = self.client.get(
+            "/api/lib/books/", {"page_size": 3, "cursor": back["previous"]}
+        ).json()
+        self.assertEqual(back["results"], first["results"])
+        self.assertIsNone(back["previous"])
+
+    def test_invalid_cursor(self):
+        response = self.client.get("/api/lib/books/", {"cursor": "not-a-cursor"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_cursor_with_a_non_integer_id(self):
+        cursor = pagination.encode_cursor(["abc"])
+        response = self.client.get("/api/lib/books/", {"cursor": cursor})
+        self.assertEqual(response.status_code, 400)
+
+    def test_cursor_with_an_object_id(self):
+        cursor = pagination.encode_cursor([{"a": 1}])
+        response = self.client.get("/api/lib/books/", {"cursor": cursor})
+        self.assertEqual(response.status_code, 400)
+
+    def test_stream_json_and_ndjson(self):
+        response = self.client.get("/api/lib/books/", {"stream": "json"})
+        data = json.loads(b"".join(response.streaming_content))
+        self.assertEqual(len(data), 7)
+        self.assertEqual(data[0]["isbn_13"], "9780000000000")
+
+        response = self.client.get("/api/lib/books/", {"stream": "ndjson"})
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(line)["title"] for line in lines][-1], "Book 6")
+
+    def test_stream_rejects_unknown_format(self):
+        response = self.client.get("/api/lib/books/", {"stream": "xml"})
+        self.assertEqual(response.status_code, 400)
+
+
+class AddBooksTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(make_profile("librarian", "Librarian").auth_user)
+
+    def add(self, isbn_list):
+        return self.client.post(
+            "/api/lib/books/add/", {"isbn_list": isbn_list}, format="json"
+        )
+
+    def test_adds_books_and_reports_errors_per_isbn(self):
+        Book.objects.create(isbn_13="9780306406157", title="Signals", publisher="P")
+        with FakeBooksAPI(missing={"9780262033848"}) as api, override_settings(
+            GOOGLE_BOOKS_API_URL=api.url
+        ):
+            response = self.add(["9781111111113", "9780262033848", "0-306-40615-2"])
+
+        self.assertEqual(response.status_code, 201)
+        data = response.json()
+        self.assertEqual([b["isbn_13"] for b in data["added_books"]], ["9781111111113"])
+        self.assertIsNotNone(data["added_books"][0]["id"])
+        self.assertEqual(
+            data["errors"],
+            [
+                "Error adding book with ISBN 9780306406157: Book already exists",
+                "Book not found for ISBN 9780262033848",
+            ],
+        )
+        self.assertEqual(api.requests, 2)
+        book = Book.objects.get(isbn_13="9781111111113")
+        self.assertEqual((book.authors, book.isbn_10), ("A. Writer", "1111111113"))
+
+    def test_isbn10_and_isbn13_of_one_book_are_stored_once(self):
+        with FakeBooksAPI() as api, override_settings(GOOGLE_BOOKS_API_URL=api.url):
+            response = self.add(["0-306-40615-2", "978-0-306-40615-7"])
+        self.assertEqual(response.json()["added_books"][0]["isbn_13"], "9780306406157")
+        self.assertEqual(
+            list(Book.objects.values_list("isbn_13", flat=True)), ["9780306406157"]
+        )
+        self.assertEqual(api.requests, 1)
+
+    def test_invalid_isbns_are_reported_per_item(self):
+        with FakeBooksAPI() as api, override_settings(GOOGLE_BOOKS_API_URL=api.url):
+            response = self.add(["9780306406157", "9780306406158", "not-an-isbn"])
+        self.assertEqual(response.status_code, 201)
+        data = response.json()
+        self.assertEqual([b["isbn_13"] for b in data["added_books"]], ["9780306406157"])
+        self.assertEqual(
+            data["errors"],
+            ["Invalid ISBN 9780306406158", "Invalid ISBN not-an-isbn"],
+        )
+        self.assertEqual(api.requests, 1)
+        self.assertEqual(self.add("9780306406157").status_code, 400)
+
+    def test_books_added_concurrently_are_reported_not_raised(self):
+        # Another request inserted 9780306406157 after our existence check.
+        Book.objects.create(isbn_13="9780306406157", title="Signals", publisher="P")
+        created, errors = save_new_books(
+            [
+                Book(isbn_13="9780306406157", title="Signals", publisher="P"),
+                Book(isbn_13="9781111111113", title="New", publisher="P"),
+            ]
+        )
+        self.assertEqual([book.isbn_13 for book in created], ["9781111111113"])
+        self.assertEqual(
+            errors, ["Error adding book with ISBN 9780306406157: Book already exists"]
+        )
+        self.assertEqual(Book.objects.count(), 2)
+        self.assertEqual(stats.maintained_totals()["total_books"], 1)
+
+    def test_concurrent_lookups_beat_sequential(self):
+        isbns = [with_check_digit(f"9782000000{i:02d}") for i in range(16)]
+        with FakeBooksAPI(latency=0.05) as api, override_settings(
+            GOOGLE_BOOKS_API_URL=api.url
+        ):
+            with override_settings(GOOGLE_BOOKS_MAX_WORKERS=1):
+                started = time.perf_counter()
+                self.add(isbns[:8])
+                sequential = time.perf_counter() - started
+
+            started = time.perf_counter()
+            response = self.add(isbns[8:])
+            concurrent = time.perf_counter() - started
+
+        self.assertEqual(len(response.json()["added_books"]), 8)
+        self.assertEqual(Book.objects.count(), 16)
+        self.assertLess(concurrent, sequential / 2)
+
+
+class AsyncAddBooksTests(TestCase):
+    def request(self, profile, isbns):
+        access = get_tokens_for_user(profile.auth_user)["access"]
+        return AsyncRequestFactory().post(
+            "/api/lib/books/add/?fields=title",
+            {"isbn_list": isbns},
+            content_type="application/json",
+            headers={"Authorization": f"Bearer {access}"},
+        )
+
+    async def test_lookups_run_concurrently_and_books_are_saved(self):
+        librarian = await sync_to_async(make_profile)("librarian", "Librarian")
+        isbns = [with_check_digit(f"9781111111{i:02d}") for i in range(6)]
+        with FakeBooksAPI(latency=0.3) as api, override_settings(
+            GOOGLE_BOOKS_API_URL=api.url
+        ):
+            started = time.perf_counter()
+            response = await async_views.add_books(self.request(librarian, isbns))
+            elapsed = time.perf_counter() - started
+        self.assertEqual(response.status_code, 201)
+        added = json.loads(response.content)["added_books"]
+        self.assertEqual(added[0], {"id": added[0]["id"], "title": f"Title {isbns[0]}"})
+        self.assertEqual(await Book.objects.acount(), 6)
+        self.assertLess(elapsed, 1.0)  # six 0.3s lookups overlapped
+        totals = await sync_to_async(stats.maintained_totals)()
+        self.assertEqual(totals["total_books"], 6)
+
+    async def test_invalid_isbns_are_reported_per_item(self):
+        librarian = await sync_to_async(make_profile)("librarian", "Librarian")
+        with FakeBooksAPI() as api, override_settings(GOOGLE_BOOKS_API_URL=api.url):
+            response = await async_views.add_books(
+                self.request(librarian, ["bad", "9780306406157"])
+            )
+        self.assertEqual(response.status_code, 201)
+        data = json.loads(response.content)
+        self.assertEqual(len(data["added_books"]), 1)
+        self.assertEqual(data["errors"], ["Invalid ISBN bad"])
+
+    async def test_patrons_and_anonymous_callers_are_refused(self):
+        reader = await sync_to_async(make_profile)("reader")
+        response = await async_views.add_books(self.request(reader, ["9781111111113"]))
+        self.assertEqual(response.status_code, 403)
+        request = AsyncRequestFactory().post(
+            "/api/lib/books/add/", {}, content_type="application/json"
+        )
+        self.assertEqual((await async_views.add_books(request)).status_code, 401)
+
+
+class ImportCatalogTests(TestCase):
+    CSV = (
+        "isbn_13,isbn_10,title,authors,publisher,quantity,available\n"
+        "978-0-306-40615-7,,Signals,A. Author,P,3,2\n"
+        ",0-13-110362-8,The C Programming Language,K&R,PH,2,\n"
+        "9780306406158,,Bad checksum,,,1,1\n"
+        "9780262033848,,,No title,,1,1\n"
+        "9780262033848,,Algorithms,CLRS,MIT,5,9\n"
+    )
+
+    def test_csv_rows_are_normalized_validated_and_upserted(self):
+        result = import_catalog(StringIO(self.CSV), "csv", batch_size=2)
+        self.assertEqual(
+            (result["rows"], result["created"], result["invalid"]), (5, 3, 2)
+        )
+        self.assertEqual([e["row"] for e in result["errors"]], [3, 4])
+        self.assertEqual(
+            set(Book.objects.values_list("isbn_13", "quantity", "available")),
+            {
+                ("9780306406157", 3, 2),
+                ("9780131103627", 2, 2),
+                ("9780262033848", 5, 5),
+            },
+        )
+        self.assertEqual(
+            Book.objects.get(isbn_13="9780131103627").isbn_10, "0131103628"
+        )
+        self.assertEqual(stats.maintained_totals()["total_books"], 3)
+
+        book = Book.objects.get(isbn_13="9780306406157")
+        Borrowing.objects.create(
+            user=make_profile("reader"), book=book, due_date=timezone.now().date()
+        )
+        rerun = import_catalog(
+            StringIO('{"isbn": "9780306406157", "title": "Signals", "quantity": 7}\n'),
+            "jsonl",
+        )
+        self.assertEqual((rerun["created"], rerun["updated"]), (0, 1))
+        book.refresh_from_db()
+        self.assertEqual((book.quantity, book.available), (7, 6))
+        self.assertEqual(stats.maintained_totals()["total_books"], 3)
+
+    def test_interrupted_job_resumes_after_last_committed_batch(self):
+        def crash(result):
+            raise RuntimeError("worker killed")
+
+        with self.assertRaises(RuntimeError):
+            import_catalog(
+                StringIO(self.CSV), "csv", job="nightly", batch_size=2, progress=crash
+            )
+        self.assertEqual(Book.objects.count(), 2)
+        self.assertEqual(JobCheckpoint.objects.get().position, 2)
+
+        result = import_catalog(StringIO(self.CSV), "csv", job="nightly", batch_size=2)
+        self.assertEqual((result["rows"], result["created"]), (3, 1))
+        self.assertTrue(JobCheckpoint.objects.get().completed)
+        again = import_catalog(StringIO(self.CSV), "csv", job="nightly")
+        self.assertEqual(again["rows"], 0)
+
+    def upload(self, profile):
+        client = APIClient()
+        client.force_authenticate(profile.auth_user)
+        upload = SimpleUploadedFile(
+            "books.jsonl", b'{"isbn_13": "9780306406157", "title": "Signals"}\n'
+        )
+        return client.post("/api/lib/books/import/", {"file": upload})
+
+    def test_upload_endpoint_imports_for_librarians(self):
+        response = self.upload(make_profile("librarian", "Librarian"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["created"], 1)
+        self.assertTrue(Book.objects.filter(isbn_13="9780306406157").exists())
+
+    def test_upload_endpoint_rejects_overlong_job_names(self):
+        client = APIClient()
+        client.force_authenticate(make_profile("librarian", "Librarian").auth_user)
+        upload = SimpleUploadedFile("books.jsonl", b"")
+        response = client.post(
+            "/api/lib/books/import/", {"file": upload, "job": "j" * 200}
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_upload_endpoint_rejects_patrons(self):
+        # DRF marks the surrounding (test) transaction for rollback on the
+        # denial, so nothing may query after this request.
+        self.assertEqual(self.upload(make_profile("reader")).status_code, 403)
+
+    def test_command_reads_files_by_extension(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        # Long enough that the path alone would overflow a checkpoint name.
+        path = os.path.join(directory, "nightly-catalog-export-" * 5 + ".csv")
+        with open(path, "w") as f:
+            f.write(self.CSV)
+        out = StringIO()
+        call_command(
+            "import_catalog",
+            path,
+            "--restart",
+            stdout=out,
+            stderr=StringIO(),
+            verbosity=0,
+        )
+        self.assertIn("3 created", out.getvalue())
+
+        self.assertLessEqual(
+            len(JobCheckpoint.objects.get().name),
+            JobCheckpoint._meta.get_field("name").max_length,
+        )
+        # Same path, new contents: a fresh job rather than a finished one.
+        with open(path, "a") as f:
+            f.write("9781111111113,,Appended,,,1,1\n")
+        out = StringIO()
+        call_command("import_catalog", path, stdout=out, stderr=StringIO(), verbosity=0)
+        self.assertIn("Imported 6 rows: 1 created, 3 updated", out.getvalue())
+
+
+class IsbnMetadataCacheTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(make_profile("librarian", "Librarian").auth_user)
+        metadata_cache.reset_cache_stats()
+        metrics._counters.clear()
+
+    def add(self, isbn_list):
+        return self.client.post(
+            "/api/lib/books/add/", {"isbn_list": isbn_list}, format="json"
+        ).json()
+
+    def test_normalize_isbn(self):
+        self.assertEqual(normalize_isbn("0-306-40615-2"), "9780306406157")
+        self.assertEqual(normalize_isbn(" 978-0306406157 "), "9780306406157")
+
+    def test_only_ascii_digits_are_valid(self):
+        superscript = "978030640615\u00b2"
+        arabic_indic = "".join(chr(0x0660 + int(d)) for d in "9780306406157")
+        self.assertEqual(
+            normalize_isbn_list([superscript, arabic_indic, "030640615\u00b2"]),
+            ([], [superscript, arabic_indic, "030640615\u00b2"]),
+        )
+        result = import_catalog(
+            StringIO(f"isbn_13,title\n{superscript},A\n{arabic_indic},B\n"), "csv"
+        )
+        self.assertEqual((result["created"], result["invalid"]), (0, 2))
+        self.assertFalse(Book.objects.exists())
+
+    def test_reimport_and_misses_are_served_from_cache(self):
+        with FakeBooksAPI(missing={"9780262033848"}) as api, override_settings(
+            GOOGLE_BOOKS_API_URL=api.url
+        ):
+            self.add(["9781111111113", "9780262033848"])
+            Book.objects.all().delete()
+            data = self.add(["978-1111111113", "9780262033848"])
+
+        self.assertEqual(api.requests, 2)
+        self.assertEqual(data["added_books"][0]["title"], "Title 9781111111113")
+        self.assertEqual(data["errors"], ["Book not found for ISBN 9780262033848"])
+        stats = metadata_cache.cache_stats()
+        self.assertEqual(
+            (stats["hits"], stats["negative_hits"], stats["misses"]), (1, 1, 2)
+        )
+        lookups = {
+            labels: value
+            for (name, labels), (value,) in metrics._counters.items()
+            if name == "isbn_cache_lookups_total"
+        }
+        self.assertEqual(
+            lookups,
+            {
+                (("result", "hit"),): 1,
+                (("result", "negative_hit"),): 1,
+                (("result", "miss"),): 2,
+            },
+        )
+        self.assertEqual(metrics._counters[("isbn_cache_stores_total", ())], [2])
+
+    def test_expired_entries_are_refetched(self):
+        IsbnMetadata.objects.create(
+            isbn="9781111111113",
+            volume_info=None,
+            fetched_at=timezone.now() - timedelta(days=2),
+        )
+        with FakeBooksAPI() as api, override_settings(GOOGLE_BOOKS_API_URL=api.url):
+            data = self.add(["9781111111113"])
+        self.assertEqual(api.requests, 1)
+        self.assertEqual(len(data["added_books"]), 1)
+        self.assertIsNotNone(IsbnMetadata.objects.get(isbn="9781111111113").volume_info)
+
+    @override_settings(ISBN_CACHE_MAX_ENTRIES=2, ISBN_CACHE_EVICT_EVERY=2)
+    def test_eviction_keeps_newest_entries(self):
+        metadata_cache._stored_since_evict = 0
+        now = timezone.now()
+        for i in range(2):
+            IsbnMetadata.objects.create(
+                isbn=f"978000000000{i}", fetched_at=now - timedelta(hours=2 - i)
+            )
+        with self.assertNumQueries(1):  # the upsert; no size check yet
+            metadata_cache.store({"9780306406157": None, "not-an-isbn": None})
+        metadata_cache.store({"9781111111113": None})
+        self.assertEqual(
+            sorted(IsbnMetadata.objects.values_list("isbn", flat=True)),
+            ["9780306406157", "9781111111113"],
+        )
+        self.assertEqual(metrics._counters[("isbn_cache_evictions_total", ())], [2])
+
+    def test_warm_command(self):
+        out = StringIO()
+        with FakeBooksAPI() as api, override_settings(GOOGLE_BOOKS_API_URL=api.url):
+            call_command("warm_isbn_cache", "9781111111113", "1111111111", stdout=out)
+            call_command(
+                "warm_isbn_cache", "9781111111113", "junk", stdout=out, stderr=out
+            )
+        self.assertEqual(api.requests, 1)
+        self.assertIn("hits=1", out.getvalue())
+        self.assertIn("Invalid ISBN junk", out.getvalue())
+
+
+class SearchBooksTests(TestCase):
+    def setUp(self):
+        clear_response_cache()
+        self.client = APIClient()
+        self.client.force_authenticate(make_profile("reader").auth_user)
+        Book.objects.bulk_create(
+            [
+                Book(isbn_13="1", title="Dune", authors="Frank Herbert", publisher="P"),
+                Book(
+                    isbn_13="2",
+                    title="Children of Dune",
+                    authors="Frank Herbert",
+                    publisher="P",
+                ),
+                Book(
+                    isbn_13="3",
+                    title="Emma",
+                    authors="Jane Austen",
+                    publisher="P",
+                    description="A novel set near Dune Street",
+                ),
+                Book(
+                    isbn_13="4",
+                    title="Persuasion",
+                    authors="Jane Austen",
+                    publisher="P",
+                ),
+            ]
+        )
+
+    def search(self, **params):
+        return self.client.get("/api/lib/books/search/", params).json()
+
+    def test_ranks_title_matches_above_description_matches(self):
+        data = self.search(q="dune")
+        self.assertEqual(
+            [b["title"] for b in data["results"]], ["Dune", "Children of Dune", "Emma"]
+        )
+        self.assertEqual(
+            set(data["results"][0]), {"id", "title", "authors", "available"}
+        )
+
+    def test_matches_authors_and_requires_every_term(self):
+        data = self.search(q="austen persuasion")
+        self.assertEqual([b["title"] for b in data["results"]], ["Persuasion"])
+
+    def test_paginates(self):
+        first = self.search(q="dune", page_size=2)
+        self.assertEqual((first["next"], first["previous"]), (2, None))
+        second = self.search(q="dune", page_size=2, page=2)
+        self.assertEqual([b["title"] for b in second["results"]], ["Emma"])
+        self.assertEqual((second["next"], second["previous"]), (None, 1))
+
+    def test_empty_query_returns_nothing(self):
+        self.assertEqual(self.search(q=" ")["results"], [])
+
+
+class CirculationTests(TestCase):
+    def setUp(self):
+        self.profile = make_profile("reader")
+        self.client = APIClient()
+        self.client.force_authenticate(self.profile.auth_user)
+        (self.book,) = make_books(1)
+
+    def test_borrow_until_unavailable(self):
+        url = f"/api/lib/books/{self.book.pk}/borrow/"
+        self.assertEqual(self.client.post(url).status_code, 200)
+        self.assertEqual(self.client.post(url).status_code, 400)
+        self.assertEqual(
+            self.client.post("/api/lib/books/999/borrow/").status_code, 404
+        )
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.available, 0)
+
+    def test_return_once_with_late_fee(self):
+        borrowing = Borrowing.objects.create(
+            user=self.profile,
+            book=self.book,
+            due_date=timezone.now().date() - timedelta(days=3),
+        )
+        Book.objects.filter(pk=self.book.pk).update(available=0)
+        url = f"/api/lib/borrowings/{borrowing.pk}/return/"
+        response = self.client.post(url)
+        self.assertEqual(response.json()["late_fee"], 3)
+        self.assertEqual(self.client.post(url).status_code, 400)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.available, 1)
+
+
+class BulkCirculationTests(TestCase):
+    def setUp(self):
+        self.patron = make_profile("reader")
+        self.client = APIClient()
+        self.client.force_authenticate(self.patron.auth_user)
+        self.books = make_books(3)
+        Book.objects.filter(pk=self.books[0].pk).update(quantity=2, available=2)
+        Book.objects.filter(pk=self.books[2].pk).update(available=0)
+
+    def borrow(self, book_ids, **extra):
+        return self.client.post(
+            "/api/lib/books/borrow/", {"book_ids": book_ids, **extra}, format="json"
+        )
+
+    def test_checkout_reports_each_item(self):
+        first, second, gone = (book.pk for book in self.books)
+        response = self.borrow([first, second, first, first, gone, 999])
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(body["borrowed"], 3)
+        self.assertEqual(
+            [item["status"] for item in body["results"]],
+            ["borrowed", "borrowed", "borrowed", "unavailable", "unavailable"]
+            + ["not_found"],
+        )
+        self.assertEqual(
+            sorted(
+                Borrowing.objects.filter(user=self.patron).values_list("id", "book_id")
+            ),
+            sorted(
+                (item["borrowing_id"], item["book_id"]) for item in body["results"][:3]
+            ),
+        )
+        self.assertEqual(
+            list(Book.objects.order_by("id").values_list("available", "borrow_count")),
+            [(0, 2), (0, 1), (0, 0)],
+        )
+
+    def test_checkout_query_count_does_not_grow_with_items(self):
+        books = make_books(31, start=100)
+        stats.reconcile()
+        counts = []
+        for batch in (books[:1], books[1:]):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.borrow([book.pk for book in batch])
+            self.assertEqual(response.json()["borrowed"], len(batch))
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_return_reports_each_item_and_charges_late_fees(self):
+        today = timezone.now().date()
+        other = make_profile("other")
+        mine = Borrowing.objects.bulk_create(
+            Borrowing(user=self.patron, book=book, due_date=today - timedelta(days=d))
+            for book, d in zip(self.books, (2, -5))
+        )
+        theirs = Borrowing.objects.create(
+            user=other, book=self.books[2], due_date=today
+        )
+        ids = [mine[0].pk, mine[1].pk, mine[0].pk, theirs.pk]
+        response = self.client.post(
+            "/api/lib/borrowings/return/", {"borrowing_ids": ids}, format="json"
+        )
+        self.assertEqual(response.json()["returned"], 2)
+        self.assertEqual(
+            [
+                (item["status"], item.get("late_fee"))
+                for item in response.json()["results"]
+            ],
+            [
+                ("returned", 2),
+                ("returned", 0),
+                ("already_returned", None),
+                ("not_found", None),
+            ],
+        )
+        self.assertEqual(
+            list(
+                Borrowing.objects.filter(user=self.patron)
+                .order_by("id")
+                .values_list("return_date", "late_fee")
+            ),
+            [(today, Decimal("2.00")), (today, Decimal("0.00"))],
+        )
+        self.assertEqual(
+            list(Book.objects.order_by("id").values_list("available", flat=True)),
+            [3, 2, 0],
+        )
+
+    def test_librarian_checks_out_for_a_patron(self):
+        librarian = make_profile("desk", "Librarian")
+        self.client.force_authenticate(librarian.auth_user)
+        response = self.borrow([self.books[1].pk], patron=self.patron.pk)
+        self.assertEqual(response.json()["borrowed"], 1)
+        self.assertTrue(Borrowing.objects.filter(user=self.patron).exists())
+        self.assertEqual(self.borrow([self.books[0].pk], patron=0).status_code, 404)
+
+    def test_rejects_bad_batches(self):
+        self.assertEqual(self.borrow([]).status_code, 400)
+        self.assertEqual(self.borrow(["1"]).status_code, 400)
+        self.assertEqual(self.borrow(list(range(1, 52))).status_code, 400)
+        response = self.borrow([self.books[1].pk], patron=self.patron.pk)
+        self.assertEqual(response.status_code, 403)
+
+
+class CirculationContentionTests(TransactionTestCase):
+    def test_popular_book_invariants_hold_under_contention(self):
+        book = Book.objects.create(
+            isbn_13="9780000000001",
+            title="Popular",
+            publisher="P",
+            quantity=3,
+            available=3,
+        )
+        # SQLite can't take concurrent writers, so only the single-threaded
+        # path of the harness is exercised there.
+        patrons = 1 if connection.vendor == "sqlite" else 8
+        profiles = [make_profile(f"patron{i}") for i in range(patrons)]
+        results = hammer_popular_book(book, profiles, churn_rounds=3)
+        self.assertEqual(results["rush"]["ok"], min(3, patrons))
+        self.assertGreater(results["churn"]["requests_per_second"], 0)
+
+    def test_command_leaves_the_stats_as_it_found_them(self):
+        threads = 1 if connection.vendor == "sqlite" else 4
+        call_command(
+            "benchmark_contention",
+            threads=threads,
+            copies=2,
+            rounds=2,
+            stdout=StringIO(),
+        )
+        self.assertFalse(Book.objects.exists())
+        self.assertEqual(stats.maintained_totals(), stats.fresh_totals())
+
+
+class ReportTests(TestCase):
+    def setUp(self):
+        clear_response_cache()
+        self.librarian = make_profile("librarian", "Librarian")
+        self.reader = make_profile("reader")
+        self.client = APIClient()
+
+    def report(self, **params):
+        self.client.force_authenticate(self.librarian.auth_user)
+        return self.client.get("/api/lib/reports/", params).json()
+
+    def test_maintained_report_matches_fresh(self):
+        with FakeBooksAPI() as api, override_settings(GOOGLE_BOOKS_API_URL=api.url):
+            self.client.force_authenticate(self.librarian.auth_user)
+            self.client.post(
+                "/api/lib/books/add/",
+                {"isbn_list": ["9781111111113", "9780262033848"]},
+                format="json",
+            )
+        first, second = Book.objects.order_by("id")
+        self.client.force_authenticate(self.reader.auth_user)
+        self.client.post(f"/api/lib/books/{first.pk}/borrow/")
+        borrowing = Borrowing.objects.get()
+        self.client.post(f"/api/lib/borrowings/{borrowing.pk}/return/")
+        self.client.post(f"/api/lib/books/{first.pk}/borrow/")
+        self.client.post(f"/api/lib/books/{second.pk}/borrow/")
+
+        report = self.report()
+        self.assertEqual(report, self.report(fresh=1))
+        self.assertEqual(
+            (
+                report["total_books"],
+                report["total_borrowings"],
+                report["outstanding_borrowings"],
+            ),
+            (2, 3, 2),
+        )
+        self.assertEqual(report["most_borrowed_books"][0]["borrow_count"], 2)
+
+        self.client.force_authenticate(self.librarian.auth_user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(f"/api/lib/books/{first.pk}/")
+        report = self.report()
+        self.assertEqual(report, self.report(fresh=1))
+        self.assertEqual(report["total_borrowings"], 1)
+
+    def test_reconcile_command_fixes_drift(self):
+        (book,) = make_books(1)
+        Borrowing.objects.create(
+            user=self.reader, book=book, due_date=timezone.now().date()
+        )
+        self.report()
+        LibraryStats.objects.update(total_books=0)
+        LibraryStats.objects.filter(pk=7).update(total_books=40)
+        out = StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command("reconcile_stats", stdout=out)
+        self.assertIn("total_books: 40 -> 1", out.getvalue())
+        self.assertEqual(self.report(), self.report(fresh=1))
+
+
+class StatsShardTests(TestCase):
+    def setUp(self):
+        self.addCleanup(vars(stats._local).clear)
+
+    def bump_from_shard(self, shard, **deltas):
+        stats._local.shard = shard
+        stats.bump(**deltas)
+
+    def test_bumps_spread_over_shards_and_sum_up(self):
+        self.bump_from_shard(2, total_books=2, catalog_version=1)
+        self.bump_from_shard(5, total_books=1, catalog_version=1)
+        self.assertEqual(stats.maintained_totals()["total_books"], 3)
+        self.assertEqual(stats.catalog_state()[0], 2)
+        self.assertEqual(
+            list(
+                LibraryStats.objects.filter(total_books__gt=0)
+                .order_by("pk")
+                .values_list("pk", "total_books")
+            ),
+            [(2, 2), (5, 1)],
+        )
+
+    def test_reconcile_folds_shards_and_keeps_catalog_versions(self):
+        make_books(2)
+        self.bump_from_shard(3, total_books=5, catalog_version=4)
+        drift, _ = stats.reconcile()
+        self.assertEqual(drift, {"total_books": (5, 2)})
+        self.assertEqual(
+            list(LibraryStats.objects.order_by("pk").values_list("total_books")[:4]),
+            [(2,), (0,), (0,), (0,)],
+        )
+        self.assertEqual(stats.catalog_state()[0], 4)
+
+    def test_bump_recreates_missing_shards_without_reconciling(self):
+        (book,) = make_books(1)
+        Borrowing.objects.create(
+            user=make_profile("reader"), book=book, due_date=timezone.now().date()
+        )
+        LibraryStats.objects.all().delete()
+        with self.assertNumQueries(3):
+            self.bump_from_shard(1, total_borrowings=1)
+        self.assertEqual(LibraryStats.objects.count(), stats.STATS_SHARDS)
+        book.refresh_from_db()
+        self.assertEqual(book.borrow_count, 0)
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(make_profile("librarian", "Librarian").auth_user)
+        self.reader = make_profile("reader")
+        self.today = timezone.now().date()
+        books = make_books(3)
+        Book.objects.filter(pk=books[2].pk).update(available=0)
+        self.returned, self.overdue, self.current = Borrowing.objects.bulk_create(
+            [
+                Borrowing(
+                    user=self.reader,
+                    book=books[0],
+                    due_date=self.today - timedelta(days=5),
+                    return_date=self.today - timedelta(days=3),
+                    late_fee=Decimal("0"),
+                ),
+                Borrowing(
+                    user=self.reader,
+                    book=books[1],
+                    due_date=self.today - timedelta(days=4),
+                ),
+                Borrowing(
+                    user=self.reader,
+                    book=books[2],
+                    due_date=self.today + timedelta(days=7),
+                ),
+            ]
+        )
+
+    def export(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        with self.assertNumQueries(1):  # one cursor however many rows
+            return b"".join(response.streaming_content).decode()
+
+    def test_borrowing_ledger_csv_includes_status_and_fees(self):
+        body = self.export("/api/lib/exports/borrowings/")
+        rows = {int(row["id"]): row for row in csv.DictReader(StringIO(body))}
+        self.assertEqual(rows[self.returned.pk]["status"], "returned")
+        self.assertEqual(rows[self.overdue.pk]["status"], "overdue")
+        self.assertEqual(Decimal(rows[self.overdue.pk]["fee_due"]), Decimal("4"))
+        self.assertEqual(Decimal(rows[self.current.pk]["fee_due"]), Decimal("0"))
+
+        overdue = self.export("/api/lib/exports/borrowings/", status="overdue")
+        self.assertEqual(
+            [int(row["id"]) for row in csv.DictReader(StringIO(overdue))],
+            [self.overdue.pk],
+        )
+        tomorrow = (self.today + timedelta(days=1)).isoformat()
+        empty = self.export("/api/lib/exports/borrowings/", **{"from": tomorrow})
+        self.assertEqual(empty.splitlines(), [",".join(BORROWING_EXPORT_COLUMNS)])
+
+    def test_catalog_ndjson_filters_on_availability(self):
+        body = self.export(
+            "/api/lib/exports/books/", output="ndjson", status="available"
+        )
+        self.assertEqual(
+            [json.loads(line)["title"] for line in body.splitlines()],
+            ["Book 0", "Book 1"],
+        )
+
+    def test_bad_filters_and_patrons_are_rejected(self):
+        response = self.client.get("/api/lib/exports/borrowings/", {"to": "soon"})
+        self.assertEqual(response.status_code, 400)
+        self.client.force_authenticate(self.reader.auth_user)
+        response = self.client.get("/api/lib/exports/books/")
+        self.assertEqual(response.status_code, 403)
+
+    def test_command_writes_the_export_to_a_file(self):
+        path = "/tmp/export_library_test.ndjson"
+        call_command(
+            "export_library", "borrowings", "--format", "ndjson", "--output", path
+        )
+        with open(path) as f:
+            self.assertEqual(len(f.readlines()), 3)
+
+
+class InventoryTests(TestCase):
+    def setUp(self):
+        reader = make_profile("reader")
+        self.books = make_books(4)
+        Book.objects.update(quantity=3, available=3)
+        today = timezone.now().date()
+        Borrowing.objects.bulk_create(
+            Borrowing(
+                user=reader,
+                book=book,
+                due_date=today,
+                return_date=today if i < returned else None,
+            )
+            for book, out, returned in zip(self.books, (1, 0, 2, 3), (1, 2, 0, 0))
+            for i in range(returned + out)
+        )
+        # book 0 is right, book 1 drifted up, book 2 down, book 3 below zero
+        for book, available in zip(self.books, (2, 5, 3, -1)):
+            Book.objects.filter(pk=book.pk).update(available=available)
+        metrics._counters.clear()
+
+    def available(self):
+        return list(Book.objects.order_by("id").values_list("available", flat=True))
+
+    def test_reports_drift_without_changing_anything(self):
+        found = []
+        result = check_inventory(batch_size=3, report=found.extend)
+        self.assertEqual((result["checked"], result["drifted"]), (4, 3))
+        self.assertEqual(result["repaired"], 0)
+        self.assertEqual(
+            found,
+            [
+                (self.books[1].pk, 5, 3),
+                (self.books[2].pk, 3, 1),
+                (self.books[3].pk, -1, 0),
+            ],
+        )
+        self.assertEqual(self.available(), [2, 5, 3, -1])
+        self.assertEqual(metrics._counters[("inventory_books_drifted_total", ())], [3])
+
+    def test_repair_fixes_drift_in_batches(self):
+        version = stats.catalog_state()[0]
+        out = StringIO()
+        call_command("check_inventory", "--repair", "--batch-size=1", stdout=out)
+        self.assertIn("4 books: 3 drifted, 3 repaired", out.getvalue())
+        self.assertEqual(self.available(), [2, 3, 1, 0])
+        self.assertGreater(stats.catalog_state()[0], version)
+        self.assertEqual(metrics._counters[("inventory_books_repaired_total", ())], [3])
+        self.assertEqual(check_inventory()["drifted"], 0)
+
+
+class RecommendationTests(TestCase):
+    def setUp(self):
+        self.reader = make_profile("reader")
+        self.client = APIClient()
+        self.client.force_authenticate(self.reader.auth_user)
+
+    def test_compute_neighbors_cosine(self):
+        # users 1 and 2 borrow books 10 and 11; user 3 borrows 11 and 12
+        neighbors = compute_neighbors([1, 1, 2, 2, 3, 3], [10, 11, 10, 11, 11, 12])
+        self.assertEqual([n for n, _ in neighbors[11]], [10, 12])
+        self.assertAlmostEqual(neighbors[10][0][1], 2 / (2 * 3) ** 0.5, places=5)
+
+    def test_recommends_from_precomputed_neighbors(self):
+        a, b, c, d = make_books(4)
+        Book.objects.filter(pk=d.pk).update(categories="Poetry")
+        Book.objects.filter(pk=c.pk).update(categories="Poetry")
+        other = make_profile("other")
+        for book in (a, b, c):
+            Borrowing.objects.create(
+                user=other, book=book, due_date=timezone.now().date()
+            )
+        Borrowing.objects.create(
+            user=self.reader, book=a, due_date=timezone.now().date()
+        )
+
+        call_command("build_recommendations", stdout=StringIO())
+        # d was never borrowed: it gets category neighbours instead
+        self.assertEqual(
+            list(
+                BookNeighbor.objects.filter(book=d).values_list(
+                    "neighbor_id", flat=True
+                )
+            ),
+            [c.pk],
+        )
+        with self.assertNumQueries(1):  # one SELECT, no request transaction
+            data = self.client.get("/api/lib/books/recommendations/").json()
+        self.assertEqual({row["id"] for row in data}, {b.pk, c.pk})
+
+    def test_benchmark_serves_the_synthetic_patrons_and_rolls_back(self):
+        out = StringIO()
+        call_command(
+            "benchmark_recommendations",
+            users=40,
+            books=15,
+            borrows_per_user=4,
+            serve=10,
+            stdout=out,
+        )
+        results = json.loads(out.getvalue())
+        self.assertEqual(results["serve_ms"]["count"], 10)
+        self.assertFalse(Book.objects.exists())
+        self.assertEqual(UserProfile.objects.count(), 1)
+
+    def test_cold_user_gets_popular_books(self):
+        a, b = make_books(2)
+        Book.objects.filter(pk=b.pk).update(borrow_count=5)
+        data = self.client.get("/api/lib/books/recommendations/").json()
+        self.assertEqual([row["id"] for row in data], [b.pk, a.pk])
+
+
+class OverdueNotificationTests(TestCase):
+    def setUp(self):
+        self.reader = make_profile("reader")
+        self.today = timezone.now().date()
+        books = make_books(5)
+        self.borrowings = [
+            Borrowing.objects.create(
+                user=self.reader, book=book, due_date=self.today - timedelta(days=i)
+            )
+            for i, book in enumerate(books)
+        ]
+        # returned books are never reminded about
+        Borrowing.objects.filter(pk=self.borrowings[4].pk).update(
+            return_date=self.today
+        )
+
+    def test_creates_one_reminder_per_overdue_borrowing_per_day(self):
+        result = generate_overdue_notifications(today=self.today, chunk_size=2)
+        self.assertEqual((result["scanned"], result["created"]), (3, 3))
+        self.assertEqual(
+            set(Notification.objects.values_list("borrowing_id", flat=True)),
+            {b.pk for b in self.borrowings[1:4]},
+        )
+        self.assertIn(
+            "1 day overdue",
+            Notification.objects.get(borrowing=self.borrowings[1]).message,
+        )
+
+        result = generate_overdue_notifications(today=self.today, restart=True)
+        self.assertEqual(result["created"], 0)
+        self.assertEqual(Notification.objects.count(), 3)
+
+    def test_resumes_after_last_committed_chunk(self):
+        JobCheckpoint.objects.create(
+            name=f"overdue-notifications:{self.today.isoformat()}",
+            position=self.borrowings[2].pk,
+        )
+        out = StringIO()
+        call_command("send_overdue_notifications", stdout=out)
+        self.assertEqual(
+            list(Notification.objects.values_list("borrowing_id", flat=True)),
+            [self.borrowings[3].pk],
+        )
+        self.assertIn("created 1 reminders", out.getvalue())
+
+
+class FeeAccrualTests(TestCase):
+    def setUp(self):
+        self.reader = make_profile("reader")
+        self.other = make_profile("other")
+        self.today = timezone.now().date()
+        books = make_books(5)
+        for days, book in zip((3, 10, -2), books):
+            Borrowing.objects.create(
+                user=self.reader, book=book, due_date=self.today - timedelta(days=days)
+            )
+        Borrowing.objects.create(
+            user=self.reader,
+            book=books[3],
+            due_date=self.today - timedelta(days=30),
+            return_date=self.today - timedelta(days=25),
+            late_fee=Decimal("5.00"),
+        )
+        # returned on time: no fee, no balance row
+        Borrowing.objects.create(
+            user=self.other,
+            book=books[4],
+            due_date=self.today,
+            return_date=self.today,
+        )
+
+    def test_accrues_overdue_loans_and_rebuilds_balances(self):
+        result = accrue_late_fees(as_of=self.today)
+        self.assertEqual((result["accrued"], result["patrons"]), (2, 1))
+        self.assertEqual(
+            sorted(
+                Borrowing.objects.filter(return_date__isnull=True).values_list(
+                    "late_fee", flat=True
+                )
+            ),
+            [0, 3, 10],
+        )
+        balance = FeeBalance.objects.get(pk=self.reader.pk)
+        self.assertEqual(
+            (
+                balance.overdue_loans,
+                balance.accruing,
+                balance.lifetime_charged,
+                balance.as_of,
+            ),
+            (2, Decimal("13.00"), Decimal("5.00"), self.today),
+        )
+
+        # Reruns recompute from due_date; a later day accrues more.
+        accrue_late_fees(as_of=self.today)
+        self.assertEqual(FeeBalance.objects.get().accruing, Decimal("13.00"))
+        accrue_late_fees(as_of=self.today + timedelta(days=1))
+        self.assertEqual(FeeBalance.objects.get().accruing, Decimal("15.00"))
+
+    @override_settings(LATE_FEE_PER_DAY="0.25")
+    def test_rate_comes_from_settings_and_is_capped(self):
+        out = StringIO()
+        call_command("accrue_late_fees", f"--date={self.today}", stdout=out)
+        self.assertIn("on 2 borrowings; 1 patrons owe fees", out.getvalue())
+        self.assertEqual(FeeBalance.objects.get().accruing, Decimal("3.25"))
+
+        with override_settings(LATE_FEE_PER_DAY="5000"):
+            accrue_late_fees(as_of=self.today)
+        self.assertEqual(
+            Borrowing.objects.filter(return_date__isnull=True)
+            .order_by("due_date")
+            .values_list("late_fee", flat=True)[0],
+            MAX_LATE_FEE,
+        )
+
+    def test_balance_endpoint_reads_one_row(self):
+        accrue_late_fees(as_of=self.today)
+        client = APIClient()
+        client.force_authenticate(self.reader.auth_user)
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get("/api/lib/borrowings/fees/")
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(
+            response.json(),
+            {
+                "as_of": self.today.isoformat(),
+                "overdue_loans": 2,
+                "accruing": 13,
+                "lifetime_charged": 5,
+            },
+        )
+
+        client.force_authenticate(self.other.auth_user)
+        response = client.get("/api/lib/borrowings/fees/")
+        self.assertEqual(
+            response.json(),
+            {
+                "as_of": None,
+                "overdue_loans": 0,
+                "accruing": 0,
+                "lifetime_charged": 0,
+            },
+        )
+
+
+class NotificationApiTests(TestCase):
+    def setUp(self):
+        self.reader = make_profile("reader")
+        self.client = APIClient()
+        self.client.force_authenticate(self.reader.auth_user)
+        Notification.objects.bulk_create(
+            Notification(user=self.reader, message=f"n{i}") for i in range(5)
+        )
+        Notification.objects.create(user=make_profile("other"), message="not mine")
+        # identical timestamps force the id tie-breaker
+        Notification.objects.update(created_at=timezone.now())
+
+    def test_cursor_pages_newest_first(self):
+        seen = []
+        params = {"page_size": 2}
+        while True:
+            page = self.client.get("/api/lib/notifications/", params).json()
+            seen += [n["message"] for n in page["results"]]
+            if not page["next"]:
+                break
+            params["cursor"] = page["next"]
+        self.assertEqual(seen, ["n4", "n3", "n2", "n1", "n0"])
+        back = self.client.get(
+            "/api/lib/notifications/", {"page_size": 2, "cursor": page["previous"]}
+        ).json()
+        self.assertEqual([n["message"] for n in back["results"]], ["n2", "n1"])
+
+    def test_unread_count_and_bulk_mark_read(self):
+        ids = list(
+            Notification.objects.filter(user=self.reader).values_list("id", flat=True)
+        )
+        self.assertEqual(
+            self.client.get("/api/lib/notifications/unread-count/").json(),
+            {"unread": 5},
+        )
+
+        response = self.client.post(
+            "/api/lib/notifications/mark-read/", {"ids": ids[:2]}, format="json"
+        )
+        self.assertEqual(response.json(), {"updated": 2})
+        unread = self.client.get("/api/lib/notifications/", {"unread": 1}).json()
+        self.assertEqual(len(unread["results"]), 3)
+
+        response = self.client.post(
+            "/api/lib/notifications/mark-read/", {"all": True}, format="json"
+        )
+        self.assertEqual(response.json(), {"updated": 3})
+        self.assertEqual(
+            self.client.get("/api/lib/notifications/unread-count/").json(),
+            {"unread": 0},
+        )
+        self.assertEqual(Notification.objects.filter(is_read=False).count(), 1)
+
+    def test_mark_read_requires_ids(self):
+        response = self.client.post(
+            "/api/lib/notifications/mark-read/", {}, format="json"
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_mark_read_requires_integer_ids(self):
+        for ids in (["x"], [{"a": 1}], [True]):
+            response = self.client.post(
+                "/api/lib/notifications/mark-read/", {"ids": ids}, format="json"
+            )
+            self.assertEqual(response.status_code, 400, ids)
+        self.assertEqual(Notification.objects.filter(is_read=True).count(), 0)
+
+    def test_cursor_with_an_unparseable_timestamp(self):
+        cursor = pagination.encode_cursor(["garbage", 1])
+        response = self.client.get("/api/lib/notifications/", {"cursor": cursor})
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"])
+class QueryBudgetTests(TestCase):
+    """
+    Every route in books/urls.py and users/urls.py, called with real JWT
+    auth against a small and a ten times larger dataset. The SQL count
+    (transaction savepoints excluded) must fit the declared budget and must
+    not grow with the data.
+    """
+
+    SCALES = (3, 30)
+
+    # (url name, method): (caller role, max queries)
+    BUDGETS = {
+        ("book-list", "GET"): (None, 2),
+        ("add-books", "POST"): ("librarian", 4),
+        ("import-books", "POST"): ("librarian", 3),
+        ("book-detail", "GET"): ("patron", 2),
+        ("book-detail", "PUT"): ("librarian", 3),
+        ("book-detail", "DELETE"): ("librarian", 6),
+        ("borrow-book", "POST"): ("patron", 3),
+        ("return-book", "POST"): ("patron", 4),
+        ("bulk-borrow-books", "POST"): ("patron", 4),
+        ("bulk-return-books", "POST"): ("patron", 5),
+        ("borrowing-history", "GET"): ("patron", 1),
+        ("fee-balance", "GET"): ("patron", 1),
+        ("search-books", "GET"): ("patron", 1),
+        ("book-recommendations", "GET"): ("patron", 2),
+        ("user-notifications", "GET"): ("patron", 1),
+        ("unread-notification-count", "GET"): ("patron", 1),
+        ("mark-notifications-read", "POST"): ("patron", 1),
+        ("generate-report", "GET"): ("librarian", 3),
+        ("response-cache-stats", "GET"): ("librarian", 0),
+        ("profile-list", "GET"): ("librarian", 0),
+        ("profile-download", "GET"): ("librarian", 0),
+        ("export-books", "GET"): ("librarian", 1),
+        ("export-borrowings", "GET"): ("librarian", 1),
+        ("token_obtain_pair", "POST"): (None, 2),
+        ("token_refresh", "POST"): (None, 1),
+        ("signup", "POST"): (None, 2),
+        ("update_profile", "GET"): ("patron", 2),
+        ("update_profile", "POST"): ("patron", 4),
+        ("protected_view", "GET"): ("patron", 0),
+        ("google_auth", "POST"): (None, 3),
+    }
+
+    # Expected success status when not 200.
+    STATUSES = {
+        ("add-books", "POST"): 201,
+        ("book-detail", "DELETE"): 204,
+        ("signup", "POST"): 201,
+    }
+
+    FORMATS = {"import-books": "multipart"}
+
+    def setUp(self):
+        use_temporary_profiling_dir(self)
+        self.google = FakeGoogleCerts().__enter__()
+        self.addCleanup(self.google.__exit__, None, None, None)
+        self.librarian = make_profile("librarian", "Librarian")
+        self.patron = make_profile("patron")
+        self.seeded = 0
+        self.calls = 0
+
+    def seed(self, scale):
+        today = timezone.now().date()
+        books = make_books(scale - self.seeded, start=1000 + self.seeded)
+        self.seeded = scale
+        Borrowing.objects.bulk_create(
+            Borrowing(
+                user=self.patron,
+                book=book,
+                due_date=today,
+                return_date=None if i % 2 else today,
+            )
+            for i, book in enumerate(books)
+        )
+        Notification.objects.bulk_create(
+            Notification(user=self.patron, message=f"note {book.pk}") for book in books
+        )
+        others = list(Book.objects.order_by("-id")[:5])
+        BookNeighbor.objects.bulk_create(
+            BookNeighbor(book=book, neighbor=other, score=1.0)
+            for book in books
+            for other in others
+            if other.pk != book.pk
+        )
+        IsbnMetadata.objects.bulk_create(
+            IsbnMetadata(
+                isbn=with_check_digit(f"97830000{scale:03d}{i}"),
+                volume_info={"title": "Cached"},
+                fetched_at=timezone.now(),
+            )
+            for i in range(3)
+        )
+        stats.reconcile()
+        clear_response_cache()
+
+    def client_for(self, role):
+        client = APIClient()
+        if role:
+            profile = self.librarian if role == "librarian" else self.patron
+            access = get_tokens_for_user(profile.auth_user)["access"]
+            client.credentials(HTTP_AUTHORIZATION=f"Bearer {access}")
+        return client
+
+    def request_for(self, name, method, scale):
+        # Returns (url kwargs, body); creates whatever a one-shot call consumes.
+        self.calls += 1
+        book = Book.objects.create(
+            isbn_13=f"97840000{self.calls:05d}", title="Target", publisher="P"
+        )
+        if name in ("book-detail", "borrow-book"):
+            return {"pk" if name == "book-detail" else "book_id": book.pk}, {
+                "title": "Renamed"
+            }
+        if name == "return-book":
+            borrowing = Borrowing.objects.create(
+                user=self.patron, book=book, due_date=timezone.now().date()
+            )
+            return {"borrowing_id": borrowing.pk}, None
+        if name in ("bulk-borrow-books", "bulk-return-books"):
+            books = [book] + make_books(2, start=5000 + 10 * self.calls)
+            if name == "bulk-borrow-books":
+                return {}, {"book_ids": [b.pk for b in books]}
+            borrowings = Borrowing.objects.bulk_create(
+                Borrowing(user=self.patron, book=b, due_date=timezone.now().date())
+                for b in books
+            )
+            return {}, {"borrowing_ids": [b.pk for b in borrowings]}
+        if name == "add-books":
+            return {}, {
+                "isbn_list": [
+                    with_check_digit(f"97830000{scale:03d}{i}") for i in range(3)
+                ]
+            }
+        if name == "import-books":
+            rows = "".join(
+                f'{{"isbn_13": "{isbn}", "title": "Imported"}}\n'
+                for isbn in ("9780306406157", "9780131103627", "9780262033848")
+            )
+            return {}, {"file": SimpleUploadedFile("books.jsonl", rows.encode())}
+        if name == "profile-download":
+            with open(os.path.join(settings.PROFILING_DIR, "p.json"), "w") as f:
+                json.dump({"name": "p", "queries": [], "top_functions": ""}, f)
+            return {"filename": "p.json"}, None
+        if name == "mark-notifications-read":
+            return {}, {"all": True}
+        if name == "token_obtain_pair":
+            return {}, {"username": "patron", "password": "password123"}
+        if name == "token_refresh":
+            return {}, {
+                "refresh": get_tokens_for_user(self.patron.auth_user)["refresh"]
+            }
+        if name == "signup":
+            return {}, {
+                "username": f"new{self.calls}",
+                "password": "password123",
+                "email": f"new{self.calls}@example.com",
+                "name": "New",
+                "role": "Customer",
+            }
+        if name == "update_profile":
+            return {}, {"name": "Patron"}
+        if name == "search-books":
+            return {}, {"q": "book"}
+        if name == "google_auth":
+            # A new account every call, so each one signs up the same way.
+            email = f"google{self.calls}@example.com"
+            return {}, {"id_token": self.google.id_token(email), "role": "Customer"}
+        return {}, None
+
+    def count_queries(self, name, method, role, scale):
+        # Fails unless the call succeeds: error paths would fit any budget.
+        kwargs, body = self.request_for(name, method, scale)
+        url = reverse(name, kwargs=kwargs)
+        client = self.client_for(role)
+        with CaptureQueriesContext(connection) as ctx:
+            if method == "GET":
+                response = client.get(url, body)
+            else:
+                response = getattr(client, method.lower())(
+                    url, body, format=self.FORMATS.get(name, "json")
+                )
+            if response.streaming:
+                # Streamed exports only query while the body is read.
+                b"".join(response.streaming_content)
+        self.assertEqual(
+            response.status_code, self.STATUSES.get((name, method), 200), (name, method)
+        )
+        return sum(
+            1
+            for query in ctx.captured_queries
+            if not query["sql"].startswith(("SAVEPOINT", "RELEASE SAVEPOINT"))
+        )
+
+    def test_every_route_has_a_budget(self):
+        names = {
+            pattern.name for pattern in books_urls.urlpatterns + users_urls.urlpatterns
+        }
+        self.assertEqual(names, {name for name, _ in self.BUDGETS})
+
+    # Views that only read run without a request-wide transaction.
+    NON_ATOMIC = {
+        "book-list",
+        "import-books",
+        "book-detail",
+        "borrowing-history",
+        "fee-balance",
+        "search-books",
+        "book-recommendations",
+        "user-notifications",
+        "unread-notification-count",
+        "generate-report",
+        "response-cache-stats",
+        "profile-list",
+        "profile-download",
+        "export-books",
+        "export-borrowings",
+        "protected_view",
+    }
+
+    def test_only_read_only_routes_skip_request_transactions(self):
+        non_atomic = {
+            pattern.name
+            for pattern in books_urls.urlpatterns + users_urls.urlpatterns
+            if "default" in getattr(pattern.callback, "_non_atomic_requests", ())
+        }
+        self.assertEqual(non_atomic, self.NON_ATOMIC)
+
+    def test_query_counts_are_flat_and_within_budget(self):
+        counts = {}
+        for scale in self.SCALES:
+            self.seed(scale)
+            for (name, method), (role, _) in self.BUDGETS.items():
+                counts.setdefault((name, method), []).append(
+                    self.count_queries(name, method, role, scale)
+                )
+        for key, (role, budget) in self.BUDGETS.items():
+            with self.subTest(route=key, counts=counts[key]):
+                self.assertEqual(len(set(counts[key])), 1, "grows with data")
+                self.assertLessEqual(counts[key][0], budget)
+
+
+class SparseFieldsetTests(TestCase):
+    def setUp(self):
+        clear_response_cache()
+        self.client = APIClient()
+        self.client.force_authenticate(make_profile("reader").auth_user)
+        (self.book,) = make_books(1)
+
+    def test_list_and_detail_return_only_requested_fields(self):
+        page = self.client.get("/api/lib/books/", {"fields": "title,authors"}).json()
+        self.assertEqual(
+            page["results"],
+            [{"id": self.book.pk, "title": "Book 0", "authors": "Author"}],
+        )
+        detail = self.client.get(
+            f"/api/lib/books/{self.book.pk}/", {"fields": "isbn_13"}
+        ).json()
+        self.assertEqual(detail, {"id": self.book.pk, "isbn_13": "9780000000000"})
+        self.assertEqual(
+            len(self.client.get(f"/api/lib/books/{self.book.pk}/").json()), 18
+        )
+        self.assertEqual(self.client.get("/api/lib/books/999/").status_code, 404)
+
+    def test_unknown_field_is_rejected(self):
+        response = self.client.get("/api/lib/books/", {"fields": "title,password"})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {"error": "Unknown fields: password."})
+
+    def test_orjson_renderer_matches_drf_encoding(self):
+        data = {
+            "fee": Decimal("1.50"),
+            "when": datetime(2024, 1, 2, 3, 4, 5, tzinfo=dt_timezone.utc),
+            "title": "Café",
+        }
+        self.assertEqual(
+            json.loads(ORJSONRenderer().render(data)),
+            json.loads(JSONRenderer().render(data)),
+        )
+
+
+class ConditionalCatalogTests(TestCase):
+    def setUp(self):
+        clear_response_cache()
+        self.client = APIClient()
+        self.client.force_authenticate(make_profile("librarian", "Librarian").auth_user)
+        (self.book,) = make_books(1)
+        stats.bump(catalog_version=1)
+
+    def get(self, url, etag=None, **params):
+        headers = {"HTTP_IF_NONE_MATCH": etag} if etag else {}
+        return self.client.get(url, params, **headers)
+
+    def test_unchanged_catalog_answers_304_without_loading_books(self):
+        response = self.get("/api/lib/books/")
+        etag = response["ETag"]
+        self.assertTrue(response.has_header("Last-Modified"))
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.get("/api/lib/books/", etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertNotIn("books_book", " ".join(q["sql"] for q in ctx.captured_queries))
+        # a different page/fieldset is a different representation
+        self.assertEqual(
+            self.get("/api/lib/books/", etag, fields="title").status_code, 200
+        )
+
+    def test_writes_change_the_etag(self):
+        url = f"/api/lib/books/{self.book.pk}/"
+        etag = self.get(url)["ETag"]
+        self.client.put(url, {"title": "New title"}, format="json")
+        response = self.get(url, etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["title"], "New title")
+
+        etag = response["ETag"]
+        self.client.post(f"/api/lib/books/{self.book.pk}/borrow/")
+        self.assertEqual(self.get(url, etag).status_code, 200)
+
+
+class ResponseCacheTests(TestCase):
+    def setUp(self):
+        clear_response_cache()
+        self.client = APIClient()
+        self.librarian = make_profile("librarian", "Librarian")
+        self.client.force_authenticate(self.librarian.auth_user)
+        make_books(3)
+        stats.reconcile()
+
+    def titles(self):
+        return [
+            b["title"] for b in self.client.get("/api/lib/books/").json()["results"]
+        ]
+
+    def test_hits_skip_the_view_and_ignore_query_param_order(self):
+        self.client.get("/api/lib/books/search/", {"q": "book", "page_size": 2})
+        with self.assertNumQueries(0):
+            response = self.client.get("/api/lib/books/search/?page_size=2&q=book&")
+        self.assertEqual(len(response.json()["results"]), 2)
+
+    def test_stats_bump_evicts_catalog_pages_after_commit(self):
+        self.assertEqual(len(self.titles()), 3)
+        make_books(1, start=10)
+        self.assertEqual(len(self.titles()), 3)  # bulk_create alone is cached
+        with self.captureOnCommitCallbacks(execute=True):
+            stats.bump(total_books=1, catalog_version=1)
+        self.assertEqual(len(self.titles()), 4)
+
+    def test_model_signals_evict_only_dependent_responses(self):
+        self.client.get("/api/lib/books/search/", {"q": "book"})
+        self.client.get("/api/lib/reports/")
+        before = response_cache.cache_stats()
+        book = Book.objects.first()
+        with self.captureOnCommitCallbacks(execute=True):
+            Borrowing.objects.create(
+                user=self.librarian, book=book, due_date=timezone.now().date()
+            )
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get("/api/lib/reports/")
+        self.assertGreater(len(ctx.captured_queries), 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Notification.objects.create(user=self.librarian, message="hi")
+        with self.assertNumQueries(0):
+            self.client.get("/api/lib/reports/")
+
+        after = self.client.get("/api/lib/reports/cache/").json()
+        self.assertEqual(after["evictions"] - before["evictions"], 2)
+        self.assertEqual(after["hits"] - before["hits"], 1)
+        self.assertEqual(after["misses"] - before["misses"], 1)
+        self.assertIsNotNone(after["hit_ratio"])
+
+    def test_loans_only_evict_pages_that_show_stock(self):
+        search = "/api/lib/books/search/"
+        self.client.get(search, {"q": "book", "fields": "title"})
+        self.client.get(search, {"q": "book"})
+        with self.captureOnCommitCallbacks(execute=True):
+            stats.bump(total_borrowings=1, outstanding_borrowings=1, catalog_version=1)
+        with self.assertNumQueries(0):
+            self.client.get(search, {"q": "book", "fields": "title"})
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(search, {"q": "book"})
+        self.assertGreater(len(ctx.captured_queries), 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            stats.bump(catalog_version=1)
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(search, {"q": "book", "fields": "title"})
+        self.assertGreater(len(ctx.captured_queries), 0)
+
+    def test_stats_include_other_workers_until_they_expire(self):
+        cache = caches[response_cache.CACHE_ALIAS]
+        cache.set(response_cache._slot_key(response_cache.STATS_SLOTS - 1), 1)
+        cache.set(
+            response_cache._stats_key(1),
+            {"hits": 5, "misses": 0, "stores": 0, "evictions": 0},
+        )
+        totals = response_cache.cache_stats()
+        self.assertEqual(totals["workers"], 2)
+        self.assertGreaterEqual(totals["hits"], 5)
+
+        cache.delete(response_cache._stats_key(1))  # its TTL ran out
+        self.assertEqual(response_cache.cache_stats()["workers"], 1)
+
+    def test_bypass_params_are_never_cached(self):
+        self.client.get("/api/lib/reports/", {"fresh": 1})
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get("/api/lib/reports/", {"fresh": 1})
+        self.assertGreater(len(ctx.captured_queries), 2)
+
+
+class SeedLibraryTests(TestCase):
+    def test_seeded_library_is_consistent(self):
+        result = seed_library(
+            users=20, books=50, borrowings=400, notifications=30, batch_size=64
+        )
+        self.assertEqual(
+            (result["users"], result["books"], result["borrowings"]), (20, 50, 400)
+        )
+        self.assertEqual(UserProfile.objects.count(), 20)
+        self.assertEqual(Notification.objects.count(), 30)
+        books = Book.objects.annotate(
+            out=Count("borrowing", filter=Q(borrowing__return_date__isnull=True)),
+            loans=Count("borrowing"),
+        )
+        for book in books:
+            self.assertEqual(book.available, book.quantity - book.out)
+            self.assertEqual(book.borrow_count, book.loans)
+        # Skewed popularity: the top tenth of titles takes most loans.
+        loans = sorted((book.loans for book in books), reverse=True)
+        self.assertGreater(sum(loans[:5]), sum(loans) / 3)
+        dates = Borrowing.objects.values_list("borrow_date", flat=True)
+        self.assertGreater(len(set(dates)), 100)
+        totals = stats.maintained_totals()
+        self.assertEqual(totals["total_books"], 50)
+        self.assertEqual(totals["total_borrowings"], 400)
+
+    def test_same_seed_same_data_and_clear_removes_it(self):
+        seed_library(users=5, books=10, borrowings=40, notifications=0, seed=7)
+        first = list(Book.objects.order_by("id").values_list("title", "available"))
+        clear_seeded_library()
+        self.assertFalse(Book.objects.filter(publisher=SEED_PUBLISHER).exists())
+        self.assertFalse(User.objects.exists())
+        seed_library(users=5, books=10, borrowings=40, notifications=0, seed=7)
+        self.assertEqual(
+            list(Book.objects.order_by("id").values_list("title", "available")), first
+        )
+
+
+@override_settings(PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"])
+class BenchmarkEndpointsTests(TestCase):
+    def test_every_route_is_benchmarked(self):
+        names = {
+            pattern.name for pattern in books_urls.urlpatterns + users_urls.urlpatterns
+        }
+        self.assertEqual(names, {name for name, _, _ in ENDPOINTS})
+
+    def test_benchmark_reports_every_route_and_rolls_back(self):
+        use_temporary_profiling_dir(self)
+        results = benchmark_endpoints(sizes=(10, 20), repeat=2)
+        self.assertEqual(list(results["sizes"]), ["10", "20"])
+        endpoints = results["sizes"]["20"]["endpoints"]
+        self.assertEqual(len(endpoints), len(ENDPOINTS))
+        for route, summary in endpoints.items():
+            with self.subTest(route=route):
+                self.assertEqual(summary["requests"], 2)
+                self.assertLess(max(summary["statuses"]), 300)
+                self.assertLessEqual(summary["p50_ms"], summary["p99_ms"])
+        self.assertFalse(Book.objects.exists())
+        self.assertFalse(User.objects.exists())
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        clear_response_cache()
+        metrics_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, metrics_dir)
+        overrides = override_settings(METRICS_DIR=metrics_dir, METRICS_TOKEN="")
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        metrics._counters.clear()
+        metrics._histograms.clear()
+        metrics._requests.clear()
+        self.client = APIClient()
+
+    def scrape(self):
+        response = self.client.get("/api/metrics/")
+        self.assertEqual(response["Content-Type"], metrics.CONTENT_TYPE)
+        return dict(
+            line.rsplit(" ", 1)
+            for line in response.content.decode().splitlines()
+            if not line.startswith("#")
+        )
+
+    def test_requests_queries_and_sizes_per_url_name(self):
+        make_books(3)
+        for _ in range(2):
+            self.assertEqual(self.client.get("/api/lib/books/").status_code, 200)
+        self.client.get("/api/lib/nowhere/")
+        samples = self.scrape()
+        self.assertEqual(
+            samples['http_requests_total{view="book-list",method="GET",status="200"}'],
+            "2",
+        )
+        self.assertEqual(
+            samples['http_request_duration_seconds_count{view="book-list"}'], "2"
+        )
+        self.assertEqual(
+            samples['http_request_db_queries_count{view="book-list"}'], "2"
+        )
+        self.assertGreater(
+            float(samples['http_request_db_queries_sum{view="book-list"}']), 0
+        )
+        self.assertGreater(
+            float(samples['http_request_db_seconds_total{view="book-list"}']), 0
+        )
+        self.assertGreater(
+            float(samples['http_response_size_bytes_sum{view="book-list"}']), 100
+        )
+        self.assertEqual(
+            samples[
+                'http_requests_total{view="<unmatched>",method="GET",status="404"}'
+            ],
+            "1",
+        )
+
+    async def test_async_handler_records_queries_from_sync_views(self):
+        await sync_to_async(make_books)(3)
+        response = await AsyncClient().get("/api/lib/books/")
+        self.assertEqual(response.status_code, 200)
+        samples = await sync_to_async(self.scrape)()
+        self.assertEqual(
+            samples['http_request_db_queries_count{view="book-list"}'], "1"
+        )
+        self.assertGreater(
+            float(samples['http_request_db_queries_sum{view="book-list"}']), 0
+        )
+
+    def test_streamed_response_size_is_counted_once_consumed(self):
+        make_books(3)
+        self.client.force_authenticate(make_profile("lib", "Librarian").auth_user)
+        response = self.client.get("/api/lib/exports/books/", {"output": "csv"})
+        size = len(b"".join(response.streaming_content))
+        samples = self.scrape()
+        self.assertEqual(
+            float(samples['http_response_size_bytes_sum{view="export-books"}']), size
+        )
+
+    def test_snapshots_of_other_workers_are_merged(self):
+        self.client.get("/api/lib/books/")
+        other = {
+            "counters": [
+                [
+                    "http_requests_total",
+                    [["view", "book-list"], ["method", "GET"], ["status", "200"]],
+                    5,
+                ]
+            ],
+            "histograms": [],
+        }
+        with open(os.path.join(settings.METRICS_DIR, "metrics-1.json"), "w") as f:
+            json.dump(other, f)
+        samples = self.scrape()
+        self.assertEqual(
+            samples['http_requests_total{view="book-list",method="GET",status="200"}'],
+            "6",
+        )
+
+    def test_google_lookups_are_timed(self):
+        self.client.force_authenticate(make_profile("lib", "Librarian").auth_user)
+        with FakeBooksAPI(missing={"9780262033848"}) as api, override_settings(
+            GOOGLE_BOOKS_API_URL=api.url
+        ):
+            self.client.post(
+                "/api/lib/books/add/",
+                {"isbn_list": ["9781111111113", "9780262033848"]},
+                format="json",
+            )
+        samples = self.scrape()
+        self.assertEqual(
+            samples[
+                'google_api_request_duration_seconds_count{api="books",outcome="ok"}'
+            ],
+            "2",
+        )
+
+    @override_settings(METRICS_TOKEN="s3cret")
+    def test_token_protects_the_endpoint(self):
+        self.assertEqual(self.client.get("/api/metrics/").status_code, 403)
+        response = self.client.get(
+            "/api/metrics/", headers={"Authorization": "Bearer s3cret"}
+        )
+        self.assertEqual(response.status_code, 200)
+
+
+class ProfilingTests(TestCase):
+    def setUp(self):
+        clear_response_cache()
+        use_temporary_profiling_dir(self)
+        self.librarian = make_profile("librarian", "Librarian")
+        self.client = APIClient()
+        self.client.force_authenticate(self.librarian.auth_user)
+
+    def token(self):
+        return self.client.get("/api/lib/profiles/").json()["token"]
+
+    def test_signed_header_profiles_the_request_with_its_sql(self):
+        make_books(3)
+        self.client.get("/api/lib/reports/")
+        self.assertEqual(self.client.get("/api/lib/profiles/").json()["profiles"], [])
+
+        response = self.client.get(
+            "/api/lib/reports/", {"fresh": 1}, headers={"X-Profile": self.token()}
+        )
+        self.assertEqual(response.status_code, 200)
+        (profile,) = self.client.get("/api/lib/profiles/").json()["profiles"]
+        self.assertEqual(
+            (profile["view"], profile["trigger"], profile["user"]),
+            ("generate-report", "header", self.librarian.auth_user.pk),
+        )
+        self.assertGreater(profile["query_count"], 0)
+
+        json_file, prof_file = profile["files"]
+        response = self.client.get(f"/api/lib/profiles/{json_file}/")
+        detail = json.loads(b"".join(response.streaming_content))
+        self.assertEqual(len(detail["queries"]), profile["query_count"])
+        self.assertIn("generate_report", detail["top_functions"])
+        response = self.client.get(f"/api/lib/profiles/{prof_file}/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Disposition"].split(";")[0], "attachment")
+
+    def test_forged_or_missing_token_is_not_profiled(self):
+        token = self.token()
+        self.client.get("/api/lib/books/", headers={"X-Profile": token + "x"})
+        self.client.get("/api/lib/books/", headers={"X-Profile": "1:abc:def"})
+        self.assertEqual(os.listdir(settings.PROFILING_DIR), [])
+
+    def test_token_only_profiles_its_own_librarian(self):
+        token = self.token()
+        patron = APIClient()
+        patron.force_authenticate(make_profile("reader").auth_user)
+        patron.get("/api/lib/books/", headers={"X-Profile": token})
+        self.client.logout()
+        self.client.get("/api/lib/books/", headers={"X-Profile": token})
+        self.assertEqual(os.listdir(settings.PROFILING_DIR), [])
+
+    def test_token_stops_working_when_the_librarian_is_demoted(self):
+        token = self.token()
+        UserProfile.objects.filter(pk=self.librarian.pk).update(role="Customer")
+        self.client.get("/api/lib/books/", headers={"X-Profile": token})
+        self.assertEqual(os.listdir(settings.PROFILING_DIR), [])
+
+    @override_settings(PROFILING_SAMPLE_RATE=1.0, PROFILING_MAX_PROFILES=2)
+    def test_sampling_keeps_only_the_newest_profiles(self):
+        for _ in range(4):
+            self.client.get("/api/lib/books/")
+        self.assertEqual(len(os.listdir(settings.PROFILING_DIR)), 4)
+        profiles = self.client.get("/api/lib/profiles/").json()["profiles"]
+        self.assertEqual({p["trigger"] for p in profiles}, {"sample"})
+
+    def test_download_serves_profile_files_only(self):
+        self.assertEqual(
+            self.client.get("/api/lib/profiles/..%2Fsecret.json/").status_code, 404
+        )
+        self.assertEqual(
+            self.client.get("/api/lib/profiles/missing.prof/").status_code, 404
+        )
+
+    def test_profiles_are_for_librarians_only(self):
+        patron = APIClient()
+        patron.force_authenticate(make_profile("patron").auth_user)
+        self.assertEqual(patron.get("/api/lib/profiles/").status_code, 403)
@@ -1,15 +1,24 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import async_views, views
 
 urlpatterns = [
     path("books/", views.book_list, name="book-list"),
-    path("books/add/", views.add_books, name="add-books"),
+    path(
+        "books/add/",
+        async_views.add_books if settings.ASYNC_VIEWS else views.add_books,
+        name="add-books",
+    ),
+    path("books/import/", views.import_books, name="import-books"),
     path("books/<int:pk>/", views.book_detail, name="book-detail"),
     path("books/<int:book_id>/borrow/", views.borrow_book, name="borrow-book"),
     path(
         "borrowings/<int:borrowing_id>/return/", views.return_book, name="return-book"
     ),
+    path("books/borrow/", views.bulk_borrow_books, name="bulk-borrow-books"),
+    path("borrowings/return/", views.bulk_return_books, name="bulk-return-books"),
     path("borrowings/history/", views.user_borrowing_history, name="borrowing-history"),
+    path("borrowings/fees/", views.user_fee_balance, name="fee-balance"),
     path("books/search/", views.search_books, name="search-books"),
     path(
         "books/recommendations/",
@@ -17,5 +26,20 @@ urlpatterns = [
         name="book-recommendations",
     ),
     path("notifications/", views.user_notifications, name="user-notifications"),
+    path(
+        "notifications/unread-count/",
+        views.unread_notification_count,
+        name="unread-notification-count",
+    ),
+    path(
+        "notifications/mark-read/",
+        views.mark_notifications_read,
+        name="mark-notifications-read",
+    ),
     path("reports/", views.generate_report, name="generate-report"),
+    path("exports/books/", views.export_books, name="export-books"),
+    path("exports/borrowings/", views.export_borrowings, name="export-borrowings"),
+    path("reports/cache/", views.response_cache_stats, name="response-cache-stats"),
+    path("profiles/", views.profile_list, name="profile-list"),
+    path("profiles/<str:filename>/", views.profile_download, name="profile-download"),
 ]
@@ -1,13 +1,43 @@
 # views.py
 
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.http import FileResponse, Http404
 from django.shortcuts import get_object_or_404
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.response import Response
 from rest_framework import status
-from .models import Book, Borrowing, Notification, UserProfile
-import requests
+from project import profiling
+from .models import Book, Borrowing, FeeBalance, Notification, UserProfile
+from .pagination import InvalidCursor, get_page_size, keyset_paginate
+from .recommendations import recommend_for
+from .search import get_search_engine
+from .serializers import (
+    BOOK_EDITABLE_FIELDS,
+    BOOK_FIELDS,
+    BOOK_STOCK_FIELDS,
+    BOOK_SUMMARY_FIELDS,
+    InvalidFields,
+    book_to_dict,
+    project_books,
+    requested_fields,
+)
+from . import fees, stats
+from .streaming import STREAM_CHUNK_SIZE, STREAM_FORMATS, streaming_response
+from .catalog_import import IMPORT_FORMATS, MAX_JOB_LENGTH, import_catalog
+from .conditional import catalog_conditional
+from .exports import EXPORT_CHUNK_SIZE, EXPORT_FORMATS, EXPORTS, InvalidExportFilter
+from .response_cache import cache_stats, cached_response
+from .google_books import lookup_isbns
+from .isbn import normalize_isbn_list
+from collections import Counter, defaultdict
 from datetime import datetime, timedelta
+import io
+import os
+
+LOAN_PERIOD = timedelta(days=14)
 
 # Custom permission class
 from rest_framework.permissions import BasePermission
@@ -22,120 +52,191 @@ class IsLibrarian(BasePermission):
         )
 
 
-def book_to_dict(book):
-    return {
-        "id": book.id,
-        "isbn_10": book.isbn_10,
-        "isbn_13": book.isbn_13,
-        "title": book.title,
-        "subtitle": book.subtitle,
-        "authors": book.authors,
-        "publisher": book.publisher,
-        "published_date": book.published_date,
-        "description": book.description,
-        "page_count": book.page_count,
-        "categories": book.categories,
-        "language": book.language,
-        "preview_link": book.preview_link,
-        "info_link": book.info_link,
-        "small_thumbnail": book.small_thumbnail,
-        "thumbnail": book.thumbnail,
-        "quantity": book.quantity,
-        "available": book.available,
-    }
+def book_page_tags(default):
+    # Pages that show copy counts go stale on every loan and return; the
+    # rest only when the catalog itself changes.
+    def tags(request):
+        try:
+            fields = requested_fields(request, default=default)
+        except InvalidFields:
+            fields = ()
+        if BOOK_STOCK_FIELDS.intersection(fields):
+            return ["catalog", "stock"]
+        return ["catalog"]
+
+    return tags
 
 
+@transaction.non_atomic_requests
 @api_view(["GET"])
 @permission_classes([AllowAny])
+@catalog_conditional
+@cached_response(
+    "book-list", tags=book_page_tags(BOOK_FIELDS), bypass_params=["stream"]
+)
 def book_list(request):
-    books = Book.objects.all()
-    data = [book_to_dict(book) for book in books]
-    return Response(data)
+    # ?stream=json|ndjson|csv writes the whole catalog with a chunked iterator;
+    # otherwise return one keyset page ordered by id.
+    try:
+        fields = requested_fields(request)
+    except InvalidFields as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    stream = request.query_params.get("stream")
+    if stream:
+        if stream not in STREAM_FORMATS:
+            return Response(
+                {"error": f"Unsupported stream format '{stream}'."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        rows = project_books(Book.objects.order_by("id"), fields).iterator(
+            chunk_size=STREAM_CHUNK_SIZE
+        )
+        return streaming_response(rows, stream)
+
+    try:
+        books, next_cursor, previous_cursor = keyset_paginate(
+            project_books(Book.objects.all(), fields), request
+        )
+    except InvalidCursor as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(
+        {"results": books, "next": next_cursor, "previous": previous_cursor}
+    )
 
 
 @api_view(["POST"])
 @permission_classes([IsLibrarian])
 def add_books(request):
     isbn_list = request.data.get("isbn_list", [])
-    if not isbn_list:
+    if not isinstance(isbn_list, list) or not isbn_list:
         return Response(
             {"error": "ISBN list is required."}, status=status.HTTP_400_BAD_REQUEST
         )
+    try:
+        output_fields = requested_fields(request)
+    except InvalidFields as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    isbns, invalid = normalize_isbn_list(isbn_list)
+    existing = set(
+        Book.objects.filter(isbn_13__in=isbns).values_list("isbn_13", flat=True)
+    )
+    to_fetch, errors = partition_new_isbns(isbns, existing)
+
+    # Lookups fan out over a bounded pool on a shared keep-alive session;
+    # everything found is written with a single bulk INSERT.
+    new_books = []
+    # Invalid entries are never fetched; the lookup reports each of them.
+    for isbn, fields, error in lookup_isbns(to_fetch + invalid):
+        if error:
+            errors.append(error)
+        else:
+            new_books.append(Book(**fields, quantity=1, available=1))
+
+    added, conflicts = save_new_books(new_books)
+    return Response(
+        added_books_payload(added, errors + conflicts, output_fields),
+        status=status.HTTP_201_CREATED,
+    )
 
-    added_books = []
-    errors = []
 
-    for isbn in isbn_list:
-        try:
-            # Fetch book details from Google Books API
-            response = requests.get(
-                f"https://www.googleapis.com/books/v1/volumes?q=isbn:{isbn}"
-            )
-            if response.status_code != 200:
-                errors.append(f"Failed to fetch book details for ISBN {isbn}")
-                continue
+def _duplicate_error(isbn):
+    return f"Error adding book with ISBN {isbn}: Book already exists"
 
-            book_data = response.json()
-            if not book_data.get("items"):
-                errors.append(f"Book not found for ISBN {isbn}")
-                continue
 
-            volume_info = book_data["items"][0]["volumeInfo"]
-
-            # Create the book
-            book = Book.objects.create(
-                isbn_13=isbn,
-                isbn_10=next(
-                    (
-                        id["identifier"]
-                        for id in volume_info.get("industryIdentifiers", [])
-                        if id["type"] == "ISBN_10"
-                    ),
-                    None,
-                ),
-                title=volume_info.get("title", ""),
-                subtitle=volume_info.get("subtitle", ""),
-                authors=", ".join(volume_info.get("authors", [])),
-                publisher=volume_info.get("publisher", ""),
-                published_date=volume_info.get("publishedDate", ""),
-                description=volume_info.get("description", ""),
-                page_count=volume_info.get("pageCount"),
-                categories=", ".join(volume_info.get("categories", [])),
-                language=volume_info.get("language", ""),
-                preview_link=volume_info.get("previewLink", ""),
-                info_link=volume_info.get("infoLink", ""),
-                small_thumbnail=volume_info.get("imageLinks", {}).get(
-                    "smallThumbnail", ""
-                ),
-                thumbnail=volume_info.get("imageLinks", {}).get("thumbnail", ""),
-                quantity=1,
-                available=1,
-            )
+def partition_new_isbns(isbn_list, existing):
+    """Split normalized ``isbn_list`` into ISBNs to look up and duplicate errors."""
+    errors = []
+    to_fetch = []
+    seen = set(existing)
+    for isbn in isbn_list:
+        if isbn in seen:
+            errors.append(_duplicate_error(isbn))
+        else:
+            seen.add(isbn)
+            to_fetch.append(isbn)
+    return to_fetch, errors
+
+
+def save_new_books(new_books):
+    """
+    Insert ``new_books``; returns ``(created, errors)``. A concurrent request
+    may add one of the ISBNs after our existence check: the batch is then
+    retried a row at a time and the ISBNs that lost are reported as duplicates.
+    """
+    with transaction.atomic():
+        try:
+            with transaction.atomic():
+                created, errors = Book.objects.bulk_create(new_books), []
+        except IntegrityError:
+            created, errors = [], []
+            for book in new_books:
+                try:
+                    with transaction.atomic():
+                        created += Book.objects.bulk_create([book])
+                except IntegrityError:
+                    errors.append(_duplicate_error(book.isbn_13))
+        stats.bump(total_books=len(created), catalog_version=len(created))
+    return created, errors
+
+
+def added_books_payload(books, errors, output_fields):
+    return {
+        "message": f"Added {len(books)} books successfully.",
+        "added_books": [book_to_dict(book, output_fields) for book in books],
+        "errors": errors,
+    }
 
-            added_books.append(book_to_dict(book))
-        except Exception as e:
-            errors.append(f"Error adding book with ISBN {isbn}: {str(e)}")
 
-    return Response(
-        {
-            "message": f"Added {len(added_books)} books successfully.",
-            "added_books": added_books,
-            "errors": errors,
-        },
-        status=status.HTTP_201_CREATED,
-    )
+# Each import batch commits on its own (with its checkpoint) instead of the
+# whole upload sharing one request transaction.
+@transaction.non_atomic_requests
+@api_view(["POST"])
+@permission_classes([IsLibrarian])
+def import_books(request):
+    upload = request.FILES.get("file")
+    if upload is None:
+        return Response(
+            {"error": "A CSV or JSONL file is required."},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    fmt = request.data.get("format") or os.path.splitext(upload.name)[1].lstrip(".")
+    if fmt not in IMPORT_FORMATS:
+        return Response(
+            {"error": f"format must be one of: {', '.join(IMPORT_FORMATS)}."},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    job = request.data.get("job") or None
+    if job is not None and (not isinstance(job, str) or len(job) > MAX_JOB_LENGTH):
+        return Response(
+            {"error": f"job must be a name of at most {MAX_JOB_LENGTH} characters."},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    # Uploads are spooled to disk by Django; rows are decoded lazily from it.
+    stream = io.TextIOWrapper(upload.file, encoding="utf-8-sig", newline="")
+    result = import_catalog(stream, fmt, job=job)
+    return Response(result)
 
 
-# @permission_classes([AllowAny])
+@transaction.non_atomic_requests
 @api_view(["GET", "PUT", "DELETE"])
 @permission_classes([IsAuthenticated])
+@catalog_conditional
 def book_detail(request, pk):
-    book = get_object_or_404(Book, pk=pk)
-
+    # Reads run outside a transaction; PUT/DELETE open their own below.
     if request.method == "GET":
-        return Response(book_to_dict(book))
+        try:
+            fields = requested_fields(request)
+        except InvalidFields as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        book = project_books(Book.objects.filter(pk=pk), fields).first()
+        if book is None:
+            raise Http404
+        return Response(book)
 
-    elif request.method in ["PUT", "DELETE"]:
+    book = get_object_or_404(Book, pk=pk)
+    if request.method in ["PUT", "DELETE"]:
         if not IsLibrarian().has_permission(request, None):
             return Response(
                 {"error": "You don't have permission to modify books."},
@@ -143,18 +244,30 @@ def book_detail(request, pk):
             )
 
         if request.method == "PUT":
-            book.title = request.data.get("title", book.title)
-            book.author = request.data.get("author", book.author)
-            book.publisher = request.data.get("publisher", book.publisher)
-            book.year = request.data.get("year", book.year)
-            book.genre = request.data.get("genre", book.genre)
-            book.quantity = request.data.get("quantity", book.quantity)
-            book.available = request.data.get("available", book.available)
-            book.save()
+            updated_fields = [
+                field for field in BOOK_EDITABLE_FIELDS if field in request.data
+            ]
+            for field in updated_fields:
+                setattr(book, field, request.data[field])
+            # Only write what was sent; maintained counters stay untouched.
+            if updated_fields:
+                with transaction.atomic():
+                    book.save(update_fields=updated_fields)
+                    stats.bump(catalog_version=1)
             return Response({"message": "Book updated successfully."})
 
         elif request.method == "DELETE":
-            book.delete()
+            with transaction.atomic():
+                outstanding = Borrowing.objects.filter(
+                    book=book, return_date__isnull=True
+                ).count()
+                book.delete()
+                stats.bump(
+                    total_books=-1,
+                    total_borrowings=-book.borrow_count,
+                    outstanding_borrowings=-outstanding,
+                    catalog_version=1,
+                )
             return Response(
                 {"message": "Book deleted successfully."},
                 status=status.HTTP_204_NO_CONTENT,
@@ -164,18 +277,23 @@ def book_detail(request, pk):
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
 def borrow_book(request, book_id):
-    book = get_object_or_404(Book, pk=book_id)
     user_profile = request.user.userprofile
-    if book.available > 0:
-        due_date = datetime.now().date() + timedelta(
-            days=14
-        )  # 2 weeks borrowing period
-        Borrowing.objects.create(user=user_profile, book=book, due_date=due_date)
-        book.available -= 1
-        book.save()
-        return Response(
-            {"message": "Book borrowed successfully.", "due_date": due_date}
+    due_date = datetime.now().date() + LOAN_PERIOD
+    with transaction.atomic():
+        # Conditional decrement: only succeeds while a copy is left, and
+        # writes just the counter, so concurrent checkouts can't oversell.
+        claimed = Book.objects.filter(pk=book_id, available__gt=0).update(
+            available=F("available") - 1, borrow_count=F("borrow_count") + 1
         )
+        if claimed:
+            Borrowing.objects.create(
+                user=user_profile, book_id=book_id, due_date=due_date
+            )
+            stats.bump(total_borrowings=1, outstanding_borrowings=1, catalog_version=1)
+            return Response(
+                {"message": "Book borrowed successfully.", "due_date": due_date}
+            )
+    get_object_or_404(Book.objects.only("id"), pk=book_id)
     return Response(
         {"error": "Book is not available."}, status=status.HTTP_400_BAD_REQUEST
     )
@@ -185,32 +303,202 @@ def borrow_book(request, book_id):
 @permission_classes([IsAuthenticated])
 def return_book(request, borrowing_id):
     user_profile = request.user.userprofile
-    borrowing = get_object_or_404(Borrowing, pk=borrowing_id, user=user_profile)
+    borrowing = get_object_or_404(
+        Borrowing.objects.only("id", "book_id", "due_date", "return_date"),
+        pk=borrowing_id,
+        user=user_profile,
+    )
     if not borrowing.return_date:
-        borrowing.return_date = datetime.now().date()
-        if borrowing.return_date > borrowing.due_date:
-            days_late = (borrowing.return_date - borrowing.due_date).days
-            borrowing.late_fee = days_late * 1  # $1 per day late fee
-        borrowing.save()
+        return_date = datetime.now().date()
+        late_fee = fees.late_fee(borrowing.due_date, return_date)
+        with transaction.atomic():
+            # Only the request that flips return_date gives the copy back.
+            returned = Borrowing.objects.filter(
+                pk=borrowing.pk, return_date__isnull=True
+            ).update(return_date=return_date, late_fee=late_fee)
+            if returned:
+                Book.objects.filter(pk=borrowing.book_id).update(
+                    available=F("available") + 1
+                )
+                stats.bump(outstanding_borrowings=-1, catalog_version=1)
+                return Response(
+                    {"message": "Book returned successfully.", "late_fee": late_fee}
+                )
+    return Response(
+        {"error": "This book has already been returned."},
+        status=status.HTTP_400_BAD_REQUEST,
+    )
+
+
+def _scanned_ids(request, key):
+    # Non-empty list of ids, at most CIRCULATION_BATCH_MAX_ITEMS; else None.
+    ids = request.data.get(key)
+    if (
+        not isinstance(ids, list)
+        or not 0 < len(ids) <= settings.CIRCULATION_BATCH_MAX_ITEMS
+        or not all(isinstance(pk, int) and not isinstance(pk, bool) for pk in ids)
+    ):
+        return None
+    return ids
+
+
+def _move_copies(copies, checkout):
+    # ``copies`` maps book id -> copies taken (or given back); one UPDATE
+    # per distinct count, and a desk batch is usually all 1s.
+    by_count = defaultdict(list)
+    for book_id, n in copies.items():
+        by_count[n].append(book_id)
+    for n, book_ids in by_count.items():
+        books = Book.objects.filter(pk__in=book_ids)
+        if checkout:
+            books.update(
+                available=F("available") - n, borrow_count=F("borrow_count") + n
+            )
+        else:
+            books.update(available=F("available") + n)
 
-        book = borrowing.book
-        book.available += 1
-        book.save()
 
+def _lock_books(book_ids):
+    # Locked in id order, so overlapping batches queue instead of deadlocking.
+    return dict(
+        Book.objects.select_for_update()
+        .filter(pk__in=set(book_ids))
+        .order_by("id")
+        .values_list("id", "available")
+    )
+
+
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def bulk_borrow_books(request):
+    # {"book_ids": [...]} checks out one copy per id (repeat an id for more
+    # copies) to the caller, or to {"patron": <profile id>} when a librarian
+    # scans at the desk. Each item succeeds or fails on its own.
+    book_ids = _scanned_ids(request, "book_ids")
+    if book_ids is None:
+        return Response(
+            {
+                "error": "Provide a list of at most "
+                f"{settings.CIRCULATION_BATCH_MAX_ITEMS} book ids."
+            },
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    patron_id = request.data.get("patron")
+    if patron_id is None:
+        patron_id = request.user.userprofile.pk
+    elif not IsLibrarian().has_permission(request, None):
+        return Response(
+            {"error": "Only librarians can check out books for a patron."},
+            status=status.HTTP_403_FORBIDDEN,
+        )
+    elif (
+        not isinstance(patron_id, int)
+        or not UserProfile.objects.filter(pk=patron_id).exists()
+    ):
         return Response(
-            {"message": "Book returned successfully.", "late_fee": borrowing.late_fee}
+            {"error": "Patron not found."}, status=status.HTTP_404_NOT_FOUND
         )
+
+    due_date = datetime.now().date() + LOAN_PERIOD
+    with transaction.atomic():
+        available = _lock_books(book_ids)
+        results, claimed = [], Counter()
+        for book_id in book_ids:
+            if book_id not in available:
+                results.append({"book_id": book_id, "status": "not_found"})
+            elif available[book_id] > claimed[book_id]:
+                claimed[book_id] += 1
+                results.append({"book_id": book_id, "status": "borrowed"})
+            else:
+                results.append({"book_id": book_id, "status": "unavailable"})
+        borrowed = [item for item in results if item["status"] == "borrowed"]
+        if borrowed:
+            _move_copies(claimed, checkout=True)
+            borrowings = Borrowing.objects.bulk_create(
+                Borrowing(user_id=patron_id, book_id=item["book_id"], due_date=due_date)
+                for item in borrowed
+            )
+            for item, borrowing in zip(borrowed, borrowings):
+                item["borrowing_id"] = borrowing.pk
+            stats.bump(
+                total_borrowings=len(borrowed),
+                outstanding_borrowings=len(borrowed),
+                catalog_version=1,
+            )
     return Response(
-        {"error": "This book has already been returned."},
-        status=status.HTTP_400_BAD_REQUEST,
+        {"due_date": due_date, "borrowed": len(borrowed), "results": results}
     )
 
 
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def bulk_return_books(request):
+    # {"borrowing_ids": [...]}; patrons can return their own borrowings,
+    # librarians any. Each item succeeds or fails on its own.
+    borrowing_ids = _scanned_ids(request, "borrowing_ids")
+    if borrowing_ids is None:
+        return Response(
+            {
+                "error": "Provide a list of at most "
+                f"{settings.CIRCULATION_BATCH_MAX_ITEMS} borrowing ids."
+            },
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    borrowings = Borrowing.objects.filter(pk__in=set(borrowing_ids))
+    if not IsLibrarian().has_permission(request, None):
+        borrowings = borrowings.filter(user=request.user.userprofile)
+
+    return_date = datetime.now().date()
+    with transaction.atomic():
+        # Borrowings before books, the same order as return_book.
+        loans = {
+            pk: (book_id, due_date, returned)
+            for pk, book_id, due_date, returned in borrowings.select_for_update()
+            .order_by("id")
+            .values_list("id", "book_id", "due_date", "return_date")
+        }
+        results, returning, copies = [], set(), Counter()
+        for borrowing_id in borrowing_ids:
+            if borrowing_id not in loans:
+                results.append({"borrowing_id": borrowing_id, "status": "not_found"})
+                continue
+            book_id, due_date, returned = loans[borrowing_id]
+            if returned or borrowing_id in returning:
+                results.append(
+                    {"borrowing_id": borrowing_id, "status": "already_returned"}
+                )
+                continue
+            returning.add(borrowing_id)
+            copies[book_id] += 1
+            results.append(
+                {
+                    "borrowing_id": borrowing_id,
+                    "status": "returned",
+                    "late_fee": fees.late_fee(due_date, return_date),
+                }
+            )
+        if returning:
+            Borrowing.objects.filter(pk__in=returning).update(
+                return_date=return_date,
+                late_fee=fees.late_fee_expression(return_date),
+            )
+            _lock_books(copies)
+            _move_copies(copies, checkout=False)
+            stats.bump(outstanding_borrowings=-len(returning), catalog_version=1)
+    return Response({"returned": len(returning), "results": results})
+
+
+@transaction.non_atomic_requests
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
 def user_borrowing_history(request):
     user_profile = request.user.userprofile
-    borrowings = Borrowing.objects.filter(user=user_profile).order_by("-borrow_date")
+    borrowings = (
+        Borrowing.objects.filter(user=user_profile)
+        .select_related("book")
+        .only("id", "borrow_date", "due_date", "return_date", "late_fee", "book__title")
+        .order_by("-borrow_date")
+    )
     data = [
         {
             "id": b.id,
@@ -225,84 +513,215 @@ def user_borrowing_history(request):
     return Response(data)
 
 
+@transaction.non_atomic_requests
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
+def user_fee_balance(request):
+    # Totals as of the last accrue_late_fees run; patrons who never owed
+    # anything have no row. Fees on returned copies are reported as lifetime
+    # charges: nothing records payments, so they are not a balance due.
+    user_profile = request.user.userprofile
+    balance = FeeBalance.objects.filter(pk=user_profile.pk).first()
+    if balance is None:
+        balance = FeeBalance(user_id=user_profile.pk, as_of=None)
+    return Response(
+        {
+            "as_of": balance.as_of,
+            "overdue_loans": balance.overdue_loans,
+            "accruing": balance.accruing,
+            "lifetime_charged": balance.lifetime_charged,
+        }
+    )
+
+
+@transaction.non_atomic_requests
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+@cached_response("search-books", tags=book_page_tags(BOOK_SUMMARY_FIELDS))
 def search_books(request):
-    query = request.query_params.get("q", "")
-    books = Book.objects.filter(title__icontains=query) | Book.objects.filter(
-        author__icontains=query
+    query = request.query_params.get("q", "").strip()
+    try:
+        page = max(1, int(request.query_params.get("page", 1)))
+    except ValueError:
+        page = 1
+    try:
+        fields = requested_fields(request, default=BOOK_SUMMARY_FIELDS)
+    except InvalidFields as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    if not query:
+        return Response({"results": [], "next": None, "previous": None})
+
+    page_size = get_page_size(request)
+    offset = (page - 1) * page_size
+    books = list(
+        project_books(get_search_engine().search(query), fields)[
+            offset : offset + page_size + 1
+        ]
     )
-    data = [
+    return Response(
         {
-            "id": book.id,
-            "title": book.title,
-            "author": book.author,
-            "available": book.available,
+            "results": books[:page_size],
+            "next": page + 1 if len(books) > page_size else None,
+            "previous": page - 1 if page > 1 else None,
         }
-        for book in books
-    ]
-    return Response(data)
+    )
 
 
+@transaction.non_atomic_requests
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
 def book_recommendations(request):
     user_profile = request.user.userprofile
-    user_genres = (
-        Borrowing.objects.filter(user=user_profile)
-        .values_list("book__genre", flat=True)
-        .distinct()
-    )
-    recommended_books = (
-        Book.objects.filter(genre__in=user_genres)
-        .exclude(borrowing__user=user_profile)
-        .distinct()[:5]
-    )
-    data = [
-        {"id": book.id, "title": book.title, "author": book.author}
-        for book in recommended_books
-    ]
+    recommended_books = recommend_for(user_profile)
+    if recommended_books:
+        data = [
+            {
+                "id": row["neighbor_id"],
+                "title": row["neighbor__title"],
+                "authors": row["neighbor__authors"],
+            }
+            for row in recommended_books
+        ]
+    else:
+        # Nothing to go on yet: fall back to the most borrowed books.
+        data = list(
+            Book.objects.exclude(borrowing__user=user_profile)
+            .order_by("-borrow_count", "id")
+            .values("id", "title", "authors")[:5]
+        )
     return Response(data)
 
 
+@transaction.non_atomic_requests
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
 def user_notifications(request):
     user_profile = request.user.userprofile
-    notifications = Notification.objects.filter(user=user_profile).order_by(
-        "-created_at"
-    )
-    data = [
+    notifications = Notification.objects.filter(user=user_profile)
+    if request.query_params.get("unread") in ("1", "true"):
+        notifications = notifications.filter(is_read=False)
+    try:
+        data, next_cursor, previous_cursor = keyset_paginate(
+            notifications.values("id", "message", "created_at", "is_read"),
+            request,
+            fields=("created_at", "id"),
+            descending=True,
+        )
+    except InvalidCursor as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    return Response({"results": data, "next": next_cursor, "previous": previous_cursor})
+
+
+@transaction.non_atomic_requests
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def unread_notification_count(request):
+    user_profile = request.user.userprofile
+    count = Notification.objects.filter(user=user_profile, is_read=False).count()
+    return Response({"unread": count})
+
+
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def mark_notifications_read(request):
+    # {"ids": [...]} marks those notifications, {"all": true} marks every
+    # unread one; either way it is a single UPDATE.
+    user_profile = request.user.userprofile
+    notifications = Notification.objects.filter(user=user_profile, is_read=False)
+    if not request.data.get("all"):
+        ids = request.data.get("ids")
+        if (
+            not isinstance(ids, list)
+            or not ids
+            or not all(isinstance(pk, int) and not isinstance(pk, bool) for pk in ids)
+        ):
+            return Response(
+                {"error": "Provide a list of notification ids or all=true."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        notifications = notifications.filter(id__in=ids)
+    updated = notifications.update(is_read=True)
+    return Response({"updated": updated})
+
+
+@transaction.non_atomic_requests
+@api_view(["GET"])
+@permission_classes([IsLibrarian])
+@cached_response(
+    "generate-report",
+    tags=["catalog", "borrowings"],
+    # Overdue counts move with the calendar, not with writes.
+    timeout=60,
+    bypass_params=["fresh"],
+)
+def generate_report(request):
+    # Totals and top borrowed come from the maintained stats; ?fresh=1
+    # recomputes everything from Book/Borrowing for comparison.
+    fresh = request.query_params.get("fresh") in ("1", "true")
+    return Response(stats.build_report(fresh=fresh))
+
+
+@transaction.non_atomic_requests
+@api_view(["GET"])
+@permission_classes([IsLibrarian])
+def response_cache_stats(request):
+    return Response(cache_stats())
+
+
+@transaction.non_atomic_requests
+@api_view(["GET"])
+@permission_classes([IsLibrarian])
+def profile_list(request):
+    # Also hands out a token: send it as the X-Profile header to have that
+    # request profiled.
+    return Response(
         {
-            "id": n.id,
-            "message": n.message,
-            "created_at": n.created_at,
-            "is_read": n.is_read,
+            "profiles": profiling.list_profiles(),
+            "header": profiling.HEADER,
+            "token": profiling.issue_token(request.user),
         }
-        for n in notifications
-    ]
-    return Response(data)
+    )
 
 
+@transaction.non_atomic_requests
 @api_view(["GET"])
 @permission_classes([IsLibrarian])
-def generate_report(request):
-    total_books = Book.objects.count()
-    total_borrowings = Borrowing.objects.count()
-    overdue_books = Borrowing.objects.filter(
-        return_date__isnull=True, due_date__lt=datetime.now().date()
-    ).count()
-    most_borrowed_books = Book.objects.annotate(
-        borrow_count=models.Count("borrowing")
-    ).order_by("-borrow_count")[:5]
-
-    report = {
-        "total_books": total_books,
-        "total_borrowings": total_borrowings,
-        "overdue_books": overdue_books,
-        "most_borrowed_books": [
-            {"title": book.title, "borrow_count": book.borrow_count}
-            for book in most_borrowed_books
-        ],
-    }
-    return Response(report)
+def profile_download(request, filename):
+    path = profiling.profile_path(filename)
+    if path is None:
+        raise Http404
+    return FileResponse(open(path, "rb"), as_attachment=True, filename=filename)
+
+
+def _export(request, dataset):
+    # ?output=csv|ndjson; rows are read with a server-side cursor and written
+    # chunk by chunk, so memory stays flat however large the table is.
+    output = request.query_params.get("output", "csv")
+    if output not in EXPORT_FORMATS:
+        return Response(
+            {"error": f"output must be one of: {', '.join(EXPORT_FORMATS)}."},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    rows_for, columns = EXPORTS[dataset]
+    try:
+        rows = rows_for(request.query_params)
+    except InvalidExportFilter as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    filename = f"{dataset}-{datetime.now().date().isoformat()}.{output}"
+    return streaming_response(
+        rows, output, EXPORT_CHUNK_SIZE, columns=columns, filename=filename
+    )
+
+
+@transaction.non_atomic_requests
+@api_view(["GET"])
+@permission_classes([IsLibrarian])
+def export_books(request):
+    return _export(request, "catalog")
+
+
+@transaction.non_atomic_requests
+@api_view(["GET"])
+@permission_classes([IsLibrarian])
+def export_borrowings(request):
+    return _export(request, "borrowings")
@@ -0,0 +1,60 @@
+"""
+Production gunicorn settings: gunicorn -c gunicorn.conf.py project.wsgi:application
+
+Sizing comes from the CPU count and can be overridden per host with
+environment variables. Every worker thread keeps its own database
+connection open (CONN_MAX_AGE), so workers * threads, summed over all
+hosts, must stay below PostgreSQL's max_connections.
+"""
+
+import os
+import shutil
+
+
+def _cpu_count():
+    try:
+        return len(os.sched_getaffinity(0))  # honours container CPU pinning
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:8000")
+
+# Views mostly wait on PostgreSQL or Google, so run a few threads per
+# process and two processes per core.
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "gthread")
+workers = int(os.environ.get("WEB_CONCURRENCY", 2 * _cpu_count() + 1))
+threads = int(os.environ.get("GUNICORN_THREADS", 4))
+
+# Import Django once in the master and fork ready workers: faster starts and
+# copy-on-write shared memory. Not combinable with code reloading.
+reload = os.environ.get("GUNICORN_RELOAD") == "1"
+preload_app = not reload
+
+# Recycle workers now and then to cap slow memory growth; the jitter keeps
+# them from restarting all at once.
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", 2000))
+max_requests_jitter = max_requests // 10
+
+# gthread workers heartbeat from their main loop, so this does not cut off
+# long imports or exports running on a worker thread.
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 60))
+graceful_timeout = 30
+keepalive = 5  # behind nginx, which reuses upstream connections
+
+
+def on_starting(server):
+    # Per-worker metric snapshots from a previous run would be merged into
+    # this run's counters (project/metrics.py).
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "project.settings")
+    from django.conf import settings
+
+    shutil.rmtree(settings.METRICS_DIR, ignore_errors=True)
+
+
+def post_fork(server, worker):
+    # Database connections must never be shared across processes; drop any
+    # the master opened while preloading.
+    from django.db import connections
+
+    connections.close_all()
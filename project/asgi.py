@@ -12,5 +12,10 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'project.settings')
+# Serve add_books and google_auth with their async views under ASGI.
+os.environ.setdefault('DJANGO_ASYNC_VIEWS', '1')
+# Sync code called from async views runs on short-lived executor threads,
+# which would each leave a persistent connection behind.
+os.environ.setdefault('DJANGO_CONN_MAX_AGE', '0')
 
 application = get_asgi_application()
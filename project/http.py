@@ -0,0 +1,20 @@
+import asyncio
+import weakref
+
+import aiohttp
+
+# One pooled session per (event loop, name): an aiohttp session is bound to
+# the loop it was created on, and a server process normally runs one loop.
+_sessions = weakref.WeakKeyDictionary()
+
+
+def async_session(name, max_connections, timeout):
+    """Keep-alive ``aiohttp.ClientSession`` for the running event loop."""
+    loop = asyncio.get_running_loop()
+    sessions = _sessions.setdefault(loop, {})
+    if name not in sessions or sessions[name].closed:
+        sessions[name] = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=max_connections),
+            timeout=aiohttp.ClientTimeout(total=timeout),
+        )
+    return sessions[name]
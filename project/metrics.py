@@ -0,0 +1,361 @@
+"""
+Prometheus text-format metrics, aggregated across worker processes.
+
+Each process keeps plain in-memory counters and histograms (a dict update
+per observation) and every ``METRICS_FLUSH_INTERVAL`` seconds writes a
+snapshot to its own file in ``settings.METRICS_DIR``. The metrics view
+merges all snapshots, so any worker can answer a scrape. Files of exited
+workers are kept so their counts are not lost; clear the directory when
+the server starts (gunicorn does not reuse it across deploys otherwise).
+"""
+
+import atexit
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+import glob
+import json
+import os
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse, HttpResponseForbidden
+from django.views.decorators.http import require_GET
+
+METRICS_FLUSH_INTERVAL = 1.0  # seconds between per-worker snapshot writes
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100)
+
+# name: (type, help, buckets)
+METRICS = {
+    "http_requests_total": (
+        "counter",
+        "Requests by URL name, method and status.",
+        None,
+    ),
+    "http_request_duration_seconds": (
+        "histogram",
+        "Time spent in the view and middleware below this one.",
+        LATENCY_BUCKETS,
+    ),
+    "http_request_db_queries": (
+        "histogram",
+        "SQL statements executed per request.",
+        QUERY_BUCKETS,
+    ),
+    "http_request_db_seconds_total": (
+        "counter",
+        "Time spent executing SQL per URL name.",
+        None,
+    ),
+    "http_response_size_bytes": ("histogram", "Response body size.", SIZE_BUCKETS),
+    "google_api_request_duration_seconds": (
+        "histogram",
+        "Outbound Google API calls by API and outcome.",
+        LATENCY_BUCKETS,
+    ),
+    "isbn_cache_lookups_total": (
+        "counter",
+        "ISBN metadata cache lookups by result (hit, negative_hit, miss).",
+        None,
+    ),
+    "isbn_cache_stores_total": (
+        "counter",
+        "Entries written to the ISBN metadata cache.",
+        None,
+    ),
+    "isbn_cache_evictions_total": (
+        "counter",
+        "Oldest ISBN metadata cache entries dropped to stay within bounds.",
+        None,
+    ),
+    "inventory_books_checked_total": (
+        "counter",
+        "Books compared with their outstanding loans by check_inventory.",
+        None,
+    ),
+    "inventory_books_drifted_total": (
+        "counter",
+        "Books whose available count did not match their outstanding loans.",
+        None,
+    ),
+    "inventory_books_repaired_total": (
+        "counter",
+        "Drifted available counts corrected by check_inventory.",
+        None,
+    ),
+}
+
+_lock = threading.Lock()
+_counters = {}  # (name, labels) -> [value]
+_histograms = {}  # (name, labels) -> [count per bucket..., +Inf count, sum]
+_requests = {}  # (url name, method, status) -> that request's series
+_last_flush = 0.0
+
+# [queries, seconds] for the request being served; sync_to_async copies
+# the context, so queries run from async views land here too.
+_db_totals = ContextVar("metrics_db_totals", default=None)
+
+
+def _counter(name, labels):
+    key = (name, labels)
+    if key not in _counters:
+        _counters[key] = [0]
+    return _counters[key]
+
+
+def _histogram(name, labels):
+    key = (name, labels)
+    if key not in _histograms:
+        _histograms[key] = [0] * (len(METRICS[name][2]) + 1) + [0.0]
+    return _histograms[key]
+
+
+def inc(name, labels, amount=1):
+    """Add ``amount`` to counter ``name``; ``labels`` is a tuple of pairs."""
+    with _lock:
+        _counter(name, labels)[0] += amount
+
+
+def observe(name, labels, value):
+    """Record ``value`` in histogram ``name``."""
+    with _lock:
+        histogram = _histogram(name, labels)
+        histogram[bisect_left(METRICS[name][2], value)] += 1
+        histogram[-1] += value
+
+
+@contextmanager
+def upstream_call(api):
+    """Time an outbound Google API call as ``ok`` or ``error``."""
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "ok"
+    finally:
+        observe(
+            "google_api_request_duration_seconds",
+            (("api", api), ("outcome", outcome)),
+            time.perf_counter() - started,
+        )
+
+
+def _record_query(execute, sql, params, many, context):
+    totals = _db_totals.get()
+    if totals is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        totals[0] += 1
+        totals[1] += time.perf_counter() - started
+
+
+def _instrument(connection, **kwargs):
+    # Installed for the connection's lifetime instead of per request with
+    # ``connection.execute_wrapper()``: async views run their queries on a
+    # different thread, hence a different connection, from the middleware.
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+connection_created.connect(_instrument, dispatch_uid="metrics-instrument")
+
+
+def _flush():
+    snapshot = {
+        "counters": [
+            [name, labels, value] for (name, labels), (value,) in _counters.items()
+        ],
+        "histograms": [
+            [name, labels, values] for (name, labels), values in _histograms.items()
+        ],
+    }
+    os.makedirs(settings.METRICS_DIR, exist_ok=True)
+    path = os.path.join(settings.METRICS_DIR, f"metrics-{os.getpid()}.json")
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(snapshot, f)
+    os.replace(f"{path}.tmp", path)
+
+
+def _maybe_flush():
+    global _last_flush
+    now = time.monotonic()
+    if now - _last_flush >= METRICS_FLUSH_INTERVAL:
+        _last_flush = now
+        with _lock:
+            _flush()
+
+
+@atexit.register
+def _flush_at_exit():
+    if _counters or _histograms:
+        _flush()
+
+
+def _request_series(view, method, status):
+    labels = (("view", view),)
+    return (
+        _counter(
+            "http_requests_total",
+            labels + (("method", method), ("status", str(status))),
+        ),
+        _histogram("http_request_duration_seconds", labels),
+        _histogram("http_request_db_queries", labels),
+        _counter("http_request_db_seconds_total", labels),
+        _histogram("http_response_size_bytes", labels),
+    )
+
+
+def _record(request, response, seconds, db):
+    match = request.resolver_match
+    key = (
+        match.url_name if match else "<unmatched>",
+        request.method,
+        response.status_code,
+    )
+    size = None if response.streaming else len(response.content)
+    # The series are the same lists the registry renders; updating them in
+    # place under one lock keeps this to a few microseconds per request.
+    with _lock:
+        series = _requests.get(key)
+        if series is None:
+            series = _requests[key] = _request_series(*key)
+        requests, latency, queries, db_seconds, sizes = series
+        requests[0] += 1
+        latency[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        latency[-1] += seconds
+        queries[bisect_left(QUERY_BUCKETS, db[0])] += 1
+        queries[-1] += db[0]
+        db_seconds[0] += db[1]
+        if size is not None:
+            sizes[bisect_left(SIZE_BUCKETS, size)] += 1
+            sizes[-1] += size
+    if size is None and not response.is_async:
+        response.streaming_content = _counted(response.streaming_content, sizes)
+    _maybe_flush()
+
+
+def _counted(chunks, sizes):
+    size = 0
+    for chunk in chunks:
+        size += len(chunk)
+        yield chunk
+    with _lock:
+        sizes[bisect_left(SIZE_BUCKETS, size)] += 1
+        sizes[-1] += size
+
+
+class MetricsMiddleware:
+    """
+    Per URL name: request count, latency, SQL count and time, response
+    size. Put it first in MIDDLEWARE so the latency covers the rest.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+        for connection in connections.all(initialized_only=True):
+            _instrument(connection)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        started = time.perf_counter()
+        db = [0, 0.0]
+        token = _db_totals.set(db)
+        try:
+            response = self.get_response(request)
+        finally:
+            _db_totals.reset(token)
+        _record(request, response, time.perf_counter() - started, db)
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        db = [0, 0.0]
+        token = _db_totals.set(db)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _db_totals.reset(token)
+        _record(request, response, time.perf_counter() - started, db)
+        return response
+
+
+def _merged():
+    counters, histograms = {}, {}
+    for path in glob.glob(os.path.join(settings.METRICS_DIR, "metrics-*.json")):
+        try:
+            with open(path) as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            continue  # being replaced or removed right now
+        for name, labels, value in snapshot["counters"]:
+            key = (name, tuple(map(tuple, labels)))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, values in snapshot["histograms"]:
+            key = (name, tuple(map(tuple, labels)))
+            total = histograms.setdefault(key, [0] * len(values))
+            for i, value in enumerate(values):
+                total[i] += value
+    return counters, histograms
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (
+        (key, str(value).replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n"))
+        for key, value in labels
+    )
+    return "{" + ",".join(f'{key}="{value}"' for key, value in escaped) + "}"
+
+
+def render():
+    """All workers' metrics in the Prometheus text exposition format."""
+    with _lock:
+        _flush()
+    counters, histograms = _merged()
+    lines = []
+    for name, (kind, help_text, buckets) in METRICS.items():
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+        if kind == "counter":
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f"{name}{_format_labels(labels)} {value}")
+            continue
+        for (metric, labels), values in sorted(histograms.items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, count in zip(buckets + ("+Inf",), values):
+                cumulative += count
+                le = labels + (("le", bound),)
+                lines.append(f"{name}_bucket{_format_labels(le)} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {values[-1]}")
+            lines.append(f"{name}_count{_format_labels(labels)} {cumulative}")
+    return "\n".join(lines) + "\n"
+
+
+@require_GET
+def metrics_view(request):
+    """Scrape endpoint; needs ``Bearer <METRICS_TOKEN>`` when that is set."""
+    token = settings.METRICS_TOKEN
+    if token and request.headers.get("Authorization") != f"Bearer {token}":
+        return HttpResponseForbidden()
+    return HttpResponse(render(), content_type=CONTENT_TYPE)
@@ -0,0 +1,207 @@
+"""
+Opt-in per-request profiling.
+
+A request is profiled when it carries a valid ``X-Profile`` token (issued
+to librarians by the profile list endpoint) and is authenticated as the
+librarian the token was issued to, or when it is picked by
+``PROFILING_SAMPLE_RATE``. Its cProfile stats and the SQL it ran are
+written to ``PROFILING_DIR``, which keeps the newest
+``PROFILING_MAX_PROFILES`` profiles and must not be web-served. Other
+requests pay for one header lookup and, with sampling on, one random
+number.
+"""
+
+import cProfile
+from datetime import datetime, timezone
+import glob
+import io
+import json
+import logging
+import os
+import pstats
+import random
+import re
+import secrets
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core import signing
+from django.db import connection
+
+HEADER = "X-Profile"
+MAX_QUERIES = 1000  # SQL statements kept per profile
+TOP_FUNCTIONS = 40  # rows of the cumulative-time summary kept in the JSON
+
+_META_KEY = "HTTP_X_PROFILE"
+_SALT = "project.profiling"
+_NAME = re.compile(r"^[\w-]+\.(json|prof)$")
+
+logger = logging.getLogger(__name__)
+
+
+def issue_token(user):
+    """Header value that profiles ``user``'s requests for PROFILING_TOKEN_MAX_AGE."""
+    return signing.TimestampSigner(salt=_SALT).sign(str(user.pk))
+
+
+def _token_user(token):
+    try:
+        return int(
+            signing.TimestampSigner(salt=_SALT).unsign(
+                token, max_age=settings.PROFILING_TOKEN_MAX_AGE
+            )
+        )
+    except (signing.BadSignature, ValueError):
+        return None
+
+
+class _QueryLog:
+    def __init__(self):
+        self.queries = []
+        self.dropped = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            if len(self.queries) < MAX_QUERIES:
+                ms = (time.perf_counter() - started) * 1000
+                self.queries.append({"sql": sql, "ms": round(ms, 3), "many": many})
+            else:
+                self.dropped += 1
+
+
+def _summary(profiler):
+    out = io.StringIO()
+    pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(
+        TOP_FUNCTIONS
+    )
+    return out.getvalue()
+
+
+def _save(request, response, profiler, log, seconds, trigger, user):
+    match = request.resolver_match
+    view = match.url_name if match else "unmatched"
+    now = datetime.now(timezone.utc)
+    # Timestamp first so names sort by age; the random part keeps them
+    # unguessable.
+    name = f"{now:%Y%m%dT%H%M%S%f}-{view}-{secrets.token_hex(8)}"
+    os.makedirs(settings.PROFILING_DIR, exist_ok=True)
+    base = os.path.join(settings.PROFILING_DIR, name)
+    profiler.dump_stats(f"{base}.prof")
+    meta = {
+        "name": name,
+        "created": now.isoformat(),
+        "method": request.method,
+        "path": request.path,
+        "view": view,
+        "status": response.status_code,
+        "ms": round(seconds * 1000, 1),
+        "trigger": trigger,
+        "user": user,
+        "query_count": len(log.queries) + log.dropped,
+        "query_ms": round(sum(query["ms"] for query in log.queries), 3),
+        "queries": log.queries,
+        "top_functions": _summary(profiler),
+    }
+    with open(f"{base}.json", "w") as f:
+        json.dump(meta, f)
+    _rotate()
+
+
+def _rotate():
+    names = sorted(glob.glob(os.path.join(settings.PROFILING_DIR, "*.json")))
+    for path in names[: -settings.PROFILING_MAX_PROFILES]:
+        for stale in (path, path[: -len(".json")] + ".prof"):
+            try:
+                os.remove(stale)
+            except FileNotFoundError:
+                pass  # another worker rotated it first
+
+
+def list_profiles():
+    """Newest first, without the SQL and function detail."""
+    profiles = []
+    for path in sorted(
+        glob.glob(os.path.join(settings.PROFILING_DIR, "*.json")), reverse=True
+    ):
+        try:
+            with open(path) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            continue  # rotated away or still being written
+        del meta["queries"], meta["top_functions"]
+        meta["files"] = [f"{meta['name']}.json", f"{meta['name']}.prof"]
+        profiles.append(meta)
+    return profiles
+
+
+def profile_path(filename):
+    """Path of a ``.json``/``.prof`` file in PROFILING_DIR, or None."""
+    if not _NAME.match(filename):
+        return None
+    path = os.path.join(settings.PROFILING_DIR, filename)
+    return path if os.path.isfile(path) else None
+
+
+def _is_token_owner(request, user_id):
+    # The token names who may be profiled; the request must be authenticated
+    # (by the view, so checked afterwards) as that user, still a librarian.
+    from users.models import UserProfile
+
+    user = getattr(request, "user", None)
+    if user is None or not user.is_authenticated or user.pk != user_id:
+        return False
+    return UserProfile.objects.filter(auth_user_id=user_id, role="Librarian").exists()
+
+
+class ProfilingMiddleware:
+    """
+    Profile the rest of the middleware stack and the view for opted-in
+    requests. Async requests pass through unprofiled: cProfile would mix in
+    every other coroutine running on the event loop.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.get_response(request)
+        token = request.META.get(_META_KEY)
+        user = _token_user(token) if token else None
+        if user is not None:
+            trigger = "header"
+        elif settings.PROFILING_SAMPLE_RATE and (
+            random.random() < settings.PROFILING_SAMPLE_RATE
+        ):
+            trigger = "sample"
+        else:
+            return self.get_response(request)
+
+        profiler = cProfile.Profile()
+        log = _QueryLog()
+        started = time.perf_counter()
+        with connection.execute_wrapper(log):
+            profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+        seconds = time.perf_counter() - started
+        if trigger == "header" and not _is_token_owner(request, user):
+            return response
+        try:
+            _save(request, response, profiler, log, seconds, trigger, user)
+        except OSError:
+            # A full or read-only disk must not fail the request itself.
+            logger.exception("Could not write profile for %s", request.path)
+        return response
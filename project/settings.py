@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 
+import os
 from pathlib import Path
 from typing import List
 
@@ -59,6 +60,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     # Third party
     "corsheaders",
     "rest_framework",
@@ -69,6 +71,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "project.metrics.MetricsMiddleware",
+    "project.profiling.ProfilingMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "corsheaders.middleware.CorsMiddleware",
@@ -101,14 +105,19 @@ CORS_ALLOW_HEADERS = [
 ]
 
 REST_FRAMEWORK = {
+    # JWTs carry role/profile claims (users.authentication), so the common
+    # case authenticates without touching the database.
     "DEFAULT_AUTHENTICATION_CLASSES": [
+        "users.authentication.RoleClaimsJWTAuthentication",
         "rest_framework.authentication.SessionAuthentication",
-        "rest_framework.authentication.TokenAuthentication",
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
     ],
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.IsAuthenticated",
     ],
+    "DEFAULT_RENDERER_CLASSES": [
+        "project.renderers.ORJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
 }
 
 ROOT_URLCONF = "project.urls"
@@ -131,6 +140,33 @@ TEMPLATES = [
 
 WSGI_APPLICATION = "project.wsgi.application"
 
+# Shared by every worker process in the container (JWT role revocation
+# markers and other cross-worker state).
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": "/var/tmp/odoo_backend_cache",
+    },
+    # Rendered API data for hot read endpoints (books/response_cache.py).
+    # A local file cache is shared by every worker on the host without a
+    # network hop. Writes evict entries by rotating generation tokens; the
+    # timeout only bounds how long unreachable entries linger.
+    "responses": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": "/var/tmp/odoo_backend_cache/responses",
+        "TIMEOUT": 300,
+        "OPTIONS": {"MAX_ENTRIES": 10000},
+    },
+    # JWT token version markers (users/authentication.py), one per recently
+    # active profile. A culled marker costs one profile lookup, never a
+    # revoked token getting through.
+    "auth": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": "/var/tmp/odoo_backend_cache/auth",
+        "OPTIONS": {"MAX_ENTRIES": 100000},
+    },
+}
+
 
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
@@ -143,7 +179,14 @@ DATABASES = {
         "PASSWORD": "odoo",
         "HOST": "db_odoo",
         "PORT": "5432",
+        # Writes run in one transaction per request; read-only views opt
+        # out with @transaction.non_atomic_requests.
         "ATOMIC_REQUESTS": True,
+        # Keep each worker thread's connection open across requests, and
+        # check it before reuse so a restarted server is reconnected to
+        # instead of failing the request. project/asgi.py turns this off.
+        "CONN_MAX_AGE": int(os.environ.get("DJANGO_CONN_MAX_AGE", 600)),
+        "CONN_HEALTH_CHECKS": True,
     }
 }
 
@@ -192,3 +235,54 @@ SIMPLE_JWT = {
     "BLACKLIST_AFTER_ROTATION": True,
     "AUTH_HEADER_TYPES": ("Bearer",),
 }
+
+# Keyset pagination defaults for list endpoints (?page_size= is clamped to the max)
+CURSOR_PAGE_SIZE = 50
+CURSOR_MAX_PAGE_SIZE = 500
+
+# Google Books lookups used by add_books
+GOOGLE_BOOKS_API_URL = "https://www.googleapis.com/books/v1/volumes"
+GOOGLE_BOOKS_MAX_WORKERS = 8
+GOOGLE_BOOKS_TIMEOUT = 10
+# Keep-alive connections shared by every in-flight async add_books request;
+# each request still runs at most GOOGLE_BOOKS_MAX_WORKERS lookups at once.
+GOOGLE_BOOKS_ASYNC_CONNECTIONS = 100
+
+# Google Sign-In ID token verification used by google_auth
+GOOGLE_CERTS_URL = "https://www.googleapis.com/oauth2/v1/certs"
+GOOGLE_AUTH_TIMEOUT = 10
+
+# Mount the async versions of the outbound-I/O views (add_books, google_auth).
+# project/asgi.py turns this on; see "Async serving" in the README.
+ASYNC_VIEWS = os.environ.get("DJANGO_ASYNC_VIEWS") == "1"
+
+# Persistent Google Books metadata cache (books.IsbnMetadata), TTLs in seconds
+ISBN_CACHE_TTL = 30 * 24 * 60 * 60
+ISBN_CACHE_NEGATIVE_TTL = 24 * 60 * 60
+ISBN_CACHE_MAX_ENTRIES = 500000
+# Each worker checks the table size after this many stores, not on every one.
+ISBN_CACHE_EVICT_EVERY = 1000
+
+# Most books or borrowings one bulk checkout/return request may carry
+CIRCULATION_BATCH_MAX_ITEMS = 50
+
+# Late fee charged per day overdue, also used by the nightly accrual job
+# (python manage.py accrue_late_fees)
+LATE_FEE_PER_DAY = os.environ.get("LATE_FEE_PER_DAY", "1.00")
+
+# Prometheus metrics (project/metrics.py): each worker writes a snapshot to
+# METRICS_DIR, which must be shared by the workers of one host and cleared
+# on start. The /api/metrics/ scrape endpoint requires
+# "Authorization: Bearer <METRICS_TOKEN>" when the token is set.
+METRICS_DIR = os.environ.get("METRICS_DIR", "/var/tmp/odoo_backend_metrics")
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+
+# Opt-in request profiling (project/profiling.py). A request is profiled
+# when a librarian sends their own X-Profile token (from GET
+# /api/lib/profiles/) or it is sampled at PROFILING_SAMPLE_RATE (0.0 - 1.0).
+# Profiles hold SQL and request details: keep PROFILING_DIR out of anything
+# the web server serves, such as MEDIA_ROOT.
+PROFILING_SAMPLE_RATE = float(os.environ.get("PROFILING_SAMPLE_RATE", "0"))
+PROFILING_DIR = os.environ.get("PROFILING_DIR", "/var/tmp/odoo_backend_profiles")
+PROFILING_MAX_PROFILES = 200
+PROFILING_TOKEN_MAX_AGE = 60 * 60
@@ -22,11 +22,14 @@ from django.conf.urls.static import static
 from django.conf import settings
 from django.urls import include
 
+from project.metrics import metrics_view
+
 urlpatterns = (
     [
         path("api/admin/", admin.site.urls),
         path("api/users/", include("users.urls")),
         path("api/lib/", include("books.urls")),
+        path("api/metrics/", metrics_view, name="metrics"),
     ]
     + static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
     + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
@@ -0,0 +1,34 @@
+# Async twin of google_auth for the ASGI deployment (see books/async_views.py):
+# the certificate fetch awaits on a pooled client instead of blocking a worker.
+
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+
+from users.google_identity import GOOGLE_ISSUERS, averify_id_token
+from users.views import google_auth_params, login_google_user
+
+
+@csrf_exempt
+@transaction.non_atomic_requests
+async def google_auth(request):
+    token, role, error = google_auth_params(request)
+    if error:
+        return error
+
+    try:
+        idinfo = await averify_id_token(token)
+    except ValueError:
+        return JsonResponse({"error": "Invalid ID token"}, status=400)
+
+    if idinfo["iss"] not in GOOGLE_ISSUERS:
+        return JsonResponse({"error": "Invalid token issuer"}, status=400)
+
+    try:
+        payload = await sync_to_async(transaction.atomic(login_google_user))(
+            idinfo, role
+        )
+    except Exception as e:
+        return JsonResponse({"error": str(e)}, status=500)
+    return JsonResponse(payload, status=200)
@@ -0,0 +1,115 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.functional import cached_property
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.models import TokenUser
+
+from users.models import UserProfile
+
+ROLE_CLAIM = "role"
+PROFILE_ID_CLAIM = "profile_id"
+TOKEN_VERSION_CLAIM = "token_version"
+# Cache alias holding the token version markers, apart from everything else
+# so other keys never push them out.
+TOKEN_VERSION_CACHE = "auth"
+
+
+def add_profile_claims(token, user_profile):
+    token[ROLE_CLAIM] = user_profile.role
+    token[PROFILE_ID_CLAIM] = user_profile.id
+    token[TOKEN_VERSION_CLAIM] = user_profile.token_version
+    # Prime the marker so this token is checked without a query; ``add``
+    # never replaces a newer version published by a role change.
+    _versions().add(
+        token_version_key(user_profile.id),
+        user_profile.token_version,
+        timeout=_marker_timeout(),
+    )
+    return token
+
+
+def token_version_key(profile_id):
+    return f"auth:token-version:{profile_id}"
+
+
+def _versions():
+    return caches[TOKEN_VERSION_CACHE]
+
+
+def _marker_timeout():
+    # A marker only has to outlive the longest-lived access token.
+    return int(settings.SIMPLE_JWT["ACCESS_TOKEN_LIFETIME"].total_seconds())
+
+
+def publish_token_version(user_profile):
+    """
+    Tell every worker (through the shared cache) that tokens for this profile
+    older than ``token_version`` are stale.
+    """
+    _versions().set(
+        token_version_key(user_profile.id),
+        user_profile.token_version,
+        timeout=_marker_timeout(),
+    )
+
+
+def current_token_version(profile_id):
+    """
+    The profile's token version from its marker or, when the marker is
+    gone (expired or culled), from the database; None if there's no profile.
+    """
+    key = token_version_key(profile_id)
+    version = _versions().get(key)
+    if version is None:
+        version = (
+            UserProfile.objects.filter(pk=profile_id)
+            .values_list("token_version", flat=True)
+            .first()
+        )
+        if version is not None:
+            _versions().add(key, version, timeout=_marker_timeout())
+    return version
+
+
+class ClaimsUser(TokenUser):
+    """
+    Stateless user rebuilt from JWT claims. ``userprofile`` is an unsaved-state
+    UserProfile carrying only id, auth_user_id and role: enough for
+    permission checks and for use as a foreign key value. Views that read or
+    save other profile/user fields must use DB-backed authentication.
+    """
+
+    @cached_property
+    def userprofile(self):
+        profile = UserProfile(
+            id=self.token[PROFILE_ID_CLAIM],
+            auth_user_id=self.id,
+            role=self.token[ROLE_CLAIM],
+            token_version=self.token.get(TOKEN_VERSION_CLAIM, 0),
+        )
+        profile._state.adding = False
+        profile._state.db = "default"
+        return profile
+
+
+class RoleClaimsJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication that trusts the role/profile claims stamped at issue
+    time instead of loading User and UserProfile on every request. Tokens
+    issued before the claims existed fall back to the database lookup.
+    Revocation fails closed: without a version marker the profile row is
+    read instead.
+    """
+
+    def get_user(self, validated_token):
+        if PROFILE_ID_CLAIM not in validated_token:
+            return super().get_user(validated_token)
+        current = current_token_version(validated_token[PROFILE_ID_CLAIM])
+        if current is None:
+            raise AuthenticationFailed("User not found", code="user_not_found")
+        if current != validated_token.get(TOKEN_VERSION_CLAIM, 0):
+            raise AuthenticationFailed(
+                "Your role has changed; refresh your token.", code="token_stale"
+            )
+        return ClaimsUser(validated_token)
@@ -0,0 +1,76 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import threading
+import time
+
+from django.core.cache import cache
+from django.test import override_settings
+from google.auth import crypt, jwt
+import rsa
+
+from .google_identity import CERTS_CACHE_KEY
+
+
+class FakeGoogleCerts:
+    """Local stand-in for Google's ID token signing certificate endpoint."""
+
+    public_key, private_key = rsa.newkeys(1024)
+    key_id = "fake-key"
+
+    def __init__(self, max_age=3600):
+        self.requests = 0
+        certs = json.dumps(
+            {self.key_id: self.public_key.save_pkcs1().decode()}
+        ).encode()
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                api.requests += 1
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Cache-Control", f"public, max-age={max_age}")
+                self.send_header("Content-Length", str(len(certs)))
+                self.end_headers()
+                self.wfile.write(certs)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/oauth2/v1/certs"
+
+    def id_token(self, email="reader@example.com", private_key=None, **claims):
+        signer = crypt.RSASigner.from_string(
+            (private_key or self.private_key).save_pkcs1().decode(), self.key_id
+        )
+        now = int(time.time())
+        payload = {
+            "iss": "https://accounts.google.com",
+            "aud": "client-id",
+            "sub": "1234",
+            "email": email,
+            "given_name": "Rea",
+            "family_name": "Der",
+            "iat": now,
+            "exp": now + 600,
+            **claims,
+        }
+        return jwt.encode(signer, payload).decode()
+
+    def __enter__(self):
+        threading.Thread(
+            target=self.server.serve_forever, args=(0.05,), daemon=True
+        ).start()
+        self.settings = override_settings(GOOGLE_CERTS_URL=self.url)
+        self.settings.enable()
+        cache.delete(CERTS_CACHE_KEY)
+        return self
+
+    def __exit__(self, *exc):
+        cache.delete(CERTS_CACHE_KEY)
+        self.settings.disable()
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,106 @@
+import re
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+from google.auth import jwt
+import requests
+from requests.adapters import HTTPAdapter
+
+from project.http import async_session
+from project.metrics import upstream_call
+
+GOOGLE_ISSUERS = ("accounts.google.com", "https://accounts.google.com")
+CERTS_CACHE_KEY = "google-auth:certs"
+
+_MAX_AGE = re.compile(r"max-age=(\d+)")
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """Process-wide keep-alive session for Google certificate fetches."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                session.mount("https://", HTTPAdapter(pool_maxsize=4))
+                session.mount("http://", HTTPAdapter(pool_maxsize=4))
+                _session = session
+    return _session
+
+
+def _freshness(headers):
+    """Seconds the response may be reused: Cache-Control max-age minus Age."""
+    cache_control = headers.get("Cache-Control", "")
+    match = _MAX_AGE.search(cache_control)
+    if not match or "no-store" in cache_control or "no-cache" in cache_control:
+        return 0
+    try:
+        age = int(headers.get("Age", 0))
+    except ValueError:
+        age = 0
+    return max(int(match.group(1)) - age, 0)
+
+
+def _remember(certs, headers):
+    ttl = _freshness(headers)
+    if ttl:
+        # The shared cache lets every worker on the host reuse one fetch.
+        cache.set(CERTS_CACHE_KEY, certs, ttl)
+    return certs
+
+
+def fetch_certs():
+    """Download Google's current signing certificates and cache them."""
+    with upstream_call("certs"):
+        response = get_session().get(
+            settings.GOOGLE_CERTS_URL, timeout=settings.GOOGLE_AUTH_TIMEOUT
+        )
+        if response.status_code != 200:
+            raise ValueError(
+                f"Could not fetch certificates at {settings.GOOGLE_CERTS_URL}"
+            )
+        certs = response.json()
+    return _remember(certs, response.headers)
+
+
+async def afetch_certs():
+    """``fetch_certs`` without blocking the event loop."""
+    session = async_session("google-certs", 4, settings.GOOGLE_AUTH_TIMEOUT)
+    with upstream_call("certs"):
+        async with session.get(settings.GOOGLE_CERTS_URL) as response:
+            if response.status != 200:
+                raise ValueError(
+                    f"Could not fetch certificates at {settings.GOOGLE_CERTS_URL}"
+                )
+            certs = await response.json()
+    return _remember(certs, response.headers)
+
+
+def _needs_fetch(token, certs):
+    # A key id we have not seen means Google rotated keys before our copy
+    # expired; fetch once more instead of rejecting the token.
+    return certs is None or jwt.decode_header(token).get("kid") not in certs
+
+
+def decode_id_token(token, certs):
+    """Verify an ID token's signature and expiry against ``certs``; returns its claims."""
+    return jwt.decode(token, certs=certs)
+
+
+def verify_id_token(token):
+    """Verify ``token`` against cached certificates, refetching when stale."""
+    certs = cache.get(CERTS_CACHE_KEY)
+    if _needs_fetch(token, certs):
+        certs = fetch_certs()
+    return decode_id_token(token, certs)
+
+
+async def averify_id_token(token):
+    certs = await cache.aget(CERTS_CACHE_KEY)
+    if _needs_fetch(token, certs):
+        certs = await afetch_certs()
+    return decode_id_token(token, certs)
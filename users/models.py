@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
 
 USER_ROLE_CHOICES = [
@@ -14,6 +14,30 @@ class UserProfile(models.Model):
     role = models.CharField(
         max_length=100, choices=USER_ROLE_CHOICES, default="Customer"
     )
+    # Stamped into JWTs with the role; bumped whenever the role changes so
+    # tokens carrying the old role stop authenticating.
+    token_version = models.PositiveIntegerField(default=0)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_role = instance.__dict__.get("role")
+        return instance
+
+    def save(self, *args, **kwargs):
+        loaded_role = getattr(self, "_loaded_role", None)
+        role_changed = loaded_role is not None and loaded_role != self.role
+        if role_changed:
+            self.token_version += 1
+            update_fields = kwargs.get("update_fields")
+            if update_fields is not None:
+                kwargs["update_fields"] = {*update_fields, "token_version"}
+        super().save(*args, **kwargs)
+        self._loaded_role = self.role
+        if role_changed:
+            from users.authentication import publish_token_version
+
+            transaction.on_commit(lambda: publish_token_version(self))
 
     def __str__(self):
         return self.name or self.auth_user.username
@@ -1,3 +1,165 @@
-from django.test import TestCase
+import json
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache, caches
+from django.db import connection
+from django.test import AsyncRequestFactory, TestCase
+import rsa
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from users import async_views
+from users.authentication import TOKEN_VERSION_CACHE, token_version_key
+from users.benchmarks import FakeGoogleCerts
+from users.google_identity import CERTS_CACHE_KEY
+from users.models import UserProfile
+from users.views import get_tokens_for_user
+
+
+class RoleClaimsAuthenticationTests(TestCase):
+    def setUp(self):
+        user = User.objects.create_user(username="staff", password="password123")
+        self.profile = UserProfile.objects.create(
+            auth_user=user, name="Staff", role="Librarian"
+        )
+        self.tokens = get_tokens_for_user(user)
+        self.addCleanup(
+            caches[TOKEN_VERSION_CACHE].delete, token_version_key(self.profile.id)
+        )
+
+    def client_with(self, access):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {access}")
+        return client
+
+    def test_tokens_carry_role_claims(self):
+        token = AccessToken(self.tokens["access"])
+        self.assertEqual(
+            (token["role"], token["profile_id"], token["token_version"]),
+            ("Librarian", self.profile.id, 0),
+        )
+
+    def test_permission_check_needs_no_auth_queries(self):
+        client = self.client_with(self.tokens["access"])
+        with CaptureQueriesContext(connection) as ctx:
+            response = client.get("/api/lib/notifications/unread-count/")
+        self.assertEqual(response.status_code, 200)
+        tables = " ".join(q["sql"] for q in ctx.captured_queries)
+        self.assertNotIn("auth_user", tables)
+        self.assertNotIn("users_userprofile", tables)
+
+    def demote(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.profile.role = "Customer"
+            self.profile.save()
+        self.assertEqual(self.profile.token_version, 1)
+
+    def test_role_change_invalidates_old_tokens(self):
+        self.demote()
+        client = self.client_with(self.tokens["access"])
+        self.assertEqual(client.get("/api/users/protected/").status_code, 401)
+
+    def test_revocation_survives_a_lost_marker(self):
+        self.demote()
+        caches[TOKEN_VERSION_CACHE].delete(token_version_key(self.profile.id))
+        client = self.client_with(self.tokens["access"])
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(client.get("/api/users/protected/").status_code, 401)
+        self.assertEqual(len(ctx.captured_queries), 1)
+        # The lookup put the marker back; the next check is query-free.
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(client.get("/api/users/protected/").status_code, 401)
+        self.assertEqual(len(ctx.captured_queries), 0)
+
+    def test_tokens_of_deleted_profiles_are_refused(self):
+        caches[TOKEN_VERSION_CACHE].delete(token_version_key(self.profile.id))
+        self.profile.delete()
+        client = self.client_with(self.tokens["access"])
+        self.assertEqual(client.get("/api/users/protected/").status_code, 401)
+
+    def test_refresh_after_role_change_carries_the_new_role(self):
+        self.demote()
+        response = APIClient().post(
+            "/api/users/api/token/refresh/", {"refresh": self.tokens["refresh"]}
+        )
+        access = AccessToken(response.json()["access"])
+        self.assertEqual((access["role"], access["token_version"]), ("Customer", 1))
+        client = self.client_with(str(access))
+        self.assertEqual(client.get("/api/users/protected/").status_code, 200)
+        self.assertEqual(client.get("/api/lib/reports/").status_code, 403)
+
+
+class GoogleAuthTests(TestCase):
+    def login(self, token):
+        return self.client.post(
+            "/api/users/google-auth/",
+            {"id_token": token, "role": "Customer"},
+            content_type="application/json",
+        )
+
+    def sql(self, ctx):
+        return [
+            q["sql"]
+            for q in ctx.captured_queries
+            if not q["sql"].startswith(("SAVEPOINT", "RELEASE SAVEPOINT"))
+        ]
+
+    def test_certificates_are_reused_for_their_max_age(self):
+        with FakeGoogleCerts(max_age=3600) as google:
+            for _ in range(3):
+                self.assertEqual(self.login(google.id_token()).status_code, 200)
+        self.assertEqual(google.requests, 1)
+
+    def test_uncacheable_certificates_are_fetched_every_time(self):
+        with FakeGoogleCerts(max_age=0) as google:
+            for _ in range(2):
+                self.assertEqual(self.login(google.id_token()).status_code, 200)
+        self.assertEqual(google.requests, 2)
+
+    def test_unknown_key_id_refetches_rotated_certificates(self):
+        with FakeGoogleCerts() as google:
+            cache.set(CERTS_CACHE_KEY, {"retired-key": "not a key"}, 3600)
+            self.assertEqual(self.login(google.id_token()).status_code, 200)
+        self.assertEqual(google.requests, 1)
+
+    def test_sign_in_queries_are_minimal(self):
+        with FakeGoogleCerts() as google:
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.login(google.id_token())
+            self.assertEqual(response.json()["user"]["name"], "Rea Der")
+            # lookup miss, INSERT user, INSERT profile
+            self.assertEqual(len(self.sql(ctx)), 3)
+
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.login(google.id_token())
+            self.assertEqual(response.status_code, 200)
+            # user and profile in one joined SELECT
+            self.assertEqual(len(self.sql(ctx)), 1)
+
+
+class AsyncGoogleAuthTests(TestCase):
+    def request(self, token):
+        return AsyncRequestFactory().post(
+            "/api/users/google-auth/",
+            {"id_token": token, "role": "Customer"},
+            content_type="application/json",
+        )
+
+    async def test_valid_token_signs_in_and_creates_the_profile(self):
+        with FakeGoogleCerts() as google:
+            response = await async_views.google_auth(self.request(google.id_token()))
+        self.assertEqual(response.status_code, 200)
+        body = json.loads(response.content)
+        self.assertEqual(body["user"]["name"], "Rea Der")
+        self.assertTrue(body["tokens"]["access"])
+        self.assertTrue(
+            await UserProfile.objects.filter(auth_user__username="reader").aexists()
+        )
+
+    async def test_tokens_not_signed_by_google_are_rejected(self):
+        _, other_key = rsa.newkeys(1024)
+        with FakeGoogleCerts() as google:
+            forged = google.id_token(private_key=other_key)
+            response = await async_views.google_auth(self.request(forged))
+        self.assertEqual(response.status_code, 400)
@@ -1,17 +1,23 @@
+from django.conf import settings
 from django.urls import path
-from users import views
+from users import async_views, views
 from rest_framework_simplejwt.views import (
     TokenObtainPairView,
     TokenRefreshView,
 )
-from users.views import CustomTokenObtainPairView
+from users.views import CustomTokenObtainPairView, CustomTokenRefreshView
 
 urlpatterns = [
     # path("api/token/", TokenObtainPairView.as_view(), name="token_obtain_pair"),
     path("api/token/", CustomTokenObtainPairView.as_view(), name="token_obtain_pair"),
-    path("api/token/refresh/", TokenRefreshView.as_view(), name="token_refresh"),
+    # path("api/token/refresh/", TokenRefreshView.as_view(), name="token_refresh"),
+    path("api/token/refresh/", CustomTokenRefreshView.as_view(), name="token_refresh"),
     path("signup/", views.signup, name="signup"),
     path("update_profile/", views.update_profile, name="update_profile"),
     path("protected/", views.ProtectedView.as_view(), name="protected_view"),
-    path("google-auth/", views.google_auth, name="google_auth"),
+    path(
+        "google-auth/",
+        async_views.google_auth if settings.ASYNC_VIEWS else views.google_auth,
+        name="google_auth",
+    ),
 ]
@@ -1,25 +1,38 @@
 from django.shortcuts import render
+from rest_framework.authentication import SessionAuthentication
 from rest_framework.permissions import IsAuthenticated, AllowAny
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import (
+    api_view,
+    authentication_classes,
+    permission_classes,
+)
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils.decorators import method_decorator
 from users.models import UserProfile
 from django.views.decorators.csrf import csrf_exempt
 import json
 from django.http import JsonResponse
-from google.auth.transport import requests as google_requests
-from google.oauth2 import id_token as googleIdToken
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
 from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework import status
 from django.core.exceptions import ValidationError
 from django.core.validators import validate_email
-from rest_framework_simplejwt.views import TokenObtainPairView
-from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
+from rest_framework_simplejwt.serializers import (
+    TokenObtainPairSerializer,
+    TokenRefreshSerializer,
+)
+from users.authentication import add_profile_claims
+from users.google_identity import GOOGLE_ISSUERS, verify_id_token
 
 
 def get_tokens_for_user(user):
-    refresh = RefreshToken.for_user(user)
+    refresh = add_profile_claims(RefreshToken.for_user(user), user.userprofile)
     return {
         "refresh": str(refresh),
         "access": str(refresh.access_token),
@@ -27,7 +40,9 @@ def get_tokens_for_user(user):
 
 
 def get_user_data(user):
-    user_profile = UserProfile.objects.get(auth_user=user)
+    # Reverse one-to-one access is cached on the user instance, so callers
+    # that already touched user.userprofile don't pay for another query.
+    user_profile = user.userprofile
     return {
         "username": user.username,
         "email": user.email,
@@ -103,10 +118,13 @@ def signup(request):
 
 @csrf_exempt
 @api_view(["GET", "POST"])
+@authentication_classes([JWTAuthentication, SessionAuthentication])
 @permission_classes([IsAuthenticated])
 def update_profile(request):
+    # Reads and saves the full User/UserProfile rows, so it authenticates
+    # against the database rather than the stateless role claims.
     try:
-        user_profile = UserProfile.objects.get(auth_user=request.user)
+        user_profile = request.user.userprofile
     except UserProfile.DoesNotExist:
         return Response(
             {"status": "error", "message": "User profile not found"},
@@ -166,6 +184,7 @@ def update_profile(request):
         return Response({"status": "success", "user": user_data})
 
 
+@method_decorator(transaction.non_atomic_requests, name="dispatch")
 class ProtectedView(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -174,55 +193,70 @@ class ProtectedView(APIView):
         return Response(content)
 
 
-@csrf_exempt
-def google_auth(request):
+def google_auth_params(request):
+    """``(id_token, role, None)`` from the request body, or an error response."""
     if request.method != "POST":
-        return JsonResponse({"error": "Invalid HTTP method"}, status=405)
+        return None, None, JsonResponse({"error": "Invalid HTTP method"}, status=405)
 
     try:
         body = json.loads(request.body)
     except json.JSONDecodeError:
-        return JsonResponse({"error": "Invalid JSON"}, status=400)
+        return None, None, JsonResponse({"error": "Invalid JSON"}, status=400)
 
     token = body.get("id_token")
-    role = body.get("role")
     if not token:
-        return JsonResponse({"error": "ID token is required"}, status=400)
+        return None, None, JsonResponse({"error": "ID token is required"}, status=400)
+    return token, body.get("role"), None
 
-    try:
-        idinfo = googleIdToken.verify_oauth2_token(token, google_requests.Request())
-    except ValueError:
-        return JsonResponse({"error": "Invalid ID token"}, status=400)
-
-    if idinfo["iss"] not in ["accounts.google.com", "https://accounts.google.com"]:
-        return JsonResponse({"error": "Invalid token issuer"}, status=400)
 
+def login_google_user(idinfo, role):
+    """Find or create the account for verified ``idinfo``; returns the login payload."""
     email = idinfo["email"]
     first_name = idinfo.get("given_name", "")
     last_name = idinfo.get("family_name", "")
 
-    try:
-        user, created = User.objects.get_or_create(
-            username=email.split("@")[0],
-            defaults={"first_name": first_name, "last_name": last_name, "email": email},
+    # Returning users cost one query: the profile is joined in. Creating the
+    # profile caches it on ``user`` for the token and payload below.
+    user, created = User.objects.select_related("userprofile").get_or_create(
+        username=email.split("@")[0],
+        defaults={"first_name": first_name, "last_name": last_name, "email": email},
+    )
+
+    if created or not hasattr(user, "userprofile"):
+        UserProfile.objects.create(
+            auth_user=user, name=f"{first_name} {last_name}".strip(), role=role
         )
 
-        if created:
-            UserProfile.objects.create(
-                auth_user=user, name=f"{first_name} {last_name}".strip(), role=role
-            )
+    tokens = get_tokens_for_user(user)
+    user_data = get_user_data(user)
+    return {"status": "success", "user": user_data, "tokens": tokens}
 
-        tokens = get_tokens_for_user(user)
-        user_data = get_user_data(user)
 
-        response_data = {"status": "success", "user": user_data, "tokens": tokens}
+@csrf_exempt
+def google_auth(request):
+    token, role, error = google_auth_params(request)
+    if error:
+        return error
 
-        return JsonResponse(response_data, status=200)
+    try:
+        idinfo = verify_id_token(token)
+    except ValueError:
+        return JsonResponse({"error": "Invalid ID token"}, status=400)
+
+    if idinfo["iss"] not in GOOGLE_ISSUERS:
+        return JsonResponse({"error": "Invalid token issuer"}, status=400)
+
+    try:
+        return JsonResponse(login_google_user(idinfo, role), status=200)
     except Exception as e:
         return JsonResponse({"error": str(e)}, status=500)
 
 
 class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
+    @classmethod
+    def get_token(cls, user):
+        return add_profile_claims(super().get_token(user), user.userprofile)
+
     def validate(self, attrs):
         data = super().validate(attrs)
         data["user"] = get_user_data(self.user)
@@ -253,3 +287,22 @@ class CustomTokenObtainPairView(TokenObtainPairView):
                 },
             }
         )
+
+
+class CustomTokenRefreshSerializer(TokenRefreshSerializer):
+    def validate(self, attrs):
+        # Re-read the profile so a refreshed access token always carries the
+        # current role and token_version, never the ones from login time.
+        refresh = self.token_class(attrs["refresh"])
+        try:
+            user_profile = UserProfile.objects.only("id", "role", "token_version").get(
+                auth_user_id=refresh[api_settings.USER_ID_CLAIM]
+            )
+        except UserProfile.DoesNotExist:
+            raise InvalidToken("User profile not found")
+        add_profile_claims(refresh, user_profile)
+        return {"access": str(refresh.access_token)}
+
+
+class CustomTokenRefreshView(TokenRefreshView):
+    serializer_class = CustomTokenRefreshSerializer